@@ -9,39 +9,15 @@ from google.cloud import firestore
 
 TW_TZ = timezone(timedelta(hours=8))
 from google.oauth2 import service_account
+from repository import FlashcardRepository
+from sentence_cache import sentence_key, shared_cache, template_hash
 
 
-# --- 快取函式（module level，_db 參數不參與 hash） ---
-
-@st.cache_data(ttl=600)
-def _get_sentence_books(_db, catalog_path):
-    """取得所有句型書目錄"""
-    docs = _db.collection(catalog_path).stream()
-    result = {}
-    for d in docs:
-        data = d.to_dict()
-        result[d.id] = {
-            "name": data.get("name", d.id),
-            "is_premium": data.get("is_premium", False),
-        }
-    return result
-
-
-@st.cache_data(ttl=600)
-def _get_sentences_content(_db, data_base_path, book_id):
-    """取得特定書本的所有句型內容"""
-    path = f"{data_base_path}/{book_id}"
-    docs = _db.collection(path).stream()
-    data = []
-    for d in docs:
-        item = d.to_dict()
-        item['doc_id'] = d.id
-        if isinstance(item.get('Options'), list):
-            item['Options_Str'] = "|".join(item['Options'])
-        else:
-            item['Options_Str'] = ""
-        data.append(item)
-    return sorted(data, key=lambda x: x.get('Order', 9999))
+def _with_options_str(item):
+    """編輯表格用：Options 陣列轉成「|」分隔字串（複製一份，不動到共用快取）"""
+    item = dict(item)
+    item['Options_Str'] = "|".join(item['Options']) if isinstance(item.get('Options'), list) else ""
+    return item
 
 
 def _fix_practice_time(db, app_id, user_name, student_id, user_info):
@@ -97,6 +73,7 @@ def render_admin(db, app_id):
     SENTENCE_DATA_BASE_PATH = f"artifacts/{app_id}/public/data"
     SHARED_VOCAB_CATALOG_PATH = f"artifacts/{app_id}/public/data/shared_vocab"
     SHARED_VOCAB_DATA_PATH = f"artifacts/{app_id}/public/data/shared_vocab_data"
+    repo = FlashcardRepository(db, app_id)
 
     # --- 工具函式 ---
     def hash_password(password):
@@ -106,11 +83,17 @@ def render_admin(db, app_id):
         docs = db.collection(USER_LIST_PATH).stream()
         return [d.to_dict() for d in docs]
 
+    # 句型書與學生端共用 sentence_cache；後台每次 rerun 都先檢查版本文件（1 次讀取），寫入後 invalidate
+    sentence_cache = shared_cache(repo)
+
     def get_sentence_books():
-        return _get_sentence_books(db, SENTENCE_CATALOG_PATH)
+        return {
+            bid: {"name": data.get("name", bid), "is_premium": data.get("is_premium", False)}
+            for bid, data in sentence_cache.catalogs(fresh=True).items()
+        }
 
     def get_sentences_content(book_id):
-        return _get_sentences_content(db, SENTENCE_DATA_BASE_PATH, book_id)
+        return [_with_options_str(it) for it in sentence_cache.sentences(book_id)]
 
     # --- 確認對話框 ---
     @st.dialog("⚠️ 確認刪除使用者")
@@ -123,6 +106,7 @@ def render_admin(db, app_id):
             st.rerun()
         if c2.button("確認刪除", type="primary", use_container_width=True):
             db.collection(USER_LIST_PATH).document(name).delete()
+            repo.remove_leaderboard_entry(name)
             st.session_state.pop("_confirm_delete_user", None)
             st.rerun()
 
@@ -163,7 +147,7 @@ def render_admin(db, app_id):
                     batch.commit(); batch = db.batch(); bc = 0
             if bc > 0: batch.commit()
             st.session_state.pop("_confirm_del_sentences", None)
-            _get_sentences_content.clear()
+            sentence_cache.invalidate(st.session_state.pop("_confirm_del_sentence_book", None))
             if "editor_df" in st.session_state:
                 del st.session_state.editor_df
             st.rerun()
@@ -250,6 +234,7 @@ def render_admin(db, app_id):
                             "color": color
                         }
                         db.collection(USER_LIST_PATH).document(name).set(user_data, merge=True)
+                        repo.reserve_student_id(sid)
                         st.success(f"使用者 {name} 已儲存！")
                         time.sleep(1)
                         st.rerun()
@@ -287,6 +272,7 @@ def render_admin(db, app_id):
                                     update_data["password"] = hash_password(new_pwd)
 
                                 db.collection(USER_LIST_PATH).document(selected_user_name).update(update_data)
+                                repo.reserve_student_id(new_sid)
                                 st.success(f"使用者 {selected_user_name} 更新成功！")
                                 time.sleep(1)
                                 st.rerun()
@@ -439,6 +425,14 @@ def render_admin(db, app_id):
     # 功能 3: 句型書管理（匯入 + 編輯）
     # ==========================================
     elif menu == "📝 句型書管理":
+        with st.expander("🏆 排行榜維護"):
+            st.caption("從每位學生的 sentence_stats 重建全部排行榜彙總（排行榜數字與學生進度不一致時使用）")
+            if st.button("🔄 重建排行榜"):
+                try:
+                    boards = repo.rebuild_leaderboards()
+                    st.success(f"已重建 {len(boards)} 份排行榜。")
+                except Exception as e:
+                    st.error(f"重建失敗：{e}")
         tab_import, tab_edit = st.tabs(["📥 匯入 CSV", "✏️ 編輯現有句型書"])
 
         with tab_import:
@@ -480,9 +474,11 @@ def render_admin(db, app_id):
                                 raw_opts = str(row.get('Options', ''))
                                 opt_list = [o.strip() for o in raw_opts.split('|') if o.strip()]
 
+                                template = str(row.get('Template', ''))
                                 data = {
                                     "Category": str(row.get('Category', '未分類')),
-                                    "Template": str(row.get('Template', '')),
+                                    "Template": template,
+                                    "template_hash": template_hash(template),
                                     "Options": opt_list,
                                     "Order": idx,
                                     "Timestamp": firestore.SERVER_TIMESTAMP
@@ -500,8 +496,7 @@ def render_admin(db, app_id):
                             if count > 0:
                                 batch.commit()
 
-                            _get_sentence_books.clear()
-                            _get_sentences_content.clear()
+                            sentence_cache.invalidate(dataset_id)
 
                             progress_bar.progress(1.0)
                             st.success(f"✅ 成功匯入 {total} 筆資料至「{dataset_name}」！")
@@ -513,8 +508,7 @@ def render_admin(db, app_id):
 
         with tab_edit:
             if st.button("🔄 重新整理資料"):
-                _get_sentence_books.clear()
-                _get_sentences_content.clear()
+                sentence_cache.reload()
                 st.rerun()
 
             books = get_sentence_books()
@@ -532,13 +526,8 @@ def render_admin(db, app_id):
                     premium_tag = " 🔒" if info.get("is_premium", False) else ""
                     combined_options.append(f"{bname}{premium_tag} (全部)")
 
-                    s_content = get_sentences_content(bid)
-                    if s_content:
-                        df_s = pd.DataFrame(s_content)
-                        if 'Category' in df_s.columns:
-                            cats = sorted(df_s['Category'].unique())
-                            for c in cats:
-                                combined_options.append(f"{bname}{premium_tag} | {c}")
+                    for c in sentence_cache.book(bid).categories:
+                        combined_options.append(f"{bname}{premium_tag} | {c}")
 
                 selected_option = st.selectbox("選擇要編輯的範圍：", combined_options)
 
@@ -564,9 +553,22 @@ def render_admin(db, app_id):
                         db.collection(SENTENCE_CATALOG_PATH).document(selected_bid).set(
                             {"is_premium": new_premium}, merge=True
                         )
-                        _get_sentence_books.clear()
+                        sentence_cache.invalidate()
                         st.success(f"已{'啟用' if new_premium else '關閉'} Premium 標記")
                         st.rerun()
+
+                    # 舊句型沒有固定 ID：補上後修改 Template 不會讓學生進度脫鉤
+                    book_meta = sentence_cache.book(selected_bid)
+                    if book_meta.legacy_count:
+                        if st.button(f"🔑 為 {book_meta.legacy_count} 筆舊句型補上固定 ID"):
+                            try:
+                                n = repo.backfill_template_hashes(selected_bid, book_meta.sentences)
+                                sentence_cache.invalidate(selected_bid)
+                                st.session_state.pop("editor_df", None)
+                                st.success(f"已補上 {n} 筆。")
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"補上失敗：{e}")
                     if "editor_df" not in st.session_state or st.session_state.get("current_book_scope") != selected_option:
                         full_data = get_sentences_content(selected_bid)
                         df_full = pd.DataFrame(full_data)
@@ -626,6 +628,7 @@ def render_admin(db, app_id):
                                 st.session_state._confirm_del_sentences = delete_ids
                                 st.session_state._confirm_del_sentence_count = len(delete_ids)
                                 st.session_state._confirm_del_sentence_path = target_path
+                                st.session_state._confirm_del_sentence_book = selected_bid
                                 confirm_delete_sentences()
                             else:
                                 st.warning("請先勾選要刪除的項目。")
@@ -640,6 +643,7 @@ def render_admin(db, app_id):
                         batch = db.batch()
                         count = 0
                         updated_count = 0
+                        originals = {s['doc_id']: s for s in sentence_cache.sentences(selected_bid)}
 
                         with st.spinner("正在同步資料庫..."):
                             for _, row in to_save_df.iterrows():
@@ -658,9 +662,14 @@ def render_admin(db, app_id):
                                 doc_id = row.get("doc_id")
 
                                 if doc_id and pd.notna(doc_id):
+                                    # 既有句型沿用原本的 ID（舊資料以修改前的 Template 補上），改錯字不影響進度
+                                    original = originals.get(doc_id)
+                                    if original and not original.get("template_hash"):
+                                        data["template_hash"] = sentence_key(original)
                                     ref = db.collection(target_path).document(doc_id)
                                     batch.set(ref, data, merge=True)
                                 else:
+                                    data["template_hash"] = template_hash(data["Template"])
                                     ref = db.collection(target_path).document()
                                     batch.set(ref, data)
 
@@ -672,7 +681,7 @@ def render_admin(db, app_id):
                             if count > 0: batch.commit()
 
                         st.success(f"已更新 {updated_count} 筆資料！")
-                        _get_sentences_content.clear()
+                        sentence_cache.invalidate(selected_bid)
                         del st.session_state.editor_df
                         time.sleep(1)
                         st.rerun()
@@ -0,0 +1,145 @@
+"""
+錄音上傳前處理：去掉頭尾靜音、轉單聲道 16 kHz，再以精簡格式送出
+Gemini 音訊以秒計費（約 32 token / 秒），頭尾靜音去掉就直接少算；16 kHz 單聲道對語音辨識已足夠
+
+  - WAV（PCM 8 / 16 / 32 bit）：用標準庫 wave + NumPy 解碼，不需要其他套件
+  - webm / ogg / mp4：需要 pydub + ffmpeg 才能解碼；沒有安裝時原樣送出
+  - 輸出：有 pydub + ffmpeg 時編成 Ogg/Opus（約 3 KB / 秒）；否則 16 kHz 16-bit WAV（32 KB / 秒，10 秒約 320 KB）
+  - PreparedAudio.wav 另外保留 16 kHz WAV，給本地 SpeechRecognition 用（它只吃 WAV / AIFF / FLAC）
+"""
+import io
+import wave
+
+import numpy as np
+
+try:
+    from pydub import AudioSegment
+except ImportError:
+    AudioSegment = None
+
+TARGET_RATE = 16000
+FRAME_MS = 20
+SILENCE_DBFS = -45.0      # 低於這個音量的 frame 視為靜音
+RELATIVE_DB = 35.0        # 或比最大音量低這麼多（錄音整體偏小聲時）
+PAD_MS = 150              # 頭尾各保留一點，避免切掉子音
+OPUS_BITRATE = "24k"
+
+
+class PreparedAudio:
+    def __init__(self, data, mime, wav=None, original_size=0, seconds_before=None, seconds_after=None):
+        self.data = data
+        self.mime = mime
+        self.wav = wav
+        self.original_size = original_size
+        self.seconds_before = seconds_before
+        self.seconds_after = seconds_after
+
+    def __repr__(self):
+        return (f"PreparedAudio({self.mime}, {self.original_size} -> {len(self.data)} bytes, "
+                f"{self.seconds_before} -> {self.seconds_after} s)")
+
+
+# --- 解碼 ---
+def _decode_wav(data):
+    with wave.open(io.BytesIO(data)) as w:
+        width, channels, rate = w.getsampwidth(), w.getnchannels(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"unsupported sample width: {width}")
+    return samples.reshape(-1, channels), rate
+
+
+def _decode_with_pydub(data):
+    seg = AudioSegment.from_file(io.BytesIO(data))
+    samples = np.array(seg.get_array_of_samples(), dtype=np.float32) / float(1 << (8 * seg.sample_width - 1))
+    return samples.reshape(-1, seg.channels), seg.frame_rate
+
+
+def decode(data, mime=""):
+    """回傳 (float32 樣本 [frames, channels], 取樣率)；無法解碼回傳 None"""
+    try:
+        if data[:4] == b"RIFF":
+            return _decode_wav(data)
+        if AudioSegment is not None:
+            return _decode_with_pydub(data)
+    except Exception as e:
+        print(f"[AudioPreprocess] decode failed ({mime}): {e}")
+    return None
+
+
+# --- 處理 ---
+def to_mono(samples):
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def resample(samples, rate, target=TARGET_RATE):
+    """線性內插重新取樣（語音辨識用途足夠，不需要 scipy）"""
+    if rate == target or len(samples) == 0:
+        return samples
+    n = int(round(len(samples) * target / rate))
+    return np.interp(np.arange(n) * (rate / target), np.arange(len(samples)), samples).astype(np.float32)
+
+
+def trim_silence(samples, rate):
+    """依 FRAME_MS 的 RMS 音量找出第一個與最後一個有聲 frame，頭尾保留 PAD_MS；全部靜音時原樣回傳"""
+    frame = max(1, rate * FRAME_MS // 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return samples
+    rms = np.sqrt(np.mean(samples[:count * frame].reshape(count, frame) ** 2, axis=1))
+    db = 20 * np.log10(np.maximum(rms, 1e-10))
+    threshold = max(SILENCE_DBFS, db.max() - RELATIVE_DB)
+    voiced = np.flatnonzero(db > threshold)
+    if len(voiced) == 0:
+        return samples
+    pad = rate * PAD_MS // 1000
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+# --- 編碼 ---
+def encode_wav(samples, rate=TARGET_RATE):
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+def encode_opus(wav_bytes):
+    """16 kHz WAV -> Ogg/Opus；沒有 pydub / ffmpeg 時回傳 None"""
+    if AudioSegment is None:
+        return None
+    try:
+        out = io.BytesIO()
+        AudioSegment.from_wav(io.BytesIO(wav_bytes)).export(out, format="ogg", codec="libopus", bitrate=OPUS_BITRATE)
+        return out.getvalue()
+    except Exception as e:
+        print(f"[AudioPreprocess] opus encode failed: {e}")
+        return None
+
+
+def prepare_for_upload(data, mime="audio/webm"):
+    """去靜音 + 單聲道 16 kHz + 精簡編碼。無法解碼時原樣回傳（data / mime 不變，wav 為 None）"""
+    decoded = decode(data, mime)
+    if decoded is None:
+        return PreparedAudio(data, mime, original_size=len(data))
+    samples, rate = decoded
+    before = round(len(samples) / rate, 2)
+    mono = trim_silence(resample(to_mono(samples), rate), TARGET_RATE)
+    wav = encode_wav(mono)
+    out, out_mime = encode_opus(wav), "audio/ogg"
+    if out is None:
+        out, out_mime = wav, "audio/wav"
+    return PreparedAudio(out, out_mime, wav=wav, original_size=len(data),
+                         seconds_before=before, seconds_after=round(len(mono) / TARGET_RATE, 2))
@@ -0,0 +1,71 @@
+"""
+錄音前處理效能量測：原檔 vs. 去靜音 + 16 kHz 單聲道後的大小、秒數、估計 token 與處理時間
+用法：python bench_audio.py                  # 用合成錄音（48 kHz 立體聲，頭尾各約 1.5 / 2 秒靜音）
+      python bench_audio.py a.wav b.webm     # 量測實際錄音（webm / ogg 需要 pydub + ffmpeg）
+"""
+import base64
+import io
+import sys
+import time
+import wave
+
+import numpy as np
+
+import audio_preprocess as ap
+
+TOKENS_PER_SECOND = 32  # Gemini 音訊計費
+RUNS = 5
+
+
+def synthetic_recording(rate=48000, lead=1.5, speech=3.0, tail=2.0, seed=0):
+    """底噪 + 有音量起伏的諧波（模擬說話），立體聲 16-bit WAV"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(speech * rate)) / rate
+    voice = sum(np.sin(2 * np.pi * f * t) / k for k, f in enumerate((180, 360, 540, 720), 1))
+    voice *= 0.3 * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    signal = np.concatenate([np.zeros(int(lead * rate)), voice, np.zeros(int(tail * rate))])
+    signal += rng.normal(0, 0.002, len(signal))
+    pcm = (np.clip(np.stack([signal, signal], axis=1), -1, 1) * 32767).astype("<i2")
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+def bench(name, data, mime):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        prepared = ap.prepare_for_upload(data, mime)
+    ms = (time.perf_counter() - start) * 1000 / RUNS
+    b64_before = len(base64.b64encode(data))
+    b64_after = len(base64.b64encode(prepared.data))
+    print(f"\n{name}")
+    print(f"  格式     {mime} -> {prepared.mime}")
+    print(f"  大小     {len(data):,} -> {len(prepared.data):,} bytes（base64 {b64_before:,} -> {b64_after:,}，"
+          f"{b64_after / b64_before:.1%}）")
+    if prepared.seconds_before is not None:
+        print(f"  秒數     {prepared.seconds_before} -> {prepared.seconds_after} s"
+              f"（估計 token {prepared.seconds_before * TOKENS_PER_SECOND:.0f} -> "
+              f"{prepared.seconds_after * TOKENS_PER_SECOND:.0f}）")
+    else:
+        print("  無法解碼，原樣送出")
+    print(f"  處理時間 {ms:.1f} ms / 次（{RUNS} 次平均）")
+
+
+def main(paths):
+    print(f"pydub: {'有' if ap.AudioSegment is not None else '無（輸出 WAV）'}")
+    if not paths:
+        bench("合成錄音 48 kHz 立體聲 6.5 秒", synthetic_recording(), "audio/wav")
+        return
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        mime = "audio/wav" if data[:4] == b"RIFF" else "audio/ogg" if data[:4] == b"OggS" else "audio/webm"
+        bench(path, data, mime)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
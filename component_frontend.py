@@ -0,0 +1,70 @@
+"""
+句型口說 / 例句連連看的前端元件：靜態資源放在 drill_build/（bridge.js + drill / match 執行環境與 CSS）
+  - 以 Streamlit custom component 提供，同一個 key 的 iframe 在 rerun 之間保留，JS 只載入、解析一次
+  - Python 每次只送 config（數 KB），不再每題重組約 1000 行的 HTML 字串
+  - ASSET_VERSION 為靜態檔內容雜湊，加在資源網址上，改版後瀏覽器自動換新、平常直接用快取
+    bridge.js 由靜態的 index.html 載入，版本號隨 index.html 一起提交；修改前端資源後重新產生：
+      python component_frontend.py            # 重寫 drill_build/index.html
+      python component_frontend.py --check    # 只檢查，版本過期時回傳 1
+"""
+import hashlib
+import os
+import sys
+
+import streamlit.components.v1 as components
+
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "drill_build")
+INDEX_PATH = os.path.join(BUILD_DIR, "index.html")
+ASSET_FILES = ("bridge.js", "drill.js", "drill.css", "match.js", "match.css")
+
+
+def _asset_version():
+    h = hashlib.sha256()
+    for name in ASSET_FILES:
+        with open(os.path.join(BUILD_DIR, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+</head>
+<body>
+<div id="root"></div>
+<script src="bridge.js?v={version}"></script>
+</body>
+</html>
+"""
+
+
+def _index_is_current(version):
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            return f.read() == INDEX_HTML.format(version=version)
+    except OSError:
+        return False
+
+
+ASSET_VERSION = _asset_version()
+if not _index_is_current(ASSET_VERSION):
+    # import 時不寫檔（多個程序同時啟動會互相覆蓋、也會弄髒 checkout），只提醒
+    print("[WARN] drill_build/index.html 的 bridge.js 版本過期，請執行 python component_frontend.py 後提交")
+_frontend = components.declare_component("flashcard_drill", path=BUILD_DIR)
+
+
+def render(kind, config, key, height=0):
+    """kind：'drill' 或 'match'；height 為最小高度（實際高度由元件依內容回報）"""
+    return _frontend(kind=kind, config=config, version=ASSET_VERSION, height=height, key=key, default=None)
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv[1:]:
+        ok = _index_is_current(ASSET_VERSION)
+        print("✅ index.html 版本一致" if ok else f"❌ index.html 版本過期（應為 {ASSET_VERSION}）")
+        raise SystemExit(0 if ok else 1)
+    with open(INDEX_PATH, "w", encoding="utf-8") as f:
+        f.write(INDEX_HTML.format(version=ASSET_VERSION))
+    print(f"✅ 已寫入 {INDEX_PATH}（v={ASSET_VERSION}）")
@@ -0,0 +1,95 @@
+// Streamlit custom component 橋接（不需要 npm / streamlit-component-lib）
+// iframe 在 rerun 之間保留（同一個 key），drill.js / match.js 只在第一次 render 時載入；
+// 之後每次 rerun 只收到 config：內容相同時只更新 token，換一批題目時才重新掛載
+(function() {
+    // === iOS iframe 權限修復 ===
+    try {
+        const frames = window.parent.document.querySelectorAll('iframe');
+        frames.forEach(f => {
+            if (f.contentWindow === window) {
+                if (!f.getAttribute('allow') || !f.getAttribute('allow').includes('microphone')) {
+                    f.setAttribute('allow', 'microphone; autoplay');
+                }
+            }
+        });
+    } catch(e) { console.warn('Cannot set iframe allow attribute:', e); }
+
+    // === 偵測深色模式 ===
+    try {
+        const bg = getComputedStyle(window.parent.document.body).backgroundColor;
+        const m = bg.match(/\d+/g);
+        if (m) {
+            const avg = (parseInt(m[0]) + parseInt(m[1]) + parseInt(m[2])) / 3;
+            document.body.className = avg < 128 ? 'dark' : 'light';
+        } else {
+            document.body.className = 'dark';
+        }
+    } catch(e) {
+        document.body.className = 'dark';
+    }
+
+    const RUNTIMES = { drill: 'FlashcardDrill', match: 'FlashcardMatch' };
+    const VOLATILE = ['firestoreToken', 'proxyToken'];  // 每次 rerun 可能不同，但不需要重新掛載
+    const root = document.getElementById('root');
+    const loaded = {};
+    let current = null, currentSig = null, minHeight = 0;
+
+    function send(type, data) {
+        window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type }, data), '*');
+    }
+
+    // 回傳值給 Python（元件的回傳值；Streamlit 會因此 rerun）
+    function setValue(value) {
+        send('streamlit:setComponentValue', { value, dataType: 'json' });
+    }
+
+    function setHeight() {
+        send('streamlit:setFrameHeight', { height: Math.max(minHeight, document.documentElement.scrollHeight) });
+    }
+
+    function load(kind, version) {
+        if (!loaded[kind]) {
+            loaded[kind] = new Promise((resolve, reject) => {
+                const css = document.createElement('link');
+                css.rel = 'stylesheet';
+                css.href = `${kind}.css?v=${version}`;
+                document.head.appendChild(css);
+                const js = document.createElement('script');
+                js.src = `${kind}.js?v=${version}`;
+                js.onload = () => resolve(window[RUNTIMES[kind]]);
+                js.onerror = reject;
+                document.head.appendChild(js);
+            });
+        }
+        return loaded[kind];
+    }
+
+    function signature(kind, config) {
+        const stable = {};
+        for (const [k, v] of Object.entries(config)) if (!VOLATILE.includes(k)) stable[k] = v;
+        return kind + ':' + JSON.stringify(stable);
+    }
+
+    async function render(args) {
+        const { kind, config, version } = args;
+        minHeight = args.height || 0;
+        const runtime = await load(kind, version);
+        const sig = signature(kind, config);
+        if (current && sig === currentSig) {
+            current.update(config);
+        } else {
+            if (current) current.destroy();
+            current = runtime.mount(root, config, { setValue });
+            currentSig = sig;
+        }
+        setHeight();
+    }
+
+    window.addEventListener('message', e => {
+        if (e.data && e.data.type === 'streamlit:render') {
+            render(e.data.args).catch(err => console.error('[bridge] render failed:', err));
+        }
+    });
+    new ResizeObserver(setHeight).observe(document.body);
+    send('streamlit:componentReady', { apiVersion: 1 });
+})();
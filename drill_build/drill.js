@@ -0,0 +1,1280 @@
+// 句型口說練習執行環境（靜態資源：由 bridge.js 載入一次，之後每題只收到 config）
+// 全程由 JS 控制：TTS → 錄音 → VAD 靜音偵測 → Cloud Function Proxy → 回饋 → Firestore 寫入
+window.FlashcardDrill = (function() {
+    const MARKUP = `
+<div id="drill-app">
+    <div class="drill-nav">
+        <button class="nav-btn" id="prev-btn">← 上一題</button>
+        <span class="drill-position" id="drill-position"></span>
+        <button class="nav-btn" id="next-btn">下一題 →</button>
+    </div>
+    <div class="drill-header">
+        <div class="drill-round" id="drill-round"></div>
+        <div class="drill-template" id="drill-template"></div>
+    </div>
+    <div class="drill-options" id="drill-options"></div>
+    <div class="drill-main">
+        <div class="drill-sentence" id="drill-sentence"></div>
+        <div class="drill-status" id="drill-status">按下開始，AI 會帶你逐句練習</div>
+        <div class="drill-sync" id="drill-sync" style="display:none;"></div>
+        <div class="vol-bar-container" id="vol-bars" style="display:none;"></div>
+        <button class="done-btn" id="done-btn" style="display:none;">✋ 我說完了</button>
+    </div>
+    <div class="drill-history" id="drill-history"></div>
+    <div style="text-align:center; margin:12px 0;">
+        <div class="speed-control" id="speed-control">
+            <span style="font-size:0.8rem; opacity:0.6;">🔊 語速</span>
+            <button class="speed-btn" data-rate="0.5">慢</button>
+            <button class="speed-btn" data-rate="0.85">中</button>
+            <button class="speed-btn" data-rate="1.0">快</button>
+        </div>
+        <button class="drill-start-btn" id="start-btn">🎯 開始練習</button>
+    </div>
+    <div id="drill-complete" class="drill-complete" style="display:none;"></div>
+</div>
+`;
+
+    // === Firestore 寫入佇列（IndexedDB outbox）===
+    // 所有寫入先排進佇列，合併成 documents:commit 批次送出（一輪練習只剩幾個請求）：
+    //   - 同一文件的 update 合併欄位與 updateMask；同一欄位的 increment 相加
+    //   - 最後一筆寫入後閒置 IDLE_MS 送出（最多延遲 MAX_DELAY_MS）；flush() 立即送出
+    //   - 切到背景 / 離開頁面（visibilitychange、pagehide）時以 keepalive 依序送出
+    // 離線保護（學校 Wi-Fi 不穩時不丟進度）：
+    //   - 每一批（含累積中的一批）都存進 IndexedDB，確認送達才刪除；下次開啟時補送之前沒送出的批次
+    //   - 每批附一筆 drill_outbox/{批次 id} 標記文件（precondition exists:false）：同一批重送時
+    //     Firestore 回 ALREADY_EXISTS，整批不套用並視為已送達，increment 不會重複累加
+    //   - 標記文件帶 expires_at（批次建立後 OUTBOX_TTL_MS），由 Firestore TTL 政策清除，不會無限累積
+    //   - 網路錯誤、401 / 409 / 429 / 5xx 以指數退避重試（1 秒起、最多 60 秒）；恢復連線（online）立即重試
+    //   - 其他錯誤（格式錯誤、FAILED_PRECONDITION 等）丟棄該批並記入 drill log（fs_commit_error）
+    //   - 不支援 IndexedDB（部分無痕模式）時只用記憶體，行為同上但關閉頁面後無法補送
+    // 同一個 iframe 只有一個佇列（writeQueue()），換題時由新掛載的題目接手
+    const IDLE_MS = 3000;
+    const MAX_DELAY_MS = 15000;
+    const MAX_WRITES = 499;  // documents:commit 上限 500，保留一筆給標記文件
+    const BACKOFF_MIN_MS = 1000;
+    const BACKOFF_MAX_MS = 60000;
+    const STALE_OPEN_MS = 60000;  // 其他分頁累積中的批次超過這麼久沒更新，才視為遺留並接手補送
+    const RELOAD_FLUSH_MS = 5000;  // 超出預載批次時，最多等寫入佇列這麼久再請伺服器重新預載
+    const OUTBOX_TTL_MS = 30 * 86400000;  // 標記文件保留 30 天；離線超過這麼久才補送的批次可能重複套用
+    const DB_NAME = 'flashcard-drill';
+    const STORE = 'outbox';
+
+    function openDb() {
+        return new Promise(resolve => {
+            try {
+                const req = indexedDB.open(DB_NAME, 1);
+                req.onupgradeneeded = () => req.result.createObjectStore(STORE, { keyPath: 'id' });
+                req.onsuccess = () => resolve(req.result);
+                req.onerror = req.onblocked = () => resolve(null);
+            } catch(e) { resolve(null); }
+        });
+    }
+
+    function idb(db, mode, fn) {
+        return new Promise(resolve => {
+            if (!db) return resolve(null);
+            try {
+                const tx = db.transaction(STORE, mode);
+                const req = fn(tx.objectStore(STORE));
+                tx.oncomplete = () => resolve(req ? req.result : null);
+                tx.onerror = tx.onabort = () => resolve(null);
+            } catch(e) { resolve(null); }
+        });
+    }
+
+    function newBatchId() {
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 10);
+    }
+
+    function mergeFields(into, from) {
+        for (const [k, v] of Object.entries(from)) {
+            if (v.mapValue && into[k] && into[k].mapValue) {
+                into[k].mapValue.fields = into[k].mapValue.fields || {};
+                mergeFields(into[k].mapValue.fields, v.mapValue.fields || {});
+            } else {
+                into[k] = v;
+            }
+        }
+    }
+
+    // 併入同一批中同一文件的寫入；回傳 true 表示已合併
+    function coalesce(writes, write) {
+        if (write.update) {
+            const same = writes.find(w => w.update && w.update.name === write.update.name);
+            if (!same) return false;
+            if (!write.updateMask) {          // 新寫入是整份覆蓋
+                same.update = write.update;
+                delete same.updateMask;
+            } else {
+                mergeFields(same.update.fields = same.update.fields || {}, write.update.fields || {});
+                if (same.updateMask) {
+                    const paths = new Set(same.updateMask.fieldPaths.concat(write.updateMask.fieldPaths));
+                    same.updateMask.fieldPaths = [...paths];
+                }
+            }
+            return true;
+        }
+        if (write.transform) {
+            const same = writes.find(w => w.transform && w.transform.document === write.transform.document);
+            if (!same) return false;
+            for (const ft of write.transform.fieldTransforms) {
+                const old = same.transform.fieldTransforms.find(f => f.fieldPath === ft.fieldPath);
+                if (old && old.increment && ft.increment && old.increment.integerValue !== undefined && ft.increment.integerValue !== undefined) {
+                    old.increment.integerValue = String(parseInt(old.increment.integerValue) + parseInt(ft.increment.integerValue));
+                } else {
+                    same.transform.fieldTransforms.push(ft);
+                }
+            }
+            return true;
+        }
+        return false;
+    }
+
+    function createWriteQueue() {
+        const owner = newBatchId();   // 這個 iframe 的識別，區分其他分頁累積中的批次
+        const dbReady = openDb();
+        let cfg = null;
+        let onError = () => {}, onPending = () => {};
+        let open = null;       // 累積中的一批 {id, owner, project, markerPath, writes, sealed, updatedAt}
+        let sealed = [];       // 待送的批次（依 id 排序）
+        let timer = null, firstAt = 0;
+        let retryTimer = null, backoff = 0, sending = null, draining = false, restored = false;
+        const stats = { commits: 0, writes: 0, coalesced: 0, retries: 0, replayed: 0, dropped: 0 };
+
+        function save(rec) { dbReady.then(db => idb(db, 'readwrite', s => s.put(rec))); }
+        function forget(id) { dbReady.then(db => idb(db, 'readwrite', s => s.delete(id))); }
+
+        function pendingCount() {
+            return sealed.reduce((n, r) => n + r.writes.length, 0) + (open ? open.writes.length : 0);
+        }
+
+        function notify() {
+            onPending(pendingCount(), { retrying: !!retryTimer, offline: navigator.onLine === false });
+        }
+
+        function docName(path) {
+            return `projects/${cfg.firestoreProject}/databases/(default)/documents/${path}`;
+        }
+
+        function schedule() {
+            const now = Date.now();
+            if (!firstAt) firstAt = now;
+            clearTimeout(timer);
+            timer = setTimeout(() => flush(), Math.max(0, Math.min(IDLE_MS, firstAt + MAX_DELAY_MS - now)));
+        }
+
+        function add(write) {
+            if (!open) {
+                const id = newBatchId();
+                const basePath = cfg.firestoreDocPath.split('/').slice(0, 4).join('/');
+                open = { id, owner, project: cfg.firestoreProject, markerPath: `${basePath}/drill_outbox/${id}`, writes: [], sealed: false };
+            }
+            if (coalesce(open.writes, write)) stats.coalesced++;
+            else open.writes.push(write);
+            open.updatedAt = Date.now();
+            if (open.writes.length >= MAX_WRITES) seal();
+            else save(open);
+            schedule();
+            notify();
+        }
+
+        // path 為文件路徑（documents/ 之後）；fields 為 Firestore REST 格式，mask 省略時整份覆蓋
+        function update(path, fields, mask) {
+            const write = { update: { name: docName(path), fields } };
+            if (mask) write.updateMask = { fieldPaths: mask };
+            add(write);
+        }
+
+        function increment(path, increments) {
+            add({ transform: {
+                document: docName(path),
+                fieldTransforms: Object.entries(increments).map(([fieldPath, n]) => ({
+                    fieldPath, increment: { integerValue: String(n) }
+                })),
+            } });
+        }
+
+        // 累積中的一批封存為待送批次（內容不再變動，重送時才能靠標記文件判斷是否已送達）
+        function seal() {
+            clearTimeout(timer);
+            timer = null;
+            firstAt = 0;
+            if (!open) return;
+            open.sealed = true;
+            save(open);
+            sealed.push(open);
+            open = null;
+        }
+
+        function settle(rec) {
+            sealed = sealed.filter(r => r.id !== rec.id);
+            forget(rec.id);
+        }
+
+        // 回傳 'ok'（含先前已送達）/ 'retry' / 'drop'
+        async function post(rec, keepalive) {
+            const createdAt = parseInt(rec.id, 36);
+            const marker = {
+                update: {
+                    name: `projects/${rec.project}/databases/(default)/documents/${rec.markerPath}`,
+                    fields: { created_at: { timestampValue: new Date(createdAt).toISOString() },
+                              expires_at: { timestampValue: new Date(createdAt + OUTBOX_TTL_MS).toISOString() },
+                              writes: { integerValue: String(rec.writes.length) } },
+                },
+                currentDocument: { exists: false },
+            };
+            let status = 0, errText = '';
+            try {
+                const res = await fetch(`https://firestore.googleapis.com/v1/projects/${rec.project}/databases/(default)/documents:commit`, {
+                    method: 'POST',
+                    keepalive,
+                    headers: {
+                        'Authorization': 'Bearer ' + cfg.firestoreToken,
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ writes: rec.writes.concat([marker]) })
+                });
+                if (res.ok) return 'ok';
+                status = res.status;
+                errText = await res.text().catch(() => '');
+            } catch(e) {
+                errText = e.message || 'fetch_error';
+            }
+            // 只有 ALREADY_EXISTS 代表標記文件已存在（這一批先前已送達）；FAILED_PRECONDITION 等其他錯誤
+            // 表示這一批沒有套用，走下面的錯誤記錄，不能當成已送達
+            if (status === 409 && errText.includes('ALREADY_EXISTS')) {
+                stats.replayed++;
+                return 'ok';
+            }
+            console.error('[fsQueue] commit failed:', status, errText);
+            onError(status, errText.slice(0, 100));
+            if (status === 0 || status === 401 || status === 409 || status === 429 || status >= 500) return 'retry';
+            return 'drop';
+        }
+
+        function retryLater() {
+            stats.retries++;
+            backoff++;
+            const delay = Math.min(BACKOFF_MAX_MS, BACKOFF_MIN_MS * 2 ** (backoff - 1)) * (0.5 + Math.random() / 2);
+            clearTimeout(retryTimer);
+            retryTimer = setTimeout(() => { retryTimer = null; pump(); }, delay);
+        }
+
+        // 一批送達（'ok'）或丟棄（'drop'）：移出佇列並計數
+        function finish(rec, result) {
+            if (!sealed.includes(rec)) return;  // flushNow 與 pump 同時送了同一批，只算一次
+            backoff = 0;
+            settle(rec);
+            if (result === 'ok') {
+                stats.commits++;
+                stats.writes += rec.writes.length;
+            } else {
+                stats.dropped += rec.writes.length;
+            }
+            notify();
+        }
+
+        // 依序送出待送批次（同一時間只有一批在途，保持寫入順序）；已在送時回傳同一個 promise，
+        // 送完（含途中新封存的批次）或進入退避才 resolve
+        function pump() {
+            if (!sending) sending = drain().finally(() => { sending = null; notify(); });
+            return sending;
+        }
+
+        async function drain() {
+            if (draining || retryTimer || !cfg) return;
+            while (sealed.length && !draining) {
+                const rec = sealed[0];
+                const result = await post(rec, false);
+                if (result === 'retry') {
+                    if (!draining) retryLater();
+                    return;
+                }
+                finish(rec, result);
+            }
+        }
+
+        async function flush() {
+            seal();
+            await pump();
+        }
+
+        // 頁面即將隱藏 / 卸載：不等退避，以 keepalive 依序送出（前一批確認後才送下一批，保持寫入順序，
+        // 例如 completed_options 先後兩次覆蓋）。pump 在途的那一批會再送一次，由標記文件擋下；
+        // 頁面關閉後沒來得及送的批次留在 IndexedDB，下次開啟補送
+        async function flushNow() {
+            seal();
+            if (draining || !cfg) return;
+            draining = true;
+            clearTimeout(retryTimer);
+            retryTimer = null;
+            try {
+                while (sealed.length) {
+                    const rec = sealed[0];
+                    const result = await post(rec, true);
+                    if (result === 'retry') break;
+                    finish(rec, result);
+                }
+            } finally {
+                draining = false;
+            }
+            if (sealed.length) retryLater();  // 頁面還在（例如只是切到背景）：交回 pump 退避重試
+            else notify();
+        }
+
+        // 補送 IndexedDB 中之前沒送出的批次（上次關閉頁面、斷線、其他分頁遺留）
+        async function restore() {
+            const db = await dbReady;
+            const recs = (await idb(db, 'readonly', s => s.getAll())) || [];
+            const known = new Set(sealed.map(r => r.id).concat(open ? [open.id] : []));
+            const now = Date.now();
+            for (const rec of recs) {
+                if (known.has(rec.id) || rec.owner === owner) continue;
+                if (!rec.sealed && now - (rec.updatedAt || 0) < STALE_OPEN_MS) continue;  // 其他分頁還在累積
+                rec.sealed = true;
+                sealed.push(rec);
+            }
+            sealed.sort((a, b) => (a.id < b.id ? -1 : a.id > b.id ? 1 : 0));
+            notify();
+            pump();
+        }
+
+        function onVisibility() { if (document.visibilityState === 'hidden') flushNow(); }
+        function onOnline() {
+            clearTimeout(retryTimer);
+            retryTimer = null;
+            backoff = 0;
+            pump();
+        }
+        document.addEventListener('visibilitychange', onVisibility);
+        window.addEventListener('pagehide', flushNow);
+        window.addEventListener('online', onOnline);
+        window.addEventListener('offline', notify);
+
+        const api = { update, increment, flush, close, stats, pending: pendingCount };
+
+        // 掛載的題目接手佇列：之後用它的 token 送出、把待送筆數回報給它的畫面
+        function attach(CFG, handlers) {
+            cfg = CFG;
+            onError = handlers.onError || (() => {});
+            onPending = handlers.onPending || (() => {});
+            if (!restored) {
+                restored = true;
+                restore();
+            }
+            notify();
+            return api;
+        }
+
+        // 題目卸載：剩下的立即送出，送不出去的留在 IndexedDB 給下一題 / 下次開啟補送
+        function close() {
+            onError = () => {};
+            onPending = () => {};
+            flushNow();
+        }
+
+        return { attach, flush };
+    }
+
+    let _writeQueue = null;
+    function writeQueue() {
+        if (!_writeQueue) _writeQueue = createWriteQueue();
+        return _writeQueue;
+    }
+
+    // 掛載一題：root 內容整個重建，回傳 {update(cfg), loading(), destroy()}
+    // hooks 由 mount() 提供：shared（同一批共用的 AI 判讀次數、語速）、go(±1) 切題、onProgress 回寫本機進度
+    function mountSentence(root, CFG, hooks) {
+        root.innerHTML = MARKUP;
+        let alive = true;  // destroy 後為 false，進行中的流程在下一個 await 之後停止
+        const STARS = (n) => n >= 5 ? '⭐⭐⭐' : n >= 3 ? '⭐⭐' : n >= 1 ? '⭐' : '';
+        const $ = id => document.getElementById(id);
+
+        let S = {
+            optIdx: 0, phase: 'idle', tries: {}, results: {},
+            stream: null, analyser: null, audioCtx: null, history: [],
+            completionCount: CFG.completionCount,  // 本機累計輪數（寫入不必再讀回）
+            vadThreshold: CFG.silenceThreshold,  // VAD 門檻，startDrill 時偵測一次
+        };
+
+        // === Error Log ===
+        const _logSessionId = Date.now().toString();
+        const _logEvents = [];
+        const _logDevice = {
+            ua: navigator.userAgent,
+            platform: navigator.platform || '',
+            screen: `${screen.width}x${screen.height}`,
+            sr: !!(window.SpeechRecognition || window.webkitSpeechRecognition),
+        };
+
+        function logEvent(type, detail) {
+            _logEvents.push({
+                t: new Date().toISOString(),
+                type,
+                detail: typeof detail === 'object' ? JSON.stringify(detail) : String(detail || ''),
+            });
+        }
+
+        const fsQueue = writeQueue().attach(CFG, {
+            onError: (status, text) => logEvent('fs_commit_error', `${status} ${text}`),
+            onPending: renderSync,
+        });
+
+        function flushLog() {
+            if (_logEvents.length === 0) return;
+            // 從 firestoreDocPath 取得 user base path（前 4 段）
+            const parts = CFG.firestoreDocPath.split('/');
+            const basePath = parts.slice(0, 4).join('/');
+            const data = {
+                started_at: new Date(parseInt(_logSessionId)).toISOString(),
+                device: _logDevice,
+                template: CFG.template,
+                dataset_id: CFG.datasetId,
+                events: _logEvents,
+            };
+            const fields = {};
+            for (const [k, v] of Object.entries(data)) fields[k] = toFsValue(v);
+            fsQueue.update(`${basePath}/drill_logs/${_logSessionId}`, fields);
+        }
+
+        // === UI ===
+        function renderOptions() {
+            $('drill-options').innerHTML = CFG.options.map((opt, i) => {
+                let cls = 'opt ';
+                if (S.results[opt]) cls += 'opt-done';
+                else if (i === S.optIdx && S.phase !== 'idle' && S.phase !== 'done') cls += 'opt-active';
+                else cls += 'opt-pending';
+                const tries = S.tries[opt] || 0;
+                const icon = S.results[opt] ? '✅' : (i === S.optIdx && S.phase !== 'idle' ? '🎯' : '○');
+                const triesText = tries > 0 ? ` (${tries})` : '';
+                return `<span class="${cls}">${icon} ${opt}${triesText}</span>`;
+            }).join('');
+        }
+
+        function setStatus(text) { $('drill-status').textContent = text; }
+
+        // 待同步筆數（寫入佇列回報）：有待送資料才顯示；重試中 / 離線時提示稍後自動補送
+        function renderSync(count, state) {
+            const el = $('drill-sync');
+            if (!el) return;
+            if (count === 0) {
+                el.style.display = 'none';
+                return;
+            }
+            const stalled = state.retrying || state.offline;
+            el.className = 'drill-sync' + (stalled ? ' stalled' : '');
+            el.textContent = stalled
+                ? `📴 網路不穩，${count} 筆紀錄待同步（恢復連線後自動補送）`
+                : `☁️ ${count} 筆紀錄同步中`;
+            el.style.display = 'block';
+        }
+
+        function showSentence(word) {
+            if (word) {
+                const s = CFG.template.replace('___', word);
+                $('drill-sentence').innerHTML = s.replace(word, `<b style="color:#ff9800">${word}</b>`);
+            } else { $('drill-sentence').textContent = ''; }
+        }
+
+        function showFeedback(word, result) {
+            S.history.push({ word, ...result });
+        }
+
+        function renderHistory() {
+            $('drill-history').innerHTML = S.history.map(h => {
+                const cls = h.is_correct ? 'correct' : 'wrong';
+                return `<div class="history-item ${cls}">
+                    ${h.is_correct ? '✅' : '❌'} <b>${h.word}</b>：${h.transcript || ''}
+                    <br><span style="opacity:0.7">💡 ${h.feedback || ''}</span>
+                </div>`;
+            }).reverse().join('');
+        }
+
+        function initVolBars() {
+            $('vol-bars').innerHTML = Array(20).fill('<div class="vol-bar" style="height:4px;"></div>').join('');
+            $('vol-bars').style.display = 'flex';
+        }
+
+        function updateVolBars(volume) {
+            const bars = $('vol-bars').children;
+            for (let i = 0; i < bars.length; i++) {
+                const threshold = (i / bars.length) * 50;
+                if (volume > threshold) {
+                    bars[i].style.height = Math.min(30, 4 + volume * 0.5) + 'px';
+                    bars[i].classList.add('active');
+                } else {
+                    bars[i].style.height = '4px';
+                    bars[i].classList.remove('active');
+                }
+            }
+        }
+
+        // === AUDIO ===
+        async function initAudio() {
+            // 單聲道 + 瀏覽器端降噪，錄音檔較小、辨識較穩
+            S.stream = await navigator.mediaDevices.getUserMedia({ audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true } });
+            S.audioCtx = new (window.AudioContext || window.webkitAudioContext)();
+            S.analyser = S.audioCtx.createAnalyser();
+            S.analyser.fftSize = 256;
+            S.audioCtx.createMediaStreamSource(S.stream).connect(S.analyser);
+        }
+
+        function getVolume() {
+            const data = new Uint8Array(S.analyser.frequencyBinCount);
+            S.analyser.getByteFrequencyData(data);
+            return data.reduce((a, b) => a + b, 0) / data.length;
+        }
+
+        // 偵測環境底噪（取 0.5 秒平均值）
+        function measureNoiseFloor() {
+            return new Promise(resolve => {
+                const samples = [];
+                const measure = () => {
+                    samples.push(getVolume());
+                    if (samples.length < 10) { setTimeout(measure, 50); return; }  // 10 次 × 50ms = 0.5 秒
+                    const avg = samples.reduce((a, b) => a + b, 0) / samples.length;
+                    resolve(avg);
+                };
+                measure();
+            });
+        }
+
+        function recordUntilSilence() {
+            return new Promise((resolve) => {
+                const threshold = S.vadThreshold;
+                const doneBtn = $('done-btn');
+
+                const chunks = [];
+                let mimeType = 'audio/webm';
+                if (!MediaRecorder.isTypeSupported(mimeType)) {
+                    mimeType = 'audio/mp4';
+                    if (!MediaRecorder.isTypeSupported(mimeType)) mimeType = '';
+                }
+                // 語音 32 kbps 已足夠（預設常是 128 kbps），10 秒錄音約 40 KB，遠低於 proxy 的 2MB 上限
+                const recOpts = { audioBitsPerSecond: 32000 };
+                if (mimeType) recOpts.mimeType = mimeType;
+                const rec = new MediaRecorder(S.stream, recOpts);
+                rec.ondataavailable = e => { if (e.data.size > 0) chunks.push(e.data); };
+                let _speechDetected = false;
+                rec.onstop = () => {
+                    doneBtn.style.display = 'none';
+                    doneBtn.onclick = null;
+                    resolve({ blob: new Blob(chunks, { type: mimeType || 'audio/webm' }), speechDetected: _speechDetected });
+                };
+                rec.start(100);
+
+                // 手動停止按鈕
+                doneBtn.style.display = 'inline-block';
+                doneBtn.onclick = () => { if (rec.state === 'recording') rec.stop(); };
+
+                const MAX_RECORD_MS = 10000;  // 最長錄音 10 秒
+                let silenceStart = null, speechDetected = false, elapsed = 0, speechFrames = 0;
+                const check = () => {
+                    if (rec.state !== 'recording') return;
+                    if (!alive) { rec.stop(); return; }
+                    elapsed += 50;
+                    const vol = getVolume();
+                    updateVolBars(vol);
+                    if (vol > threshold) {
+                        speechFrames++;
+                        // 需要連續 3 幀（150ms）以上才算真正說話，避免 TTS 殘餘音誤觸發
+                        if (speechFrames >= 3) { speechDetected = true; _speechDetected = true; }
+                        silenceStart = null;
+                    } else {
+                        speechFrames = 0;
+                        if (speechDetected) {
+                            if (!silenceStart) silenceStart = Date.now();
+                            else if (Date.now() - silenceStart > CFG.silenceDuration) { rec.stop(); return; }
+                        }
+                    }
+                    // 超時保底：未說話 15 秒 或 錄音達 10 秒
+                    if (!speechDetected && elapsed > 15000) { rec.stop(); return; }
+                    if (elapsed > MAX_RECORD_MS) { rec.stop(); return; }
+                    setTimeout(check, 50);
+                };
+                setTimeout(check, 500);
+            });
+        }
+
+        // === TTS（iOS 相容） ===
+        const _syn = window.parent.speechSynthesis || window.speechSynthesis;
+        let _ttsUnlocked = false;
+
+        // iOS Safari 要求 speechSynthesis 在使用者手勢中同步呼叫一次才能解鎖
+        function unlockTTS() {
+            if (_ttsUnlocked || !_syn) return;
+            const u = new SpeechSynthesisUtterance('');
+            u.volume = 0;
+            _syn.speak(u);
+            _ttsUnlocked = true;
+        }
+
+        function playTTS(text) {
+            return new Promise(resolve => {
+                if (!_syn) { resolve(); return; }
+                _syn.cancel();
+                const u = new SpeechSynthesisUtterance(text);
+                u.lang = 'en-US'; u.rate = CFG.ttsRate;
+                u.onend = () => setTimeout(resolve, 300);
+                u.onerror = () => resolve();
+                // iOS 有時 onend 不觸發，加超時保底
+                const timeout = setTimeout(() => resolve(), 8000);
+                const origEnd = u.onend;
+                u.onend = () => { clearTimeout(timeout); origEnd(); };
+                _syn.speak(u);
+            });
+        }
+
+        // === AI 判讀（透過 Cloud Function proxy，多模型降級 + 語音辨識 fallback） ===
+        const MODELS = ['gemini-2.5-flash'];
+        let modelIdx = 0; // 目前使用的模型索引，429 時往下降級
+
+        function blobToBase64(blob) {
+            return new Promise(resolve => {
+                const reader = new FileReader();
+                reader.onloadend = () => resolve(reader.result.split(',')[1]);
+                reader.readAsDataURL(blob);
+            });
+        }
+
+        function buildPrompt(sentence, targetWord) {
+            return `Context: English pronunciation practice for non-native speakers.
+    The student is practicing: "${sentence}"
+    Target word in the blank: "${targetWord}"
+
+    Listen to the audio and evaluate.
+    These are young non-native learners, so be encouraging but fair.
+    Rules:
+    - The student MUST attempt the FULL sentence, not just the target word alone
+    - Accept ANY article substitution (a/an/the/omitted)
+    - Accept tense variations (is/was/are)
+    - Accept imperfect pronunciation as long as words are identifiable
+    - Mark INCORRECT if: only said the target word without sentence structure, or skipped major parts of the sentence
+    - Mark CORRECT if: the target word is recognizable AND the student attempted most of the sentence structure
+
+    Pronunciation Feedback (Traditional Chinese, 1-2 lines):
+    - Point out any mispronounced words with correct pronunciation
+    - Note missing/substituted words briefly
+    - If good, give brief praise AND one tip for sounding more natural
+
+    Return JSON:
+    {"is_correct": true, "transcript": "what you heard", "feedback": "feedback in Traditional Chinese"}`;
+        }
+
+        async function callGeminiWithModel(model, base64, mimeType, prompt) {
+            const res = await fetch(CFG.proxyUrl, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': 'Bearer ' + CFG.proxyToken,
+                },
+                body: JSON.stringify({
+                    model: model,
+                    contents: [{ parts: [
+                        { text: prompt },
+                        { inline_data: { mime_type: mimeType, data: base64 } }
+                    ] }],
+                    generationConfig: { responseMimeType: 'application/json' }
+                })
+            });
+            if (res.status === 429 || res.status === 404 || res.status === 403) return 'quota';
+            if (!res.ok) return null;
+            const data = await res.json();
+            const tokenCount = data.usageMetadata?.totalTokenCount || 0;
+            let text = data.candidates[0].content.parts[0].text;
+            if (text.includes('```json')) text = text.split('```json')[1].split('```')[0];
+            else if (text.includes('```')) text = text.split('```')[1].split('```')[0];
+            const parsed = JSON.parse(text.trim());
+            parsed._tokenCount = tokenCount;
+            return parsed;
+        }
+
+        // 用同一段錄音依序嘗試：2.5 → 2.0 → 1.5 → 語音辨識
+        async function evaluate(audioBlob, targetWord, srTranscripts) {
+            const sentence = CFG.template.replace('___', targetWord);
+
+            // 免費用戶每日額度檢查（drillRemaining == -1 表示 Premium 無限）
+            const remaining = CFG.drillRemaining < 0 ? Infinity : CFG.drillRemaining - hooks.shared.drillUsed;
+            if (remaining <= 0) {
+                setStatus('🎙️ 今日 AI 額度已用完，語音比對中...');
+                return textMatch(srTranscripts, targetWord, sentence);
+            }
+
+            const base64 = await blobToBase64(audioBlob);
+            const mimeType = audioBlob.type || 'audio/webm';
+            const prompt = buildPrompt(sentence, targetWord);
+
+            // 從目前的 modelIdx 開始嘗試
+            for (let i = modelIdx; i < MODELS.length; i++) {
+                const model = MODELS[i];
+                setStatus(`🤖 ${model} 分析中...`);
+                try {
+                    const result = await callGeminiWithModel(model, base64, mimeType, prompt);
+                    if (result === 'quota') {
+                        console.warn('[Drill] ' + model + ' quota exceeded, trying next...');
+                        logEvent('gemini_quota', model);
+                        modelIdx = i + 1; // 之後直接跳過這個模型
+                        continue;
+                    }
+                    if (result) {
+                        // 記錄 token 使用量 + 判讀次數（合併一次寫入）
+                        const tc = result._tokenCount || 0;
+                        delete result._tokenCount;
+                        hooks.shared.drillUsed++;  // 同一批的各題共用額度
+                        recordUsageToFirestore(tc);
+                        return result;
+                    }
+                } catch(e) {
+                    console.warn('[Drill] ' + model + ' error:', e.message);
+                    logEvent('gemini_error', `${model}: ${e.message}`);
+                    return { is_correct: false, transcript: '', feedback: '分析失敗：' + e.message };
+                }
+            }
+
+            // 所有 Gemini 模型都不可用 → 語音辨識 fallback
+            setStatus('🎙️ 語音比對中...');
+            return textMatch(srTranscripts, targetWord, sentence);
+        }
+
+        // === 瀏覽器語音辨識（錄音時同步執行） ===
+        let _srAvailable = !!(window.SpeechRecognition || window.webkitSpeechRecognition);
+
+        function speechRecognize() {
+            return new Promise(resolve => {
+                const SR = window.SpeechRecognition || window.webkitSpeechRecognition;
+                if (!SR) { _srAvailable = false; resolve(null); return; }
+                const rec = new SR();
+                rec.lang = 'en-US';
+                rec.interimResults = false;
+                rec.maxAlternatives = 3;
+                let resolved = false;
+                rec.onresult = (e) => {
+                    if (resolved) return;
+                    resolved = true;
+                    const results = [];
+                    for (let i = 0; i < e.results[0].length; i++) {
+                        results.push(e.results[0][i].transcript.toLowerCase().trim());
+                    }
+                    resolve(results);
+                };
+                rec.onerror = (e) => { if (!resolved) { resolved = true; if (e.error === 'not-allowed') _srAvailable = false; resolve(null); } };
+                rec.onend = () => { if (!resolved) { resolved = true; resolve(null); } };
+                setTimeout(() => { if (!resolved) { resolved = true; try { rec.stop(); } catch(e) {} resolve(null); } }, 12000);
+                try { rec.start(); } catch(e) { _srAvailable = false; resolved = true; resolve(null); }
+            });
+        }
+
+        function textMatch(transcripts, targetWord, sentence) {
+            if (!transcripts || transcripts.length === 0) {
+                return { is_correct: false, transcript: '', feedback: '無法辨識語音，請再試一次。' };
+            }
+            const target = targetWord.toLowerCase();
+            const stopWords = new Set(['a','an','the','is','are','was','were','very','this','that','it','to','of','in','on','for']);
+            const keyWords = sentence.toLowerCase().split(/\s+/).filter(w => w.length > 2 && !stopWords.has(w));
+
+            for (const transcript of transcripts) {
+                const words = transcript.toLowerCase().split(/\s+/);
+                const hasTarget = words.some(w => w.includes(target) || target.includes(w));
+                if (!hasTarget) continue;
+                const matched = keyWords.filter(kw => words.some(w => w.includes(kw) || kw.includes(w)));
+                if (matched.length >= Math.ceil(keyWords.length * 0.4)) {
+                    return { is_correct: true, transcript, feedback: '（語音辨識模式）發音不錯，繼續加油！' };
+                }
+            }
+            return { is_correct: false, transcript: transcripts[0], feedback: '（語音辨識模式）請試著唸完整句子：' + sentence };
+        }
+
+        // === FIRESTORE REST API ===
+        function toFsValue(val) {
+            if (typeof val === 'string') return { stringValue: val };
+            if (typeof val === 'number') return Number.isInteger(val) ? { integerValue: String(val) } : { doubleValue: val };
+            if (typeof val === 'boolean') return { booleanValue: val };
+            if (Array.isArray(val)) return { arrayValue: { values: val.map(toFsValue) } };
+            if (val && typeof val === 'object') {
+                const fields = {};
+                for (const [k, v] of Object.entries(val)) fields[k] = toFsValue(v);
+                return { mapValue: { fields } };
+            }
+            return { nullValue: null };
+        }
+
+        function fsWrite(data) {
+            const fields = {};
+            for (const [k, v] of Object.entries(data)) fields[k] = toFsValue(v);
+            fsQueue.update(CFG.firestoreDocPath, fields, Object.keys(data));
+        }
+
+        // 記錄 AI token 使用量 + 判讀次數（fieldTransforms.increment，原子操作；同一批內相加）
+        function recordUsageToFirestore(tokenCount) {
+            if (!CFG.firestoreUserDocPath) return;
+            const today = new Date().toISOString().slice(0, 10);
+            const increments = { [`ai_usage.drill_count.\`${today}\``]: 1 };
+            if (tokenCount > 0) increments[`ai_usage.speech.\`${today}\``] = tokenCount;
+            fsQueue.increment(CFG.firestoreUserDocPath, increments);
+        }
+
+        // 練習時間寫入 Firestore（fieldTransforms.increment，原子操作）
+        function savePracticeTime(seconds) {
+            if (!CFG.firestoreUserDocPath || seconds <= 0) return;
+            const today = new Date().toISOString().slice(0, 10);
+            fsQueue.increment(CFG.firestoreUserDocPath, { [`practice_time.\`${today}\``]: Math.round(seconds) });
+        }
+
+        // 更新排行榜統計（sentence_stats）；isNewCompletion：這一輪是這個句型的第一輪
+        function updateSentenceStats(isNewCompletion) {
+            if (!CFG.firestoreUserDocPath || !CFG.datasetId || !CFG.totalSentences) return;
+            const now = new Date().toISOString();
+            const statPath = 'sentence_stats.' + fsFieldName(CFG.datasetId);
+            // name, total, last_active 直接覆蓋；completed 用原子遞增（只有新句型才 +1）
+            const fields = {
+                sentence_stats: { mapValue: { fields: {
+                    [CFG.datasetId]: { mapValue: { fields: {
+                        name: { stringValue: CFG.datasetName || CFG.datasetId },
+                        total: { integerValue: String(CFG.totalSentences) },
+                        last_active: { stringValue: now }
+                    } } }
+                } } }
+            };
+            fsQueue.update(CFG.firestoreUserDocPath, fields,
+                [statPath + '.name', statPath + '.total', statPath + '.last_active']);
+            if (isNewCompletion) fsQueue.increment(CFG.firestoreUserDocPath, { [statPath + '.completed']: 1 });
+
+            updateLeaderboard(isNewCompletion, now);
+        }
+
+        // Firestore 欄位路徑：非簡單名稱（中文、空白等）要用反引號包起來
+        function fsFieldName(name) {
+            if (/^[A-Za-z_][A-Za-z0-9_]*$/.test(name)) return name;
+            return '`' + name.replace(/\\/g, '\\\\').replace(/`/g, '\\`') + '`';
+        }
+
+        // 排行榜彙總文件：只改自己那一格（entries.{userName}），completed 用原子遞增
+        function updateLeaderboard(isNewCompletion, now) {
+            if (!CFG.leaderboardDocPath || !CFG.userName) return;
+            const entryPath = 'entries.' + fsFieldName(CFG.userName);
+            fsQueue.update(CFG.leaderboardDocPath, {
+                name: { stringValue: CFG.datasetName || CFG.datasetId },
+                total: { integerValue: String(CFG.totalSentences) },
+                entries: { mapValue: { fields: {
+                    [CFG.userName]: { mapValue: { fields: {
+                        student: { stringValue: CFG.studentName || CFG.userName },
+                        total: { integerValue: String(CFG.totalSentences) },
+                        last_active: { stringValue: now }
+                    } } }
+                } } }
+            }, ['name', 'total', entryPath + '.student', entryPath + '.total', entryPath + '.last_active']);
+            if (isNewCompletion) fsQueue.increment(CFG.leaderboardDocPath, { [entryPath + '.completed']: 1 });
+        }
+
+        // 每完成一個 option 就排入佇列（閒置或離開頁面時送出），中途離開不丟進度
+        function saveOptionToFirestore(word) {
+            const doneList = CFG.options.filter(o => S.results[o]);
+            CFG.completedOptions = doneList;
+            hooks.onProgress({ completedOptions: doneList });
+            fsWrite({
+                template_text: CFG.template,
+                completed_options: doneList,
+                dataset_id: CFG.datasetId,
+            });
+        }
+
+        // 全部完成後：completion_count +1（原子操作），completed_options 重置，round 寫入子文件
+        // 輪數由本機累計，不再寫入後讀回；回傳新的輪數
+        function saveRoundToFirestore() {
+            const docPath = CFG.firestoreDocPath;
+            const newCount = ++S.completionCount;
+            CFG.completionCount = newCount;
+            CFG.completedOptions = [];
+            hooks.onProgress({ completionCount: newCount, completedOptions: [] });
+            fsQueue.update(docPath, {
+                template_text: { stringValue: CFG.template },
+                dataset_id: { stringValue: CFG.datasetId },
+                completed_options: { arrayValue: { values: [] } },
+            }, ['template_text', 'dataset_id', 'completed_options']);
+            fsQueue.increment(docPath, { completion_count: 1 });
+            // Round 詳細資料寫入獨立子文件（不會覆蓋）
+            fsQueue.update(`${docPath}/rounds/round_${newCount}`, {
+                round: { integerValue: String(newCount) },
+                timestamp: { stringValue: new Date().toISOString() },
+                results: toFsValue(S.results),
+            });
+            return newCount;
+        }
+
+        function parseFsValue(v) {
+            if (v.stringValue !== undefined) return v.stringValue;
+            if (v.integerValue !== undefined) return parseInt(v.integerValue);
+            if (v.doubleValue !== undefined) return v.doubleValue;
+            if (v.booleanValue !== undefined) return v.booleanValue;
+            if (v.nullValue !== undefined) return null;
+            if (v.arrayValue) return (v.arrayValue.values || []).map(parseFsValue);
+            if (v.mapValue) {
+                const obj = {};
+                for (const [k, fv] of Object.entries(v.mapValue.fields || {})) obj[k] = parseFsValue(fv);
+                return obj;
+            }
+            return null;
+        }
+
+        // === DRILL FLOW ===
+        async function drillOneOption(word) {
+            const sentence = CFG.template.replace('___', word);
+            S.tries[word] = 0;
+
+            while (alive && !S.results[word]) {
+                S.tries[word]++;
+                renderOptions();
+
+                setStatus('🔊 聽示範...');
+                showSentence(word);
+                await playTTS(sentence);
+
+                // 清空麥克風 buffer，丟棄 TTS 喇叭殘餘音訊
+                if (S.analyser) {
+                    const trash = new Uint8Array(S.analyser.frequencyBinCount);
+                    for (let i = 0; i < 5; i++) { S.analyser.getByteFrequencyData(trash); await sleep(50); }
+                }
+
+                setStatus('🎤 請跟著唸...');
+
+                // 同時啟動語音辨識（作為 fallback 備用）
+                const srPromise = speechRecognize();
+                const recResult = await recordUntilSilence();
+                const audioBlob = recResult.blob;
+                if (!alive) return;
+
+                if (!recResult.speechDetected || audioBlob.size < 1000) {
+                    logEvent('audio_empty', `size=${audioBlob.size},speech=${recResult.speechDetected}`);
+                    setStatus('😮 沒有偵測到聲音，再試一次...');
+                    await sleep(1500);
+                    continue;
+                }
+
+                updateVolBars(0);
+                const srTranscripts = await srPromise;
+
+                // SR 預篩：首次失敗即停用，之後直接送 Gemini（後台記錄但不顯示給使用者）
+                const srEmpty = !srTranscripts || srTranscripts.length === 0 || srTranscripts.every(t => !t.trim());
+                if (srEmpty && _srAvailable) {
+                    logEvent('sr_disabled', `word=${word}`);
+                    _srAvailable = false;
+                }
+
+                const result = await evaluate(audioBlob, word, srTranscripts);
+                if (!alive) return;
+                logEvent('attempt', JSON.stringify({
+                    word,
+                    try: S.tries[word],
+                    ok: !!result.is_correct,
+                    transcript: (result.transcript || '').slice(0, 100),
+                    feedback: (result.feedback || '').slice(0, 200),
+                }));
+                showFeedback(word, result);
+                renderHistory();
+
+                if (result.is_correct) {
+                    S.results[word] = {
+                        tries: S.tries[word],
+                        transcript: result.transcript || '',
+                        feedback: result.feedback || ''
+                    };
+                    setStatus(`✅ ${word} — 通過！`);
+                    // 即時存入 Firestore，中途離開不丟進度
+                    saveOptionToFirestore(word);
+                    // 定期儲存練習時間（每 10 秒以上才寫一次）
+                    const elapsed = (Date.now() - S.drillStartTime) / 1000;
+                    const delta = elapsed - S.practiceTimeSaved;
+                    if (delta > 10) { savePracticeTime(delta); S.practiceTimeSaved = elapsed; }
+                } else {
+                    setStatus(`再唸一次 ${word}...`);
+                }
+                renderOptions();
+                await sleep(2000);
+            }
+        }
+
+        async function startDrill() {
+            $('start-btn').disabled = true;
+            $('start-btn').style.display = 'none';
+            S.phase = 'running';
+            unlockTTS();  // iOS: 在使用者手勢中同步解鎖 TTS
+            S.results = {};  S.tries = {};  S.history = [];
+            S.drillStartTime = Date.now();
+            S.practiceTimeSaved = 0;
+            $('drill-history').innerHTML = '';
+
+            // 標記已完成的 option（續練時跳過）
+            const done = new Set(CFG.completedOptions || []);
+            for (const opt of CFG.options) {
+                if (done.has(opt)) {
+                    S.results[opt] = { tries: 0, transcript: '(已完成)', feedback: '' };
+                }
+            }
+
+            // 找出還沒練的 option
+            const remaining = CFG.options.filter(o => !done.has(o));
+            if (remaining.length === 0) {
+                // 全部已完成（新一輪），重新練全部
+                S.results = {};
+                for (const opt of CFG.options) delete S.results[opt];
+            }
+
+            renderOptions();
+
+            try {
+                await initAudio();
+                if (!alive) { S.stream.getTracks().forEach(t => t.stop()); return; }
+                initVolBars();
+                // 偵測一次環境底噪，設定 VAD 門檻
+                setStatus('🔇 偵測環境音量...');
+                const noiseFloor = await measureNoiseFloor();
+                S.vadThreshold = Math.max(CFG.silenceThreshold, noiseFloor * 1.5);
+                console.log('[VAD] noise floor:', noiseFloor.toFixed(1), 'threshold:', S.vadThreshold.toFixed(1));
+                logEvent('vad_init', `noise=${noiseFloor.toFixed(1)} threshold=${S.vadThreshold.toFixed(1)}`);
+            } catch (e) {
+                logEvent('mic_error', e.message || e.name || 'unknown');
+                flushLog();
+                setStatus('❌ 無法存取麥克風');
+                const helpDiv = document.createElement('div');
+                helpDiv.style.cssText = 'background:#fff3cd;border:1px solid #ffc107;border-radius:8px;padding:12px 16px;margin:12px auto;max-width:360px;text-align:left;font-size:14px;line-height:1.8;color:#333';
+                helpDiv.innerHTML = `
+                    <b>📋 請依照以下步驟開啟麥克風：</b><br>
+                    <b>iPhone / iPad：</b><br>
+                    1. 點網址列左邊的「大小」按鈕<br>
+                    2. 找到「麥克風」→ 選「允許」<br>
+                    3. 重新整理頁面<br><br>
+                    <b>Android Chrome：</b><br>
+                    1. 點網址列左邊的 🔒 圖示<br>
+                    2.「麥克風」→ 開啟<br>
+                    3. 重新整理頁面<br><br>
+                    <b>電腦 Chrome：</b><br>
+                    1. 點網址列左邊的 🔒 圖示<br>
+                    2.「麥克風」→ 允許<br>
+                    3. 重新整理頁面
+                `;
+                $('drill-status').parentNode.insertBefore(helpDiv, $('drill-status').nextSibling);
+                $('start-btn').disabled = false;
+                $('start-btn').style.display = 'inline-block';
+                return;
+            }
+
+            const toDrill = remaining.length > 0 ? remaining : CFG.options;
+            for (let i = 0; i < CFG.options.length; i++) {
+                if (!alive) return;
+                if (S.results[CFG.options[i]]) continue;  // 跳過已完成
+                S.optIdx = i;
+                await drillOneOption(CFG.options[i]);
+            }
+
+            if (!alive) return;
+            S.phase = 'done';
+            await completeDrill();
+        }
+
+        async function completeDrill() {
+            $('vol-bars').style.display = 'none';
+            showSentence(null);
+
+            setStatus('📝 儲存成績中...');
+            const newCount = saveRoundToFirestore();
+            // 更新排行榜統計
+            updateSentenceStats(newCount === 1);
+            // 儲存剩餘練習時間
+            const finalElapsed = (Date.now() - S.drillStartTime) / 1000;
+            const finalDelta = finalElapsed - S.practiceTimeSaved;
+            if (finalDelta > 0) savePracticeTime(finalDelta);
+
+            const stars = STARS(newCount);
+            const nextStar = newCount < 1 ? 1 : newCount < 3 ? 3 : newCount < 5 ? 5 : null;
+            const nextMsg = nextStar ? `（再 ${nextStar - newCount} 輪升級 ${STARS(nextStar)}）` : '🏆 已達最高等級！';
+
+            let summaryHtml = '';
+            for (const opt of CFG.options) {
+                const r = S.results[opt];
+                summaryHtml += `<div class="summary-row">
+                    <span>✅ ${opt}</span>
+                    <span>${r.tries === 1 ? '一次過關 🎉' : r.tries + ' 次通過'}</span>
+                </div>`;
+            }
+
+            $('drill-complete').style.display = 'block';
+            $('drill-complete').className = 'drill-complete show';
+            // 全部一次過關的特殊訊息
+            const allFirstTry = CFG.options.every(o => S.results[o]?.tries === 1);
+            const completeTitle = allFirstTry ? '🏆 完美通關！全部一次過關！' : '🎉 本輪完成！';
+            $('drill-complete').innerHTML = `
+                <h2>${completeTitle}</h2>
+                <div class="stars">${stars || '⭐'}</div>
+                <p>累計 ${newCount} 輪 ${nextMsg}</p>
+                <div class="drill-summary">${summaryHtml}</div>
+            `;
+            setStatus('✅ 成績已儲存');
+            // 慶祝灑花
+            launchConfetti();
+
+            // 寫入 drill log，整輪的寫入一次送出
+            logEvent('drill_complete', `round=${newCount}`);
+            flushLog();
+            fsQueue.flush();
+
+            if (S.stream) S.stream.getTracks().forEach(t => t.stop());
+
+            // 顯示「再來一次」按鈕
+            $('start-btn').textContent = '🔄 再來一次';
+            $('start-btn').style.display = 'inline-block';
+            $('start-btn').disabled = false;
+        }
+
+        function launchConfetti() {
+            const emojis = ['🎉','🎊','⭐','✨','🌟','💫','🏆'];
+            for (let i = 0; i < 20; i++) {
+                const el = document.createElement('div');
+                el.className = 'confetti';
+                el.textContent = emojis[Math.floor(Math.random() * emojis.length)];
+                el.style.left = Math.random() * 100 + 'vw';
+                el.style.animationDuration = (2 + Math.random() * 2) + 's';
+                el.style.animationDelay = Math.random() * 1 + 's';
+                document.body.appendChild(el);
+                setTimeout(() => el.remove(), 5000);
+            }
+        }
+
+        function sleep(ms) { return new Promise(r => setTimeout(r, ms)); }
+
+        // === SPEED CONTROL ===
+        function initSpeedControl() {
+            const btns = document.querySelectorAll('.speed-btn');
+            // 標記目前速度
+            btns.forEach(btn => {
+                if (parseFloat(btn.dataset.rate) === CFG.ttsRate) btn.classList.add('active');
+                btn.onclick = () => {
+                    const rate = parseFloat(btn.dataset.rate);
+                    CFG.ttsRate = rate;
+                    hooks.shared.ttsRate = rate;
+                    btns.forEach(b => b.classList.remove('active'));
+                    btn.classList.add('active');
+                    // 儲存到 Firestore 使用者文件
+                    if (CFG.firestoreUserDocPath) {
+                        fsQueue.update(CFG.firestoreUserDocPath, { tts_rate: { doubleValue: rate } }, ['tts_rate']);
+                    }
+                };
+            });
+        }
+        initSpeedControl();
+
+        // === INIT ===
+        const doneCount = (CFG.completedOptions || []).length;
+        const totalCount = CFG.options.length;
+        if (CFG.completionCount > 0 || doneCount > 0) {
+            let info = CFG.completionCount > 0 ? `${STARS(CFG.completionCount)} 已完成 ${CFG.completionCount} 輪` : '';
+            if (doneCount > 0 && doneCount < totalCount) {
+                info += (info ? '　' : '') + `（本輪進度 ${doneCount}/${totalCount}）`;
+            }
+            $('drill-round').textContent = info || '尚未練習';
+        } else {
+            $('drill-round').textContent = '尚未練習';
+        }
+
+        // 初始畫面標記已完成的 option
+        const initDone = new Set(CFG.completedOptions || []);
+        for (const opt of CFG.options) {
+            if (initDone.has(opt)) S.results[opt] = { tries: 0, transcript: '(已完成)', feedback: '' };
+        }
+
+        $('drill-template').textContent = CFG.template;
+        renderOptions();
+        $('start-btn').textContent = doneCount > 0 && doneCount < totalCount ? '🎯 繼續練習' : '🎯 開始練習';
+        $('start-btn').onclick = startDrill;
+
+        // 題目資訊與上一題 / 下一題（在同一批內直接切換）
+        $('drill-position').textContent = `題目 ${CFG.index + 1}/${CFG.selectionTotal}　(${CFG.category || '一般'})`;
+        $('prev-btn').onclick = () => hooks.go(-1);
+        $('next-btn').onclick = () => hooks.go(1);
+
+    return {
+        update(cfg) { CFG.firestoreToken = cfg.firestoreToken; CFG.proxyToken = cfg.proxyToken; },
+        // 目標題不在這一批：等伺服器預載下一批後重新掛載
+        loading() {
+            alive = false;
+            ['prev-btn', 'next-btn', 'start-btn'].forEach(id => { $(id).disabled = true; });
+            setStatus('⏳ 載入題目中...');
+        },
+        destroy() {
+            alive = false;
+            if (S.stream) S.stream.getTracks().forEach(t => t.stop());
+            if (S.audioCtx) S.audioCtx.close().catch(() => {});
+            if (_syn) _syn.cancel();
+            flushLog();
+            fsQueue.close();
+        },
+    };
+    }
+
+    // 掛載一批預載的題目（CFG.items，伺服器已一併讀好各題進度），回傳 {update(cfg), destroy()}
+    //   - 上一題 / 下一題在前端切換，不必等 Streamlit rerun；切題後以 host.setValue 回報題號，
+    //     伺服器在背景同步（同一批內 config 不變，bridge 只更新 token、不重新掛載）
+    //   - 目標題不在這一批時回報 reload，由伺服器從該題重新預載
+    //   - 各題進度、AI 判讀次數、語速在同一批內由前端累計
+    function mount(root, CFG, host) {
+        const shared = { drillUsed: 0, ttsRate: CFG.ttsRate };
+        let pos = 0, current = null, seq = 0;
+
+        function sentenceConfig(item) {
+            const cfg = Object.assign({}, CFG, item, { ttsRate: shared.ttsRate });
+            delete cfg.items;
+            return cfg;
+        }
+
+        function show(i) {
+            if (current) current.destroy();
+            pos = i;
+            current = mountSentence(root, sentenceConfig(CFG.items[i]), hooks);
+        }
+
+        function go(delta) {
+            const n = CFG.selectionTotal || CFG.items.length;
+            const index = ((CFG.items[pos].index + delta) % n + n) % n;
+            const target = CFG.items.findIndex(it => it.index === index);
+            if (target >= 0) {
+                show(target);
+                report({ index, reload: false });
+                return;
+            }
+            // 超出這一批：先等寫入佇列送出，伺服器重新預載時才讀得到剛才的進度；
+            // 送不出去（離線、逾時）時由伺服器以回報的本機進度與 AI 判讀用量合併
+            current.loading();
+            const timeout = new Promise(resolve => setTimeout(resolve, RELOAD_FLUSH_MS));
+            Promise.race([writeQueue().flush(), timeout]).catch(() => {}).then(() => report({
+                index,
+                reload: true,
+                drillUsed: shared.drillUsed,
+                progress: Object.fromEntries(CFG.items.map(it => [it.templateHash, {
+                    completionCount: it.completionCount || 0,
+                    completedOptions: it.completedOptions || [],
+                }])),
+            }));
+        }
+
+        function report(value) {
+            if (host && host.setValue) host.setValue(Object.assign({ seq: `${Date.now()}-${++seq}` }, value));
+        }
+
+        const hooks = {
+            shared,
+            go,
+            onProgress(progress) { Object.assign(CFG.items[pos], progress); },
+        };
+        show(0);
+
+        return {
+            update(cfg) {
+                CFG.firestoreToken = cfg.firestoreToken;
+                CFG.proxyToken = cfg.proxyToken;
+                current.update(cfg);
+            },
+            destroy() { current.destroy(); },
+        };
+    }
+
+    return { mount };
+})();
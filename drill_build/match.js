@@ -0,0 +1,282 @@
+// 例句連連看執行環境（靜態資源：由 bridge.js 載入一次，之後每次只收到 config）
+// 左邊例句（挖空），右邊單字卡片，拖拉到對應的空格；提交後直接用 Firestore REST API 更新 SRS
+window.FlashcardMatch = (function() {
+    function mount(root, CFG) {
+        const app = root;
+        let answers = {};  // { 0: "word", 1: "word", ... }
+        let submitted = false;
+        let dragWord = null;
+        let touchOffsetX = 0, touchOffsetY = 0;
+
+        function render() {
+            if (submitted) return;
+
+            let html = '<div class="match-container">';
+
+            // 左邊：例句
+            html += '<div class="match-left">';
+            CFG.questions.forEach((q, i) => {
+                const word = answers[i] || '';
+                const hasWord = word ? 'has-word' : '';
+                html += `<div class="sentence-row">
+                    <span class="sentence-num">${i+1}.</span>
+                    <span class="sentence-text">${q.blanked}</span>
+                    <div class="drop-zone ${hasWord}" data-idx="${i}">${word || ''}</div>
+                </div>`;
+            });
+            html += '</div>';
+
+            // 右邊：單字池
+            const placedWords = new Set(Object.values(answers));
+            html += '<div class="match-right">';
+            html += '<div class="word-pool-title">📦 拖到左邊空格</div>';
+            CFG.options.forEach(w => {
+                const placed = placedWords.has(w) ? 'placed' : '';
+                html += `<div class="word-card ${placed}" draggable="true" data-word="${w}">${w}</div>`;
+            });
+            html += '</div>';
+
+            html += '</div>';
+            html += '<button class="submit-btn" id="submit-btn">✅ 提交答案</button>';
+
+            app.innerHTML = html;
+            bindEvents();
+        }
+
+        function bindEvents() {
+            // Drag events for word cards
+            document.querySelectorAll('.word-card:not(.placed)').forEach(card => {
+                card.addEventListener('dragstart', e => {
+                    dragWord = e.target.dataset.word;
+                    e.target.style.opacity = '0.5';
+                });
+                card.addEventListener('dragend', e => {
+                    e.target.style.opacity = '';
+                    dragWord = null;
+                });
+
+                // Touch events for mobile
+                card.addEventListener('touchstart', e => {
+                    dragWord = card.dataset.word;
+                    const touch = e.touches[0];
+                    const rect = card.getBoundingClientRect();
+                    touchOffsetX = touch.clientX - rect.left;
+                    touchOffsetY = touch.clientY - rect.top;
+
+                    // 建立拖曳影子
+                    const ghost = card.cloneNode(true);
+                    ghost.id = 'drag-ghost';
+                    ghost.style.position = 'fixed';
+                    ghost.style.zIndex = '9999';
+                    ghost.style.pointerEvents = 'none';
+                    ghost.style.opacity = '0.8';
+                    ghost.style.width = rect.width + 'px';
+                    ghost.style.left = (touch.clientX - touchOffsetX) + 'px';
+                    ghost.style.top = (touch.clientY - touchOffsetY) + 'px';
+                    document.body.appendChild(ghost);
+                    card.style.opacity = '0.3';
+                }, { passive: true });
+
+                card.addEventListener('touchmove', e => {
+                    e.preventDefault();
+                    const ghost = document.getElementById('drag-ghost');
+                    if (!ghost) return;
+                    const touch = e.touches[0];
+                    ghost.style.left = (touch.clientX - touchOffsetX) + 'px';
+                    ghost.style.top = (touch.clientY - touchOffsetY) + 'px';
+
+                    // 偵測 drop zone
+                    document.querySelectorAll('.drop-zone').forEach(dz => dz.classList.remove('drag-over'));
+                    const el = document.elementFromPoint(touch.clientX, touch.clientY);
+                    if (el && el.classList.contains('drop-zone')) {
+                        el.classList.add('drag-over');
+                    }
+                });
+
+                card.addEventListener('touchend', e => {
+                    const ghost = document.getElementById('drag-ghost');
+                    if (ghost) ghost.remove();
+                    card.style.opacity = '';
+
+                    if (!dragWord) return;
+                    const touch = e.changedTouches[0];
+                    const el = document.elementFromPoint(touch.clientX, touch.clientY);
+                    if (el && el.classList.contains('drop-zone')) {
+                        const idx = parseInt(el.dataset.idx);
+                        // 如果這格已有字，先移除
+                        if (answers[idx]) delete answers[idx];
+                        // 如果這個字已被放在別格，先移除
+                        for (const k in answers) { if (answers[k] === dragWord) delete answers[k]; }
+                        answers[idx] = dragWord;
+                        render();
+                    }
+                    dragWord = null;
+                });
+            });
+
+            // Drop zones
+            document.querySelectorAll('.drop-zone').forEach(zone => {
+                zone.addEventListener('dragover', e => {
+                    e.preventDefault();
+                    zone.classList.add('drag-over');
+                });
+                zone.addEventListener('dragleave', () => {
+                    zone.classList.remove('drag-over');
+                });
+                zone.addEventListener('drop', e => {
+                    e.preventDefault();
+                    zone.classList.remove('drag-over');
+                    if (!dragWord) return;
+                    const idx = parseInt(zone.dataset.idx);
+                    if (answers[idx]) delete answers[idx];
+                    for (const k in answers) { if (answers[k] === dragWord) delete answers[k]; }
+                    answers[idx] = dragWord;
+                    dragWord = null;
+                    render();
+                });
+
+                // 點擊已放的字可以移除
+                zone.addEventListener('click', () => {
+                    const idx = parseInt(zone.dataset.idx);
+                    if (answers[idx]) {
+                        delete answers[idx];
+                        render();
+                    }
+                });
+            });
+
+            // Submit
+            document.getElementById('submit-btn').addEventListener('click', () => {
+                submitted = true;
+                showResults();
+            });
+        }
+
+        // SRS 簡化版（跟 Python compute_srs_update 同邏輯）
+        function computeSrs(wordDoc, isCorrect) {
+            const interval = parseInt(wordDoc.srs_interval || 0);
+            let ease = parseFloat(wordDoc.srs_ease || 2.5);
+            let streak = parseInt(wordDoc.srs_streak || 0);
+            let newInterval;
+
+            if (isCorrect) {
+                streak += 1;
+                if (streak === 1) newInterval = 1;
+                else if (streak === 2) newInterval = 3;
+                else newInterval = Math.round(interval * ease);
+                ease = Math.min(3.0, ease + 0.1);
+            } else {
+                streak = 0;
+                newInterval = 1;
+                ease = Math.max(1.3, ease - 0.2);
+            }
+
+            const today = new Date();
+            const due = new Date(today);
+            due.setDate(due.getDate() + newInterval);
+            const dueStr = due.toISOString().slice(0, 10);
+            const todayStr = today.toISOString().slice(0, 10);
+
+            return {
+                srs_interval: newInterval,
+                srs_ease: Math.round(ease * 100) / 100,
+                srs_due: dueStr,
+                srs_streak: streak,
+                srs_last_review: todayStr,
+            };
+        }
+
+        // 更新單字的 SRS + Correct/Total 到 Firestore
+        async function updateWordInFirestore(docId, isCorrect) {
+            if (!CFG.vocabPath || !docId) return;
+            const url = `https://firestore.googleapis.com/v1/projects/${CFG.firestoreProject}/databases/(default)/documents/${CFG.vocabPath}/${docId}`;
+            try {
+                // 讀取現有資料
+                const res = await fetch(url, {
+                    headers: { 'Authorization': 'Bearer ' + CFG.firestoreToken }
+                });
+                if (!res.ok) return;
+                const doc = await res.json();
+                const f = doc.fields || {};
+
+                const correct = parseInt(f.Correct?.integerValue || '0') + (isCorrect ? 1 : 0);
+                const total = parseInt(f.Total?.integerValue || '0') + 1;
+
+                // 計算 SRS
+                const wordData = {
+                    srs_interval: parseInt(f.srs_interval?.integerValue || '0'),
+                    srs_ease: parseFloat(f.srs_ease?.doubleValue || f.srs_ease?.integerValue || '2.5'),
+                    srs_streak: parseInt(f.srs_streak?.integerValue || '0'),
+                };
+                const srs = computeSrs(wordData, isCorrect);
+
+                // 寫回；last_updated 用伺服器時間（REQUEST_TIME），與 Python 端增量同步的水位同一個時鐘，
+                // 使用者裝置時間偏慢也不會漏同步
+                const fields = {
+                    Correct: { integerValue: String(correct) },
+                    Total: { integerValue: String(total) },
+                    srs_interval: { integerValue: String(srs.srs_interval) },
+                    srs_ease: { doubleValue: srs.srs_ease },
+                    srs_due: { stringValue: srs.srs_due },
+                    srs_streak: { integerValue: String(srs.srs_streak) },
+                    srs_last_review: { stringValue: srs.srs_last_review },
+                };
+                const commitUrl = `https://firestore.googleapis.com/v1/projects/${CFG.firestoreProject}/databases/(default)/documents:commit`;
+                await fetch(commitUrl, {
+                    method: 'POST',
+                    headers: {
+                        'Authorization': 'Bearer ' + CFG.firestoreToken,
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({
+                        writes: [{
+                            update: { name: doc.name, fields },
+                            updateMask: { fieldPaths: Object.keys(fields) },
+                            updateTransforms: [{ fieldPath: 'last_updated', setToServerValue: 'REQUEST_TIME' }],
+                        }]
+                    })
+                });
+            } catch(e) { console.warn('SRS update error:', e); }
+        }
+
+        async function showResults() {
+            let html = '';
+            let correct = 0;
+
+            CFG.questions.forEach((q, i) => {
+                const userAns = answers[i] || '';
+                const isCorrect = userAns.toLowerCase() === q.answer.toLowerCase();
+                if (isCorrect) correct++;
+
+                if (isCorrect) {
+                    html += `<div class="result-row result-correct">✅ ${q.original}</div>`;
+                } else if (userAns) {
+                    const wrong = q.blanked.replace('______', '<b>' + userAns + '</b>');
+                    html += `<div class="result-row result-wrong">❌ ${wrong} → 正確：<b>${q.answer}</b></div>`;
+                } else {
+                    html += `<div class="result-row result-wrong">❌ （未作答）→ 正確：<b>${q.answer}</b>  ${q.original}</div>`;
+                }
+
+                // 更新 Firestore SRS
+                updateWordInFirestore(q.id, isCorrect);
+            });
+
+            const total = CFG.questions.length;
+            let scoreText = correct + ' / ' + total;
+            if (correct === total) scoreText = '🎉 ' + scoreText + ' 滿分！';
+            else if (correct >= total - 1) scoreText = '👏 ' + scoreText;
+
+            html += `<div class="result-score">${scoreText}</div>`;
+            app.innerHTML = html;
+        }
+
+        render();
+
+    return {
+        update(cfg) { CFG.firestoreToken = cfg.firestoreToken; },
+        destroy() { submitted = true; root.innerHTML = ''; },
+    };
+    }
+
+    return { mount };
+})();
@@ -0,0 +1,416 @@
+"""
+記憶體版 Firestore（離線測試 / 壓力測試 / 效能量測用）
+模擬 google.cloud.firestore.Client 常用的子集：
+collection / document / add / set(merge=True) / update / delete / stream / where / order_by / limit / batch / transaction
+欄位轉換支援 Increment、ArrayUnion、ArrayRemove、DELETE_FIELD、SERVER_TIMESTAMP，
+可直接接受 google.cloud.firestore 的 sentinel（以類別名稱辨識），也可用本模組提供的同名物件。
+
+stats 會累計讀 / 寫 / 刪次數，方便估算 Firestore 計費。
+"""
+import copy
+import threading
+import uuid
+from datetime import datetime, timezone
+
+try:
+    from google.api_core.exceptions import NotFound
+except ImportError:
+    class NotFound(Exception):
+        """文件不存在（無 google-api-core 時的替代）"""
+
+
+class Sentinel:
+    def __init__(self, description):
+        self.description = description
+
+    def __repr__(self):
+        return f"Sentinel: {self.description}"
+
+
+DELETE_FIELD = Sentinel("Value used to delete a field in a document.")
+SERVER_TIMESTAMP = Sentinel("Value used to set a document field to the server timestamp.")
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class ArrayUnion:
+    def __init__(self, values):
+        self.values = list(values)
+
+
+class ArrayRemove:
+    def __init__(self, values):
+        self.values = list(values)
+
+
+MAX_BATCH_WRITES = 500
+
+
+def _is_delete(value):
+    if value is DELETE_FIELD:
+        return True
+    return type(value).__name__ == "Sentinel" and "delete" in getattr(value, "description", "").lower()
+
+
+def _is_server_timestamp(value):
+    if value is SERVER_TIMESTAMP:
+        return True
+    return type(value).__name__ == "Sentinel" and "timestamp" in getattr(value, "description", "").lower()
+
+
+def _apply_value(current, value):
+    """把單一欄位值（可能是 transform）套用在現有值上，回傳新值"""
+    kind = type(value).__name__
+    if _is_server_timestamp(value):
+        return datetime.now(timezone.utc)
+    if kind == "Increment":
+        if isinstance(current, (int, float)) and not isinstance(current, bool):
+            return current + value.value
+        return value.value
+    if kind == "ArrayUnion":
+        result = list(current) if isinstance(current, list) else []
+        for v in value.values:
+            if v not in result:
+                result.append(v)
+        return result
+    if kind == "ArrayRemove":
+        if not isinstance(current, list):
+            return []
+        return [v for v in current if v not in value.values]
+    if isinstance(value, dict):
+        # set（非 merge）時巢狀 map 內也可能有 transform
+        return {k: _apply_value(None, v) for k, v in value.items() if not _is_delete(v)}
+    return copy.deepcopy(value)
+
+
+def _merge_into(target, data):
+    """set(merge=True)：巢狀 map 深度合併"""
+    for key, value in data.items():
+        if _is_delete(value):
+            target.pop(key, None)
+        elif isinstance(value, dict):
+            sub = target.get(key)
+            if not isinstance(sub, dict):
+                sub = {}
+                target[key] = sub
+            _merge_into(sub, value)
+        else:
+            target[key] = _apply_value(target.get(key), value)
+
+
+def _split_field_path(field_path):
+    """拆解 a.b.`c.d` 形式的欄位路徑"""
+    parts, buf, quoted = [], "", False
+    for ch in field_path:
+        if ch == "`":
+            quoted = not quoted
+        elif ch == "." and not quoted:
+            parts.append(buf)
+            buf = ""
+        else:
+            buf += ch
+    parts.append(buf)
+    return parts
+
+
+def _update_path(target, field_path, value):
+    """update()：以點號欄位路徑寫入，中間層不存在就建立"""
+    parts = _split_field_path(field_path)
+    node = target
+    for p in parts[:-1]:
+        if not isinstance(node.get(p), dict):
+            if _is_delete(value):
+                return
+            node[p] = {}
+        node = node[p]
+    last = parts[-1]
+    if _is_delete(value):
+        node.pop(last, None)
+    else:
+        node[last] = _apply_value(node.get(last), value)
+
+
+def _get_path(data, field_path):
+    node = data
+    for p in _split_field_path(field_path):
+        if not isinstance(node, dict) or p not in node:
+            return _MISSING
+        node = node[p]
+    return node
+
+
+_MISSING = object()
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        if self._data is None:
+            return None
+        value = _get_path(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self):
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return CollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, transaction=None):
+        return self._client._read(self)
+
+    def set(self, data, merge=False):
+        self._client._write([("set", self, data, merge)])
+
+    def update(self, data):
+        self._client._write([("update", self, data, None)])
+
+    def delete(self):
+        self._client._write([("delete", self, None, None)])
+
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client, path, filters=None, orders=None, limit_count=None, group=False):
+        self._client = client
+        self._path = path
+        self._filters = filters or []
+        self._orders = orders or []
+        self._limit = limit_count
+        self._group = group
+
+    def _copy(self, **kw):
+        args = dict(filters=list(self._filters), orders=list(self._orders),
+                    limit_count=self._limit, group=self._group)
+        args.update(kw)
+        return Query(self._client, self._path, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def stream(self, transaction=None):
+        return iter(self._client._query(self))
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+
+    @property
+    def id(self):
+        return self._path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        ref.set(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self):
+        return [DocumentReference(self._client, p) for p in self._client._paths_in(self._path)]
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(x in a for x in b),
+}
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, document_data, merge=False):
+        self._ops.append(("set", reference, document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._ops.append(("update", reference, field_updates, None))
+
+    def delete(self, reference):
+        self._ops.append(("delete", reference, None, None))
+
+    def __len__(self):
+        return len(self._ops)
+
+    def commit(self):
+        if len(self._ops) > MAX_BATCH_WRITES:
+            raise ValueError(f"batch 最多 {MAX_BATCH_WRITES} 筆寫入")
+        self._client._write(self._ops)
+        self._client.stats["commits"] += 1
+        self._ops = []
+
+
+class Transaction(WriteBatch):
+    """交易：寫入先暫存，由 transactional 包裝的函式結束時一次套用"""
+
+    def _commit(self):
+        self._client._write(self._ops)
+        self._ops = []
+
+
+def transactional(func):
+    """對應 google.cloud.firestore.transactional：整段函式持有 client 鎖，讀寫不會被其他執行緒插入"""
+    def wrapper(transaction, *args, **kwargs):
+        with transaction._client._lock:
+            result = func(transaction, *args, **kwargs)
+            transaction._commit()
+        return result
+    return wrapper
+
+
+class FakeFirestoreClient:
+    """記憶體版 Firestore client。所有操作以單一鎖保護，可在多執行緒下使用"""
+
+    def __init__(self, project="fake-project"):
+        self.project = project
+        self._docs = {}  # 文件完整路徑 -> dict
+        self._lock = threading.RLock()
+        self.stats = {"reads": 0, "writes": 0, "deletes": 0, "commits": 0}
+
+    # --- 公開 API ---
+    def collection(self, path):
+        return CollectionReference(self, path)
+
+    def document(self, path):
+        return DocumentReference(self, path)
+
+    def collection_group(self, collection_id):
+        return Query(self, collection_id, group=True)
+
+    def get_all(self, references):
+        return [self._read(ref) for ref in references]
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self):
+        return Transaction(self)
+
+    def reset_stats(self):
+        for k in self.stats:
+            self.stats[k] = 0
+
+    # --- 內部實作 ---
+    def _read(self, ref):
+        with self._lock:
+            self.stats["reads"] += 1
+            return DocumentSnapshot(ref, copy.deepcopy(self._docs.get(ref.path)))
+
+    def _paths_in(self, coll_path, group=False):
+        depth = coll_path.count("/") + 1
+        for path in list(self._docs):
+            parent, _, _ = path.rpartition("/")
+            if group:
+                if parent.rsplit("/", 1)[-1] == coll_path:
+                    yield path
+            elif parent == coll_path and path.count("/") == depth:
+                yield path
+
+    def _query(self, query):
+        with self._lock:
+            rows = []
+            for path in self._paths_in(query._path, group=query._group):
+                data = self._docs[path]
+                if all(self._match(data, f) for f in query._filters):
+                    rows.append((path, data))
+            for field, direction in reversed(query._orders):
+                rows = [r for r in rows if _get_path(r[1], field) is not _MISSING]
+                rows.sort(key=lambda r: _get_path(r[1], field), reverse=(direction == Query.DESCENDING))
+            if query._limit is not None:
+                rows = rows[:query._limit]
+            self.stats["reads"] += max(1, len(rows))
+            return [DocumentSnapshot(DocumentReference(self, p), copy.deepcopy(d)) for p, d in rows]
+
+    @staticmethod
+    def _match(data, flt):
+        field, op, value = flt
+        current = _get_path(data, field)
+        if current is _MISSING:
+            return False
+        try:
+            return _OPS[op](current, value)
+        except TypeError:
+            return False
+
+    def _write(self, ops):
+        """整批套用（先在副本上計算，全部成功才寫回，模擬原子性）"""
+        with self._lock:
+            staged = {}
+            for kind, ref, data, merge in ops:
+                current = staged[ref.path] if ref.path in staged else self._docs.get(ref.path)
+                if kind == "delete":
+                    staged[ref.path] = None
+                    continue
+                if kind == "update":
+                    if current is None:
+                        raise NotFound(f"No document to update: {ref.path}")
+                    doc = copy.deepcopy(current)
+                    for field_path, value in data.items():
+                        _update_path(doc, field_path, value)
+                elif merge:
+                    doc = copy.deepcopy(current) if current is not None else {}
+                    _merge_into(doc, data)
+                else:
+                    doc = {k: _apply_value(None, v) for k, v in data.items() if not _is_delete(v)}
+                staged[ref.path] = doc
+            for path, doc in staged.items():
+                if doc is None:
+                    if self._docs.pop(path, None) is not None:
+                        self.stats["deletes"] += 1
+                else:
+                    self._docs[path] = doc
+                    self.stats["writes"] += 1
@@ -0,0 +1,100 @@
+"""
+Firestore REST access token：給瀏覽器端 drill / match 元件直接呼叫 Firestore REST API
+  - 程序內共用一份 service account credentials 與 token，不再每次 rerun 都重新簽發（OAuth 來回約數百 ms）
+  - 剩餘效期少於 REFRESH_MARGIN 時在背景執行緒換新，畫面照常使用目前的 token
+  - 剩餘效期少於 MIN_VALID（或第一次）才同步等待換新，確保交給瀏覽器的 token 至少還能用 MIN_VALID
+  - 換新失敗時沿用舊 token（還沒低於 MIN_VALID 的話），下次呼叫再試
+取得方式：get_token(st.secrets["firebase_credentials"]) -> (token, project_id)
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+SCOPES = ["https://www.googleapis.com/auth/datastore"]
+REFRESH_MARGIN = timedelta(minutes=20)  # token 效期 1 小時，剩 20 分鐘就開始背景換新
+MIN_VALID = timedelta(minutes=10)       # 低於這個效期不交給瀏覽器，同步換新
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+class TokenProvider:
+    def __init__(self, creds_info, scopes=SCOPES, credentials=None):
+        """credentials：已建立的 google.auth credentials（測試時可傳入替身），沒給時由 creds_info 建立"""
+        self.project_id = creds_info.get("project_id", "")
+        self._creds_info = creds_info
+        self._scopes = scopes
+        self._creds = credentials
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.stats = {"refreshes": 0, "background_refreshes": 0, "failures": 0}
+
+    def _credentials(self):
+        if self._creds is None:
+            from google.oauth2 import service_account
+            self._creds = service_account.Credentials.from_service_account_info(self._creds_info, scopes=self._scopes)
+        return self._creds
+
+    def _remaining(self):
+        creds = self._creds
+        if creds is None or not creds.token or creds.expiry is None:
+            return timedelta(0)
+        expiry = creds.expiry
+        if expiry.tzinfo is None:  # google-auth 的 expiry 是 naive UTC
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        return expiry - _utcnow()
+
+    def _refresh(self):
+        import google.auth.transport.requests
+        self._credentials().refresh(google.auth.transport.requests.Request())
+        self.stats["refreshes"] += 1
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                with self._lock:
+                    if self._remaining() < REFRESH_MARGIN:
+                        self._refresh()
+                        self.stats["background_refreshes"] += 1
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"[FirestoreToken] background refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        self._refreshing = True
+        threading.Thread(target=run, name="firestore-token-refresh", daemon=True).start()
+
+    def get(self):
+        """回傳 (access token, project_id)"""
+        remaining = self._remaining()
+        if remaining >= MIN_VALID:
+            if remaining < REFRESH_MARGIN and not self._refreshing:
+                self._refresh_in_background()
+            return self._creds.token, self.project_id
+        with self._lock:
+            if self._remaining() < MIN_VALID:  # 等鎖期間可能已被其他 session 換新
+                try:
+                    self._refresh()
+                except Exception:
+                    self.stats["failures"] += 1
+                    if self._remaining() <= timedelta(0):
+                        raise
+            return self._creds.token, self.project_id
+
+
+def get_provider(creds_info):
+    """同一個 service account 在程序內只有一個 provider（drill / match 元件共用）"""
+    key = (creds_info.get("project_id", ""), creds_info.get("client_email", ""))
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = _providers[key] = TokenProvider(dict(creds_info))
+        return provider
+
+
+def get_token(creds_info):
+    return get_provider(creds_info).get()
@@ -1,123 +1,212 @@
 """
-修復腳本：從 sentence_progress 重新計算 sentence_stats
-用途：JS 元件改版後，舊的練習紀錄沒有寫入 sentence_stats，排行榜看不到
-
-執行方式：
-  streamlit run fix_sentence_stats.py
+修復腳本：從 sentence_progress 重新計算所有使用者的 sentence_stats，並重建排行榜彙總
+用途：統計與實際進度不一致時（JS 元件改版前的舊紀錄、寫入中斷等）整批修復
+  - 所有使用者的進度以 collection group 一次串流讀取；--per-user 時改為每人一次查詢（並行）
+  - 各題庫以 template_hash 建索引，每位使用者只需掃自己的進度文件（與題庫大小無關）
+  - 只寫入有差異的使用者，以 WriteBatch 並行送出；--checkpoint 記錄已寫入的使用者，中斷後可接續
+  - 完成判定與練習時 JS 元件的遞增規則相同（sentence_stats.is_completed）；只重算 completed，舊資料的 in_progress 會被移除
+
+用法：python fix_sentence_stats.py                     # 重算並寫入
+      python fix_sentence_stats.py --dry-run           # 只列出差異，不寫入
+      python fix_sentence_stats.py --checkpoint .cache/fix_stats.json
+      python fix_sentence_stats.py --per-user --workers 16
+程式內使用：rebuild_sentence_stats(repo, dry_run=True) -> RebuildReport
 """
-import streamlit as st
-import hashlib
-from google.cloud import firestore
-from google.oauth2 import service_account
-
-st.set_page_config(page_title="修復 sentence_stats", page_icon="🔧")
-st.title("🔧 修復排行榜統計資料")
-
-# --- Firestore ---
-APP_ID = st.secrets.get("APP_ID", "flashcard-pro-v1")
-creds_info = st.secrets["firebase_credentials"]
-creds = service_account.Credentials.from_service_account_info(creds_info)
-db = firestore.Client(credentials=creds)
-
-USER_LIST_PATH = f"artifacts/{APP_ID}/public/data/users"
-SENTENCE_CATALOG_PATH = f"artifacts/{APP_ID}/public/data/sentences"
-SENTENCE_DATA_BASE_PATH = f"artifacts/{APP_ID}/public/data"
-
-
-def hash_string(s):
-    return hashlib.md5(s.encode()).hexdigest()
-
-
-def run_fix():
-    # 1. 讀取所有題庫
-    st.write("📖 讀取句型書目錄...")
-    catalogs = {}
-    for d in db.collection(SENTENCE_CATALOG_PATH).stream():
-        data = d.to_dict()
-        catalogs[d.id] = {
-            "name": data.get("name", d.id),
-            "is_premium": data.get("is_premium", False),
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from repository import BATCH_LIMIT, BATCH_WORKERS, FlashcardRepository, create_client
+from sentence_cache import BookMeta
+from sentence_stats import COMPLETED, is_completed
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import toml as tomllib
+    except ImportError:
+        tomllib = None
+
+DEFAULT_WORKERS = 8
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+
+class RebuildReport:
+    def __init__(self):
+        self.users = 0
+        self.progress_docs = 0
+        self.changed = {}     # user_name -> {dataset_id: (舊, 新)}，各為 (completed, total) 或 None
+        self.written = 0
+        self.skipped = 0      # checkpoint 中已寫入過的使用者
+        self.errors = []
+        self.boards = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        rate = self.users / self.seconds if self.seconds else 0
+        return (f"使用者 {self.users}、進度文件 {self.progress_docs}、有差異 {len(self.changed)}、"
+                f"寫入 {self.written}、略過 {self.skipped}、排行榜 {self.boards} 份、錯誤 {len(self.errors)}；"
+                f"{self.seconds:.2f} 秒（{rate:.0f} 人 / 秒）")
+
+
+def _load_books(repo, workers):
+    """{dataset_id: (目錄資料, BookMeta)}，各題庫並行讀取"""
+    catalogs = repo.list_sentence_catalogs()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(catalogs) or 1))) as pool:
+        metas = dict(zip(catalogs, pool.map(lambda cid: BookMeta(repo.list_sentences(cid)), catalogs)))
+    return {cid: (catalogs[cid], metas[cid]) for cid in catalogs}
+
+
+def _hash_index(books):
+    """template_hash -> [(dataset_id, 選項)]；同一句型可能出現在多本書"""
+    index = {}
+    for cid, (_, meta) in books.items():
+        for s, h in zip(meta.sentences, meta.hashes):
+            if s.get("Options"):
+                index.setdefault(h, []).append((cid, s["Options"]))
+    return index
+
+
+def compute_user_stats(progress_map, books, index, old_stats=None, timestamp=None):
+    """單一使用者：{template_hash: 進度} -> 新的 sentence_stats map（只含有完成紀錄的題庫）"""
+    counts = {}
+    for h, progress in progress_map.items():
+        for cid, options in index.get(h, ()):
+            if is_completed(progress, options):
+                counts[cid] = counts.get(cid, 0) + 1
+    old_stats = old_stats or {}
+    stats = {}
+    for cid, c in counts.items():
+        info, meta = books[cid]
+        old = old_stats.get(cid) if isinstance(old_stats.get(cid), dict) else {}
+        stats[cid] = {
+            "name": info.get("name", cid),
+            "total": len(meta),
+            "completed": c,
+            "last_active": old.get("last_active") or timestamp,
         }
-    st.write(f"  找到 {len(catalogs)} 個題庫")
-
-    # 2. 讀取每個題庫的句型
-    sentences_by_dataset = {}
-    for dataset_id, cat_info in catalogs.items():
-        docs = db.collection(f"{SENTENCE_DATA_BASE_PATH}/{dataset_id}").stream()
-        sentences = []
-        for d in docs:
-            data = d.to_dict()
-            if "Template" in data:
-                sentences.append(data)
-        sentences_by_dataset[dataset_id] = sentences
-        st.write(f"  📘 {cat_info['name']}: {len(sentences)} 句")
-
-    # 3. 讀取所有使用者
-    st.write("👥 讀取使用者...")
-    users = {}
-    for d in db.collection(USER_LIST_PATH).stream():
-        users[d.id] = d.to_dict()
-    st.write(f"  找到 {len(users)} 個使用者")
-
-    # 4. 逐個使用者修復
-    st.write("🔄 開始修復...")
-    progress_bar = st.progress(0)
-    fixed_count = 0
-
-    for idx, (user_name, user_data) in enumerate(users.items()):
-        user_id = user_data.get("id", "")
-        if not user_id:
-            continue
-
-        # 讀取該使用者的 sentence_progress
-        progress_path = f"artifacts/{APP_ID}/users/{user_id}/sentence_progress"
-        progress_docs = db.collection(progress_path).stream()
-        progress_map = {}  # template_hash -> {completion_count, dataset_id}
-        for d in progress_docs:
-            data = d.to_dict()
-            progress_map[d.id] = {
-                "completion_count": int(data.get("completion_count", 0)),
-                "dataset_id": data.get("dataset_id", ""),
-            }
-
-        if not progress_map:
-            progress_bar.progress((idx + 1) / len(users))
-            continue
-
-        # 計算每個題庫的 completed 數
-        stats = {}
-        for dataset_id, sentences in sentences_by_dataset.items():
-            completed = 0
-            for s in sentences:
-                t_hash = hash_string(s["Template"])
-                p = progress_map.get(t_hash)
-                if p and p.get("completion_count", 0) > 0:
-                    completed += 1
-
-            if completed > 0:
-                cat_info = catalogs.get(dataset_id, {})
-                stats[dataset_id] = {
-                    "name": cat_info.get("name", dataset_id),
-                    "total": len(sentences),
-                    "completed": completed,
-                    "last_active": firestore.SERVER_TIMESTAMP,
-                }
-
-        if stats:
-            # 寫入 sentence_stats
-            update_data = {}
-            for dataset_id, stat in stats.items():
-                update_data[f"sentence_stats.{dataset_id}"] = stat
-
-            db.collection(USER_LIST_PATH).document(user_name).update(update_data)
-            fixed_count += 1
-            st.write(f"  ✅ {user_name}: {', '.join(f'{s['name']}({s['completed']}/{s['total']})' for s in stats.values())}")
-
-        progress_bar.progress((idx + 1) / len(users))
-
-    st.success(f"🎉 修復完成！更新了 {fixed_count} 個使用者的排行榜統計。")
-
-
-st.warning("此腳本會從 sentence_progress 重新計算所有使用者的 sentence_stats（排行榜資料）。")
-if st.button("🚀 開始修復", type="primary"):
-    run_fix()
+    return stats
+
+
+def _diff(old_stats, new_stats):
+    """回傳 {dataset_id: (舊, 新)}，只列出 completed / total 有變化的題庫"""
+    def key(stat):
+        if not isinstance(stat, dict) or not stat.get(COMPLETED):
+            return None  # 沒有完成紀錄的題庫與不存在視為相同
+        return (int(stat.get(COMPLETED, 0)), int(stat.get("total", 0)))
+    old_stats = old_stats if isinstance(old_stats, dict) else {}
+    diff = {}
+    for cid in set(old_stats) | set(new_stats):
+        before, after = key(old_stats.get(cid)), key(new_stats.get(cid))
+        if before != after:
+            diff[cid] = (before, after)
+    return diff
+
+
+def _load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return set(json.load(f).get("written", []))
+
+
+def _save_checkpoint(path, written):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"written": sorted(written)}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def rebuild_sentence_stats(repo, dry_run=False, workers=DEFAULT_WORKERS, checkpoint=None,
+                           per_user=False, log=print):
+    """重算所有使用者的 sentence_stats 並重建排行榜。dry_run=True 時只計算差異不寫入"""
+    report = RebuildReport()
+    start = time.perf_counter()
+
+    books = _load_books(repo, workers)
+    index = _hash_index(books)
+    users = repo.list_users()
+    log(f"📖 題庫 {len(books)} 本、👥 使用者 {len(users)} 位")
+
+    if per_user:
+        uids = {name: u.get("id") for name, u in users.items() if u.get("id")}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fetched = dict(zip(uids.values(), pool.map(repo.list_sentence_progress, uids.values())))
+    else:
+        fetched = repo.list_all_sentence_progress()
+    report.progress_docs = sum(len(p) for p in fetched.values())
+
+    rows = []
+    new_users = {}
+    for user_name, u in users.items():
+        progress_map = fetched.get(u.get("id"), {}) if u.get("id") else {}
+        new_stats = compute_user_stats(progress_map, books, index, u.get("sentence_stats"), repo.SERVER_TIMESTAMP)
+        new_users[user_name] = {**u, "sentence_stats": new_stats}
+        report.users += 1
+        diff = _diff(u.get("sentence_stats"), new_stats)
+        if diff:
+            report.changed[user_name] = diff
+            rows.append((user_name, new_stats))
+
+    for user_name, diff in sorted(report.changed.items()):
+        detail = "、".join(f"{books[cid][0].get('name', cid) if cid in books else cid} {b} → {a}"
+                          for cid, (b, a) in sorted(diff.items()))
+        log(f"  {'🔍' if dry_run else '✏️'} {user_name}: {detail}")
+
+    if not dry_run:
+        done_names = _load_checkpoint(checkpoint)
+        pending = [r for r in rows if r[0] not in done_names]
+        report.skipped = len(rows) - len(pending)
+        coll = repo.client.collection(repo.users_path)
+        wave = BATCH_LIMIT * BATCH_WORKERS
+        for i in range(0, len(pending), wave):
+            done, errors = repo._run_batches(
+                pending[i:i + wave],
+                lambda batch, row: batch.update(coll.document(row[0]), {"sentence_stats": row[1]}))
+            report.written += len(done)
+            report.errors.extend(errors)
+            done_names.update(name for name, _ in done)
+            _save_checkpoint(checkpoint, done_names)
+            log(f"  已寫入 {report.written}/{len(pending)}")
+        report.boards = len(repo.rebuild_leaderboards(new_users))
+
+    report.seconds = time.perf_counter() - start
+    log(("🔍 試算完成：" if dry_run else "🎉 修復完成：") + report.summary())
+    return report
+
+
+def _load_secrets(path=SECRETS_PATH):
+    if tomllib is None:
+        raise RuntimeError("需要 Python 3.11+（tomllib）或安裝 toml 才能讀取 secrets.toml")
+    with open(path, "r", encoding="utf-8") as f:
+        return tomllib.loads(f.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="從 sentence_progress 重建 sentence_stats 與排行榜")
+    parser.add_argument("--dry-run", action="store_true", help="只列出差異，不寫入")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="讀取並行數")
+    parser.add_argument("--checkpoint", default=None, help="已寫入使用者的紀錄檔（中斷後接續）")
+    parser.add_argument("--per-user", action="store_true", help="不用 collection group，改為每位使用者各查一次")
+    parser.add_argument("--secrets", default=SECRETS_PATH, help="secrets.toml 路徑")
+    parser.add_argument("--fake", action="store_true", help="使用記憶體版 Firestore（測試用）")
+    args = parser.parse_args(argv)
+
+    if args.fake:
+        client, app_id = create_client(fake=True), "flashcard-pro-v1"
+    else:
+        secrets = _load_secrets(args.secrets)
+        client, app_id = create_client(dict(secrets["firebase_credentials"])), secrets.get("APP_ID", "flashcard-pro-v1")
+    report = rebuild_sentence_stats(FlashcardRepository(client, app_id), dry_run=args.dry_run,
+                                    workers=args.workers, checkpoint=args.checkpoint, per_user=args.per_user)
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+"""
+Gemini 分段並行呼叫：長輸入切成小段，以有上限的執行緒池同時送出，總時間約等於最慢的一段
+  - 每段的 429 / 5xx / 逾時由 http_client 重試（指數退避），一段失敗不影響其他段
+  - 背景執行緒只做 HTTP 與解析，不碰 st.*；進度回報、token 記錄都在呼叫端執行緒
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+VOCAB_FIELDS = ("English", "POS", "Chinese_1", "Chinese_2", "Example")
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def parse_response(res_json):
+    """generateContent 回應 -> (文字, totalTokenCount)"""
+    text = res_json['candidates'][0]['content']['parts'][0]['text']
+    return text, res_json.get("usageMetadata", {}).get("totalTokenCount", 0)
+
+
+def parse_vocab_lines(text):
+    """「Word | POS | Chinese_1 | Chinese_2 | Example」格式的輸出 -> 單字欄位列表（欄位不足的行略過）"""
+    items = []
+    for line in text.strip().split('\n'):
+        if '|' in line:
+            p = [i.strip() for i in line.split('|')]
+            if len(p) >= 5:
+                items.append(dict(zip(VOCAB_FIELDS, p)))
+    return items
+
+
+def run_chunks(chunks, fn, workers=4, on_result=None):
+    """對每段並行執行 fn(chunk)。
+    回傳 (results, errors)：results 與 chunks 同順序，失敗的段為 None；errors 為 [(段號, 例外)]。
+    on_result(段號, 結果) 在呼叫端執行緒、每段完成時呼叫（可在這裡更新畫面）"""
+    results = [None] * len(chunks)
+    errors = []
+    if not chunks:
+        return results, errors
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        futures = {pool.submit(fn, chunk): i for i, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                errors.append((i, e))
+                continue
+            if on_result:
+                on_result(i, results[i])
+    return results, errors
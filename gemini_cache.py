@@ -0,0 +1,218 @@
+"""
+Gemini 單字補全快取：以「prompt 版本 + 正規化英文單字」為 key，命中就不送 Gemini
+很多學生輸入同一批課本單字（如教育部 1200 字），同一個字只需要問一次
+
+  - 本機層：SQLite（多 session 共用，同一台主機重啟後仍在），TTL 過期 + 超過上限時依最後使用時間淘汰（LRU）
+  - 共享層：Firestore ai_cache（所有主機共用，repo.get_ai_cache / put_ai_cache），本機沒有才查
+  - 只快取「單純單字」行：行內帶有中文、詞性或例句時，Gemini 會依輸入內容修正，結果因人而異，不快取
+
+使用方式：
+    plan = cache.plan(lines, template.version)   # 找出命中與需要送 Gemini 的行（版本來自 prompts.PromptTemplate）
+    items = call_gemini("\n".join(plan.miss_lines))
+    cache.store(plan, items)                     # 回寫快取
+    result = plan.merge(items, pending)          # 依輸入順序合併（pending：失敗段的行號，保持空缺）
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_FIELDS = ("English", "POS", "Chinese_1", "Chinese_2", "Example")
+DEFAULT_TTL = 90 * 86400      # 秒；字典內容很少變，prompt 改版會換 key
+DEFAULT_MAX_ENTRIES = 20000
+_BARE_WORD = re.compile(r"^[A-Za-z][A-Za-z .'\-]{0,48}$")
+
+
+def normalize_headword(text):
+    """小寫、去頭尾空白、連續空白合一"""
+    return " ".join(str(text).lower().split())
+
+
+def bare_headword(line):
+    """單純單字（含片語）行回傳正規化單字，否則回傳 None"""
+    line = line.strip()
+    if not _BARE_WORD.match(line):
+        return None
+    return normalize_headword(line)
+
+
+def cache_key(version, headword):
+    return hashlib.sha256(f"{version}\n{headword}".encode("utf-8")).hexdigest()
+
+
+class CachePlan:
+    """一次補全請求的快取查詢結果"""
+
+    def __init__(self, lines, version):
+        self.lines = lines
+        self.version = version
+        self.hits = {}        # 行號 -> 快取的單字欄位
+        self.miss_rows = []   # 需要送 Gemini 的行號
+        self.keys = {}        # 行號 -> cache key（只有單純單字行有）
+
+    @classmethod
+    def uncached(cls, lines, version):
+        """快取停用時：全部行都要送出"""
+        plan = cls(lines, version)
+        plan.miss_rows = list(range(len(plan.lines)))
+        return plan
+
+    @property
+    def miss_lines(self):
+        return [self.lines[i] for i in self.miss_rows]
+
+    def merge(self, fetched, pending=()):
+        """把快取命中與 Gemini 回傳（fetched，依送出順序）依輸入順序合併
+        送出的行先以單字對應，對應不到的（被修正拼字、帶解釋的行）依序取剩下的結果，多出來的接在最後
+        pending：沒有結果的行號（所在段失敗或尚未完成），保持空缺，不拿其他段剩下的結果遞補"""
+        pending = set(pending)
+        by_word = {}
+        for k, item in enumerate(fetched):
+            by_word.setdefault(normalize_headword(item.get("English", "")), []).append(k)
+        used = set()
+        matched = {}
+        for row in self.miss_rows:
+            if row in pending:
+                continue
+            word = bare_headword(self.lines[row])
+            for k in by_word.get(word, ()):
+                if k not in used:
+                    used.add(k)
+                    matched[row] = k
+                    break
+        rest = iter([k for k in range(len(fetched)) if k not in used])
+        out = []
+        for row in range(len(self.lines)):
+            if row in self.hits:
+                out.append(dict(self.hits[row]))
+            elif row in matched:
+                out.append(fetched[matched[row]])
+            elif row in self.miss_rows and row not in pending:
+                k = next(rest, None)
+                if k is not None:
+                    out.append(fetched[k])
+        out.extend(fetched[k] for k in rest)
+        return out
+
+
+class GeminiCache:
+    def __init__(self, path, shared=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """path：SQLite 檔案；shared：共享層（提供 get_ai_cache / put_ai_cache，通常是 FlashcardRepository）"""
+        self.path = path
+        self.shared = shared
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    # --- 查詢 ---
+    def plan(self, lines, version):
+        """lines：使用者輸入的每一行（已去空行）。本機 → 共享層依序查詢"""
+        plan = CachePlan(list(lines), version)
+        for row, line in enumerate(plan.lines):
+            word = bare_headword(line)
+            if word:
+                plan.keys[row] = cache_key(version, word)
+        found = self._get_local(set(plan.keys.values()))
+        missing = {k for k in plan.keys.values() if k not in found}
+        if missing and self.shared is not None:
+            shared = self._get_shared(missing)
+            if shared:
+                self._put_local(shared)
+                found.update(shared)
+                self.stats["shared_hits"] += len(shared)
+        for row in range(len(plan.lines)):
+            key = plan.keys.get(row)
+            if key in found:
+                plan.hits[row] = found[key]
+            else:
+                plan.miss_rows.append(row)
+        self.stats["hits"] += len(plan.hits)
+        self.stats["misses"] += len(plan.miss_rows)
+        return plan
+
+    def _get_local(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            keys = list(keys)
+            for i in range(0, len(keys), 500):  # SQLite 參數數量上限
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({marks}) AND created_at > ?",
+                    (*chunk, now - self.ttl)).fetchall()
+                found.update((k, json.loads(v)) for k, v in rows)
+            if found:
+                self._conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                       [(now, k) for k in found])
+                self._conn.commit()
+        return found
+
+    def _get_shared(self, keys):
+        try:
+            docs = self.shared.get_ai_cache(keys)
+        except Exception:
+            return {}  # 共享層失敗就當作沒命中
+        cutoff = time.time() - self.ttl
+        return {k: d["item"] for k, d in docs.items() if d.get("created_at", 0) > cutoff and d.get("item")}
+
+    # --- 寫入 ---
+    def store(self, plan, fetched):
+        """把 Gemini 回傳中、英文能對應到某個送出單字的結果寫入兩層快取"""
+        wanted = {bare_headword(plan.lines[row]): plan.keys[row] for row in plan.miss_rows if row in plan.keys}
+        entries = {}
+        for item in fetched:
+            key = wanted.get(normalize_headword(item.get("English", "")))
+            if key and key not in entries and all(item.get(f) for f in ("English", "POS", "Chinese_1")):
+                entries[key] = {f: item.get(f, "") for f in CACHE_FIELDS}
+        if not entries:
+            return 0
+        self._put_local(entries)
+        if self.shared is not None:
+            try:
+                self.shared.put_ai_cache(entries, plan.version)
+            except Exception:
+                pass  # 共享層寫入失敗不影響本次結果
+        return len(entries)
+
+    def _put_local(self, entries):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False), now, now) for k, v in entries.items()])
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """刪除過期項目；仍超過上限時刪除最久沒用到的"""
+        self._conn.execute("DELETE FROM entries WHERE created_at <= ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
@@ -0,0 +1,103 @@
+"""
+共用 HTTP 連線：Gemini、LINE 等對外 API 都走同一個 requests.Session
+  - 連線池 + keep-alive：同一主機只做一次 TCP + TLS 握手，之後的請求重用連線
+  - 統一重試：429 / 5xx / 連線錯誤 / 逾時以指數退避重試（有 Retry-After 時照它等）
+  - 每個端點的延遲統計：metrics() 回傳 {端點: {count, errors, retries, avg_ms, max_ms}}
+
+非冪等的請求（如 LINE push，重送會收到兩則通知）呼叫時傳 retries=0
+HTTP/2：requests / urllib3 不支援；httpx 需要另裝 h2，keep-alive 已省下主要的握手成本，暫不引入
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+POOL_SIZE = 16        # 每個主機保留的連線數（單字補全最多 10 段並行）
+MAX_RETRY_AFTER = 30  # 秒；Retry-After 太長就不等，直接回傳
+
+_session = None
+_session_lock = threading.Lock()
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+
+def _endpoint_of(url):
+    """統計用的端點名稱：主機 + 路徑（不含 query，避免把 API key 寫進統計）"""
+    parts = urlsplit(url)
+    return parts.netloc + parts.path
+
+
+def _record(endpoint, elapsed, ok, retried):
+    ms = elapsed * 1000
+    with _metrics_lock:
+        m = _metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+        m["count"] += 1
+        m["errors"] += 0 if ok else 1
+        m["retries"] += 1 if retried else 0
+        m["total_ms"] += ms
+        m["max_ms"] = max(m["max_ms"], ms)
+
+
+def _retry_delay(res, attempt, backoff):
+    if res is not None:
+        try:
+            return min(float(res.headers.get("Retry-After", "")), MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return backoff * (2 ** attempt) * (1 + random.random() / 2)
+
+
+def request(method, url, endpoint=None, retries=2, backoff=1.0, **kwargs):
+    """送出請求，暫時性錯誤自動重試。回傳最後一次的 Response；重試用盡仍是連線錯誤 / 逾時則丟出例外"""
+    endpoint = endpoint or _endpoint_of(url)
+    session = get_session()
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        res = None
+        try:
+            res = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _record(endpoint, time.perf_counter() - start, False, attempt > 0)
+            if attempt == retries:
+                raise
+        else:
+            ok = res.status_code < 400
+            _record(endpoint, time.perf_counter() - start, ok, attempt > 0)
+            if res.status_code not in RETRY_STATUS or attempt == retries:
+                return res
+        time.sleep(_retry_delay(res, attempt, backoff))
+
+
+def post(url, endpoint=None, retries=2, backoff=1.0, **kwargs):
+    return request("POST", url, endpoint=endpoint, retries=retries, backoff=backoff, **kwargs)
+
+
+def metrics():
+    with _metrics_lock:
+        return {
+            ep: {"count": m["count"], "errors": m["errors"], "retries": m["retries"],
+                 "avg_ms": round(m["total_ms"] / m["count"], 1), "max_ms": round(m["max_ms"], 1)}
+            for ep, m in _metrics.items()
+        }
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
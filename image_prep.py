@@ -0,0 +1,46 @@
+"""
+OCR 前的圖片處理：手機照片動輒 4000px / 數 MB，Gemini 實際以 768px 圖塊辨識，
+長邊縮到 OCR_MAX_SIDE 並以 JPEG 重新壓縮，payload 通常小於原圖的 1/10
+
+沒有安裝 Pillow 時原樣送出（Streamlit 本身依賴 Pillow，部署環境一定有）
+"""
+import io
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+OCR_MAX_SIDE = 1600   # 長邊像素；課本小字在這個解析度仍可辨識
+OCR_JPEG_QUALITY = 85
+
+
+def guess_mime(name):
+    name = (name or "").lower()
+    if name.endswith('.png'):
+        return "image/png"
+    if name.endswith('.webp'):
+        return "image/webp"
+    return "image/jpeg"
+
+
+def prepare_image(data, name="", max_side=OCR_MAX_SIDE, quality=OCR_JPEG_QUALITY):
+    """回傳 (圖片 bytes, mime)。依 EXIF 轉正、縮小、轉 RGB JPEG；
+    無法處理（沒有 Pillow、格式不支援）或重新壓縮後反而更大時回傳原圖"""
+    original = (data, guess_mime(name))
+    if Image is None:
+        return original
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+    except Exception:
+        return original
+    resized = out.getvalue()
+    if len(resized) >= len(data):
+        return original
+    return resized, "image/jpeg"
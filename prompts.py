@@ -0,0 +1,155 @@
+"""
+Prompt 模板登錄：每個模板只讀一次檔，之後只在檔案 mtime 或 st.secrets 覆寫值改變時才重新載入
+  - PromptTemplate.version：內容雜湊（前 12 碼），可直接當 AI 回應快取的 key 前綴，prompt 改版舊快取自然失效
+  - 有欄位的模板（如 {template}）在載入時先解析成片段並檢查欄位名稱，格式錯誤（單一大括號、未知欄位）
+    在載入時就發現，改用內建備用版，不會等到學生送出錄音才出錯
+  - 檔案不存在、secrets 沒設定時使用內建備用版
+"""
+import hashlib
+import os
+import threading
+from string import Formatter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+VOCAB_FALLBACK = """
+You are a vocabulary organizing assistant.
+Requirements:
+1. Identify the main English word each line.
+2. If a line includes definitions or example sentences, CORRECT them if there are errors.
+3. If definitions (Chinese_1, Chinese_2), POS, or example sentences are MISSING, provide them.
+4. Ensure the Part of Speech (POS) in Traditional Chinese (e.g., 名詞, 動詞, 形容詞).
+5. Ensure the (Chinese_1, Chinese_2) in Traditional Chinese.
+6. Ensure the (Word, Example) in English.
+7. Output format MUST be strictly separated by a pipe symbol (|) for each line.
+8. Format: Word | POS | Chinese_1 | Chinese_2 | Example
+9. Do not output any header or markdown symbols, just the raw data lines.
+"""
+
+PRONUNCIATION_FALLBACK = """
+Context: English pronunciation practice for non-native speakers.
+Template Sentence: "{template}"
+Target Vocabulary to fill in the blank: {options_list}
+
+Task:
+1. Listen to the audio provided.
+2. Transcribe it exactly as heard.
+3. Identify which of the 'Target Vocabulary' appear in the speech within the sentence structure.
+4. Be flexible with minor pronunciation errors, but key words must be recognizable.
+5. Provide specific, constructive feedback in Traditional Chinese.
+
+Return JSON:
+{{
+    "transcript": "Transcription of the audio",
+    "correct_options": ["opt1", "opt2"],
+    "feedback": "Specific feedback here"
+}}
+"""
+
+OCR_INSTRUCTION = """Look at the textbook page image(s) provided.
+Extract ALL English vocabulary words visible on the page.
+For each word, provide the information in the format below.
+If the image shows Chinese translations, POS, or example sentences, include them.
+If any information is missing from the image, provide it yourself.
+Ignore page numbers, headers, footers, and non-vocabulary content.
+If no English vocabulary words are found in the image, return an empty response.
+
+"""
+
+
+class PromptTemplate:
+    def __init__(self, name, text, fields=None, source=""):
+        """fields=None：原文直接使用（不做格式化）；否則為允許的欄位名稱，載入時檢查"""
+        self.name = name
+        self.text = text
+        self.fields = fields
+        self.source = source
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        self._parts = None
+        if fields is not None:
+            self._parts = list(Formatter().parse(text))  # 大括號不成對時丟 ValueError
+            unknown = {f for _, f, _, _ in self._parts if f is not None} - set(fields)
+            if unknown:
+                raise ValueError(f"prompt {name} 有未知欄位：{sorted(unknown)}")
+
+    def format(self, **values):
+        """用預先解析好的片段組字串（與 str.format 結果相同）"""
+        if self._parts is None:
+            return self.text
+        out = []
+        for literal, field, spec, conv in self._parts:
+            out.append(literal)
+            if field is not None:
+                value = values[field]
+                if conv == "r":
+                    value = repr(value)
+                elif conv == "s":
+                    value = str(value)
+                out.append(format(value, spec or ""))
+        return "".join(out)
+
+
+class PromptRegistry:
+    def __init__(self, secrets=None, base_dir=BASE_DIR):
+        self.secrets = secrets
+        self.base_dir = base_dir
+        self._specs = {}
+        self._loaded = {}  # name -> (來源簽章, PromptTemplate)
+        self._lock = threading.Lock()
+
+    def register(self, name, filename, fallback, secret_key=None, fields=None):
+        """secret_key 有值時優先於檔案（與原本 st.secrets["system_prompt"] 的行為相同）"""
+        self._specs[name] = (os.path.join(self.base_dir, filename), fallback, secret_key, fields)
+        self._loaded.pop(name, None)
+
+    def _secret(self, key):
+        if not key or self.secrets is None:
+            return None
+        try:
+            return self.secrets.get(key) or None
+        except Exception:
+            return None
+
+    def get(self, name):
+        """回傳目前的 PromptTemplate；來源沒變時只多一次 stat"""
+        path, fallback, secret_key, fields = self._specs[name]
+        secret = self._secret(secret_key)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        signature = (secret, None if secret else mtime)
+        cached = self._loaded.get(name)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with self._lock:
+            tpl = self._load(name, path, fallback, secret, mtime, fields)
+            self._loaded[name] = (signature, tpl)
+        return tpl
+
+    @staticmethod
+    def _load(name, path, fallback, secret, mtime, fields):
+        if secret:
+            text, source = secret, "secrets"
+        elif mtime is not None:
+            with open(path, "r", encoding="utf-8") as f:
+                text, source = f.read(), path
+        else:
+            print(f"[Prompts] WARNING: {name} 找不到 {path}，使用內建備用 prompt")
+            text, source = fallback, "fallback"
+        try:
+            tpl = PromptTemplate(name, text, fields, source)
+        except ValueError as e:
+            print(f"[Prompts] WARNING: {name} 格式錯誤（{e}），使用內建備用 prompt")
+            tpl = PromptTemplate(name, fallback, fields, "fallback")
+        print(f"[Prompts] {name} loaded from {tpl.source}, length={len(tpl.text)}, version={tpl.version}")
+        return tpl
+
+
+def build_registry(secrets=None, base_dir=BASE_DIR):
+    """學生端用到的 prompt：vocab（單字補全 / OCR）、pronunciation（句型口說判讀）"""
+    registry = PromptRegistry(secrets, base_dir)
+    registry.register("vocab", "system_prompt.md", VOCAB_FALLBACK, secret_key="system_prompt")
+    registry.register("pronunciation", "pronunciation_feedback_prompt.md", PRONUNCIATION_FALLBACK,
+                      fields=("template", "options_list"))
+    return registry
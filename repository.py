@@ -0,0 +1,445 @@
+"""
+資料存取層：把 Firestore 路徑與讀寫集中在一處
+後端可以是真正的 google.cloud.firestore.Client，也可以是 fake_firestore.FakeFirestoreClient
+（離線壓測 / 效能量測時不需憑證、不產生讀取費用）
+
+選擇後端：
+  - st.secrets 設定 USE_FAKE_FIRESTORE = true，或環境變數 FLASHCARD_FAKE_FIRESTORE=1 → 記憶體版
+  - 其他情況 → 用 firebase_credentials 建立真正的 Firestore client
+"""
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import fake_firestore
+from fake_firestore import FakeFirestoreClient, NotFound
+from sentence_cache import template_hash
+
+BATCH_LIMIT = 400  # 每個 WriteBatch 最多寫入數（Firestore 上限 500，保留餘裕）
+BATCH_WORKERS = 4  # 大量寫入 / 刪除時同時送出的 WriteBatch 數
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)  # 增量同步的初始水位
+RESERVED_STUDENT_NUMBERS = {999}  # S999 保留給測試帳號，不自動分配
+LEADERBOARD_VERSION = 1  # 排行榜彙總版本；meta/leaderboards.version 落後時從 sentence_stats 重建一次
+
+
+def use_fake_backend(secrets=None):
+    if os.environ.get("FLASHCARD_FAKE_FIRESTORE", "") not in ("", "0"):
+        return True
+    try:
+        return bool(secrets and secrets.get("USE_FAKE_FIRESTORE", False))
+    except Exception:
+        return False
+
+
+def create_client(creds_info=None, fake=False):
+    """建立 Firestore 後端。fake=True 時回傳記憶體版 client"""
+    if fake:
+        return FakeFirestoreClient()
+    from google.cloud import firestore
+    from google.oauth2 import service_account
+    creds = service_account.Credentials.from_service_account_info(creds_info)
+    return firestore.Client(credentials=creds)
+
+
+class FlashcardRepository:
+    """學生端資料存取。client 為 Firestore client（真實或記憶體版），app_id 決定資料根路徑"""
+
+    def __init__(self, client, app_id):
+        self.client = client
+        self.app_id = app_id
+        self.users_path = f"artifacts/{app_id}/public/data/users"
+        self.leaderboard_path = f"artifacts/{app_id}/public/data/leaderboards"
+        self.counters_path = f"artifacts/{app_id}/public/data/counters"
+        self.ai_cache_path = f"artifacts/{app_id}/public/data/ai_cache"
+        self.sentence_catalog_path = f"artifacts/{app_id}/public/data/sentences"
+        self.sentence_meta_path = f"artifacts/{app_id}/public/data/meta/sentences"
+        self.leaderboard_meta_path = f"artifacts/{app_id}/public/data/meta/leaderboards"
+        if isinstance(client, FakeFirestoreClient):
+            fs = fake_firestore
+        else:
+            from google.cloud import firestore as fs
+        self.SERVER_TIMESTAMP = fs.SERVER_TIMESTAMP
+        self.DELETE_FIELD = fs.DELETE_FIELD
+        self.Increment = fs.Increment
+        self._transactional = fs.transactional
+
+    # --- 路徑 ---
+    def vocab_path(self, uid):
+        return f"artifacts/{self.app_id}/users/{uid}/vocabulary"
+
+    def sentence_progress_path(self, uid):
+        return f"artifacts/{self.app_id}/users/{uid}/sentence_progress"
+
+    # --- 使用者 ---
+    def list_users(self):
+        return {d.id: d.to_dict() for d in self.client.collection(self.users_path).stream()}
+
+    def get_user(self, user_name):
+        doc = self.client.collection(self.users_path).document(user_name).get()
+        return doc.to_dict() if doc.exists else None
+
+    def update_user(self, user_name, data):
+        self.client.collection(self.users_path).document(user_name).update(data)
+
+    def merge_user(self, user_name, data):
+        self.client.collection(self.users_path).document(user_name).set(data, merge=True)
+
+    # --- 學號計數器 ---
+    # counters/student_id 的 value 為目前已分配的最大學號數字，用交易遞增，註冊時不必掃描所有使用者
+    def _student_counter_ref(self):
+        return self.client.collection(self.counters_path).document("student_id")
+
+    def _max_student_number(self):
+        """掃描使用者找出最大學號數字（只在計數器文件還不存在時執行一次）"""
+        max_num = 0
+        for u in self.list_users().values():
+            n = parse_student_number(u.get("id", ""))
+            if n is not None and n not in RESERVED_STUDENT_NUMBERS:
+                max_num = max(max_num, n)
+        return max_num
+
+    def next_student_id(self):
+        """原子分配下一個學號（S + 3 位數字）"""
+        ref = self._student_counter_ref()
+
+        @self._transactional
+        def bump(transaction):
+            snap = ref.get(transaction=transaction)
+            current = snap.to_dict().get("value") if snap.exists else None
+            if current is None:
+                current = self._max_student_number()
+            nxt = current + 1
+            while nxt in RESERVED_STUDENT_NUMBERS:
+                nxt += 1
+            transaction.set(ref, {"value": nxt}, merge=True)
+            return nxt
+
+        return f"S{bump(self.client.transaction()):03d}"
+
+    def reserve_student_id(self, student_id):
+        """手動指定學號時（後台新增使用者）把計數器推進到至少該號碼，避免之後自動分配撞號"""
+        n = parse_student_number(student_id)
+        if n is None or n in RESERVED_STUDENT_NUMBERS:
+            return
+        ref = self._student_counter_ref()
+
+        @self._transactional
+        def reserve(transaction):
+            snap = ref.get(transaction=transaction)
+            current = snap.to_dict().get("value") if snap.exists else None
+            if current is None:
+                current = self._max_student_number()
+            if n > current:
+                transaction.set(ref, {"value": n}, merge=True)
+
+        reserve(self.client.transaction())
+
+    # --- 排行榜彙總 ---
+    # leaderboards/{dataset_id}：{name, total, entries: {user_name: {student, completed, total, last_active}}}
+    # 每次練習只改自己那一格，排行榜頁只讀 O(題庫數) 份文件，前 N 名在讀取時排序
+    def list_leaderboards(self):
+        return {d.id: d.to_dict() for d in self.client.collection(self.leaderboard_path).stream()}
+
+    def upsert_leaderboard_entry(self, dataset_id, dataset_name, total, user_name, entry):
+        self.client.collection(self.leaderboard_path).document(dataset_id).set({
+            "name": dataset_name,
+            "total": total,
+            "updated_at": self.SERVER_TIMESTAMP,
+            "entries": {user_name: entry},
+        }, merge=True)
+
+    def remove_leaderboard_entry(self, user_name, dataset_id=None):
+        """移除某學生在指定題庫（未指定則全部題庫）的排行榜紀錄"""
+        coll = self.client.collection(self.leaderboard_path)
+        refs = [coll.document(dataset_id)] if dataset_id else coll.list_documents()
+        batch = self.client.batch()
+        count = 0
+        for ref in refs:
+            batch.set(ref, {"entries": {user_name: self.DELETE_FIELD}}, merge=True)
+            count += 1
+            if count >= BATCH_LIMIT:
+                batch.commit()
+                batch = self.client.batch()
+                count = 0
+        if count > 0:
+            batch.commit()
+
+    def rebuild_leaderboards(self, users=None):
+        """從每個使用者的 sentence_stats 重建排行榜彙總（彙總文件遺失或需要修復時用），回傳 {dataset_id: data}"""
+        if users is None:
+            users = self.list_users()
+        boards = {}
+        for user_name, u in users.items():
+            if u.get("role") == "admin":
+                continue
+            for dataset_id, stat in (u.get("sentence_stats") or {}).items():
+                if not isinstance(stat, dict) or not stat.get("total"):
+                    continue
+                board = boards.setdefault(dataset_id, {
+                    "name": stat.get("name", dataset_id), "total": stat["total"], "entries": {}})
+                board["entries"][user_name] = leaderboard_entry(u.get("name", user_name), stat)
+        coll = self.client.collection(self.leaderboard_path)
+        batch = self.client.batch()
+        count = 0
+        for dataset_id, board in boards.items():
+            batch.set(coll.document(dataset_id), {**board, "updated_at": self.SERVER_TIMESTAMP})
+            count += 1
+            if count >= BATCH_LIMIT:
+                batch.commit()
+                batch = self.client.batch()
+                count = 0
+        if count > 0:
+            batch.commit()
+        return boards
+
+    def ensure_leaderboards(self):
+        """一次性回填：meta/leaderboards 的版本落後 LEADERBOARD_VERSION 時無條件重建。
+        不看彙總文件是否存在：部署後第一次練習，JS 元件就會建立只含部署後完成數的格子。回傳是否有重建"""
+        ref = self.client.document(self.leaderboard_meta_path)
+        snap = ref.get()
+        if snap.exists and (snap.to_dict() or {}).get("version", 0) >= LEADERBOARD_VERSION:
+            return False
+        self.rebuild_leaderboards()
+        ref.set({"version": LEADERBOARD_VERSION, "rebuilt_at": self.SERVER_TIMESTAMP}, merge=True)
+        return True
+
+    # --- 單字 ---
+    # 所有單字寫入都蓋上 last_updated（伺服器時間），增量同步只需讀取比水位新的文件
+    def list_vocab(self, uid):
+        """讀取整個單字庫，每筆附上 id"""
+        return self._vocab_docs(self.client.collection(self.vocab_path(uid)))
+
+    def list_vocab_since(self, uid, watermark):
+        """只讀取 last_updated 晚於 watermark 的單字（增量同步）"""
+        query = self.client.collection(self.vocab_path(uid)).where("last_updated", ">", watermark)
+        return self._vocab_docs(query)
+
+    @staticmethod
+    def _vocab_docs(query):
+        data = []
+        for d in query.stream():
+            item = d.to_dict()
+            item['id'] = d.id
+            data.append(item)
+        return data
+
+    @staticmethod
+    def vocab_watermark(items, current=EPOCH):
+        """取 items 中最新的 last_updated 作為新水位（沒有就維持原值）"""
+        latest = current
+        for it in items:
+            ts = it.get("last_updated")
+            if isinstance(ts, datetime) and ts.tzinfo is not None and ts > latest:
+                latest = ts
+        return latest
+
+    def add_vocab(self, uid, items, progress=None, workers=BATCH_WORKERS):
+        """批次新增單字：每 BATCH_LIMIT 筆一個 WriteBatch，多個 batch 並行送出。
+        回傳 (新文件 id 列表, 失敗的例外列表)；id 列表與 items 同順序，所在 batch 失敗的為 None"""
+        coll = self.client.collection(self.vocab_path(uid))
+        refs = [coll.document() for _ in items]
+        rows = list(zip(refs, items))
+        ok, errors = self._run_batches(
+            rows, lambda batch, row: batch.set(row[0], {**row[1], "last_updated": self.SERVER_TIMESTAMP}),
+            progress, workers)
+        saved = {ref.id for ref, _ in ok}
+        return [ref.id if ref.id in saved else None for ref in refs], errors
+
+    def update_vocab(self, uid, doc_id, data):
+        self.client.collection(self.vocab_path(uid)).document(doc_id).update(
+            {**data, "last_updated": self.SERVER_TIMESTAMP})
+
+    def delete_vocab(self, uid, doc_ids, progress=None, workers=BATCH_WORKERS):
+        """批次刪除單字：每 BATCH_LIMIT 筆一個 WriteBatch，多個 batch 並行送出。
+        回傳 (成功刪除的 id 列表, 失敗的例外列表)"""
+        coll = self.client.collection(self.vocab_path(uid))
+        return self._run_batches(list(doc_ids), lambda batch, doc_id: batch.delete(coll.document(doc_id)),
+                                 progress, workers)
+
+    def _run_batches(self, rows, stage, progress=None, workers=BATCH_WORKERS):
+        """把 rows 切成 BATCH_LIMIT 筆一組，stage(batch, row) 排入寫入後並行 commit。
+        progress(已完成筆數, 總筆數) 在呼叫端執行緒回報。回傳 (成功的 rows, 失敗的例外列表)"""
+        chunks = [rows[i:i + BATCH_LIMIT] for i in range(0, len(rows), BATCH_LIMIT)]
+
+        def commit(chunk):
+            batch = self.client.batch()
+            for row in chunk:
+                stage(batch, row)
+            batch.commit()
+            return chunk
+
+        done, errors = [], []
+        if not chunks:
+            return done, errors
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = [pool.submit(commit, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                try:
+                    done.extend(future.result())
+                except Exception as e:
+                    errors.append(e)
+                if progress:
+                    progress(len(done), len(rows))
+        return done, errors
+
+    def commit_buffered(self, uid, user_name, vocab_updates, practice_seconds):
+        """寫入緩衝區的內容：單字更新 {doc_id: data} 與練習秒數 {日期: 秒}，盡量在同一個 WriteBatch 送出。
+        單字已在別處被刪除（NotFound）時，整批會失敗，改為逐筆寫入並略過不存在的單字"""
+        coll = self.client.collection(self.vocab_path(uid))
+        user_ref = self.client.collection(self.users_path).document(user_name)
+        writes = [(coll.document(doc_id), {**data, "last_updated": self.SERVER_TIMESTAMP})
+                  for doc_id, data in vocab_updates.items()]
+        practice = None
+        if practice_seconds:
+            practice = {"practice_time": {day: self.Increment(sec) for day, sec in practice_seconds.items()}}
+        try:
+            batch = self.client.batch()
+            count = 0
+            for ref, data in writes:
+                batch.update(ref, data)
+                count += 1
+                if count >= BATCH_LIMIT:
+                    batch.commit()
+                    batch = self.client.batch()
+                    count = 0
+            if practice:
+                batch.set(user_ref, practice, merge=True)
+                count += 1
+            if count > 0:
+                batch.commit()
+        except NotFound:
+            for ref, data in writes:
+                try:
+                    ref.update(data)
+                except NotFound:
+                    pass
+            if practice:
+                user_ref.set(practice, merge=True)
+
+    # --- AI 補全共享快取（gemini_cache 的共享層） ---
+    def get_ai_cache(self, keys):
+        """一次讀取多個快取文件，回傳 {key: data}（不存在的略過）"""
+        coll = self.client.collection(self.ai_cache_path)
+        docs = self.client.get_all([coll.document(k) for k in keys])
+        return {d.id: d.to_dict() for d in docs if d.exists}
+
+    def put_ai_cache(self, entries, prompt_version):
+        """entries：{key: 單字欄位}，分批寫入"""
+        coll = self.client.collection(self.ai_cache_path)
+        now = time.time()
+        _, errors = self._run_batches(
+            list(entries.items()),
+            lambda batch, row: batch.set(coll.document(row[0]),
+                                         {"item": row[1], "prompt_version": prompt_version, "created_at": now}))
+        if errors:
+            raise errors[0]
+
+    # --- 句型書（sentence_cache 的資料來源） ---
+    def sentence_data_path(self, dataset_id):
+        return f"artifacts/{self.app_id}/public/data/{dataset_id}"
+
+    def list_sentence_catalogs(self):
+        """{dataset_id: 目錄文件}"""
+        return {d.id: d.to_dict() for d in self.client.collection(self.sentence_catalog_path).stream()}
+
+    def list_sentences(self, dataset_id):
+        """句型書所有題目（每筆附上 doc_id），依 Order 排序"""
+        data = []
+        for d in self.client.collection(self.sentence_data_path(dataset_id)).stream():
+            item = d.to_dict()
+            item['doc_id'] = d.id
+            data.append(item)
+        return sorted(data, key=lambda x: x.get('Order', 9999))
+
+    def backfill_template_hashes(self, dataset_id, sentences=None):
+        """舊句型補上 template_hash（以目前 Template 計算，與既有進度文件 ID 相同）。回傳補上的筆數"""
+        if sentences is None:
+            sentences = self.list_sentences(dataset_id)
+        rows = [(s['doc_id'], template_hash(s.get('Template', '')))
+                for s in sentences if not s.get('template_hash') and s.get('doc_id')]
+        coll = self.client.collection(self.sentence_data_path(dataset_id))
+        done, errors = self._run_batches(
+            rows, lambda batch, row: batch.set(coll.document(row[0]), {"template_hash": row[1]}, merge=True))
+        if errors:
+            raise errors[0]
+        return len(done)
+
+    def get_sentence_versions(self):
+        """版本文件：{version, books: {dataset_id: n}}；不存在時回傳空 dict（單一文件讀取）"""
+        doc = self.client.document(self.sentence_meta_path).get()
+        return doc.to_dict() if doc.exists else {}
+
+    def bump_sentence_version(self, dataset_id=None):
+        """句型書有異動時呼叫：全域版本 +1（目錄重讀）；指定 dataset_id 時該書版本也 +1（內容重讀）"""
+        data = {"version": self.Increment(1), "updated_at": self.SERVER_TIMESTAMP}
+        if dataset_id:
+            data["books"] = {dataset_id: self.Increment(1)}
+        self.client.document(self.sentence_meta_path).set(data, merge=True)
+
+    # --- 句型進度 ---
+    def get_sentence_progress(self, uid, template_hash):
+        doc = self.client.collection(self.sentence_progress_path(uid)).document(template_hash).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_sentence_progress_many(self, uid, template_hashes):
+        """一次讀取多個句型進度，回傳 {template_hash: data}（沒練過的略過）"""
+        coll = self.client.collection(self.sentence_progress_path(uid))
+        docs = self.client.get_all([coll.document(h) for h in dict.fromkeys(template_hashes)])
+        return {d.id: d.to_dict() for d in docs if d.exists}
+
+    def list_sentence_progress(self, uid, dataset_id=None):
+        """回傳 {template_hash: data}；指定 dataset_id 時只查該題庫"""
+        query = self.client.collection(self.sentence_progress_path(uid))
+        if dataset_id:
+            query = query.where("dataset_id", "==", dataset_id)
+        return {d.id: d.to_dict() for d in query.stream()}
+
+    def list_all_sentence_progress(self):
+        """所有使用者的句型進度（collection group 一次串流）：{uid: {template_hash: data}}"""
+        prefix = f"artifacts/{self.app_id}/users/"
+        result = {}
+        for d in self.client.collection_group("sentence_progress").stream():
+            path = d.reference.path
+            if not path.startswith(prefix):
+                continue  # 其他 app_id 的資料
+            uid = path[len(prefix):].split("/", 1)[0]
+            result.setdefault(uid, {})[d.id] = d.to_dict()
+        return result
+
+    def delete_sentence_progress(self, uid, dataset_id=None):
+        """批次刪除句型進度，回傳刪除筆數；指定 dataset_id 時只刪該題庫"""
+        docs = self.client.collection(self.sentence_progress_path(uid)).stream()
+        batch = self.client.batch()
+        count = 0
+        deleted_count = 0
+        for d in docs:
+            if dataset_id and d.to_dict().get("dataset_id") != dataset_id:
+                continue
+            batch.delete(d.reference)
+            count += 1
+            deleted_count += 1
+            if count >= BATCH_LIMIT:
+                batch.commit()
+                batch = self.client.batch()
+                count = 0
+        if count > 0:
+            batch.commit()
+        return deleted_count
+
+
+def parse_student_number(student_id):
+    """'S012' -> 12；不是 S + 數字格式回傳 None"""
+    m = re.fullmatch(r"S(\d+)", str(student_id or ""))
+    return int(m.group(1)) if m else None
+
+
+def leaderboard_entry(student, stat):
+    """排行榜單格資料（與 users.sentence_stats.{dataset_id} 同欄位，只留排名需要的）"""
+    return {
+        "student": student,
+        "completed": int(stat.get("completed", 0)),
+        "total": int(stat.get("total", 0)),
+        "last_active": stat.get("last_active"),
+    }
@@ -0,0 +1,154 @@
+"""
+句型書共用快取：目錄與各書內容放在程序記憶體，所有 session（學生端與嵌入的後台）共用同一份
+  - 是否過期靠 meta/sentences 版本文件判斷：每 check_interval 秒最多讀一次（單一文件），
+    全域 version 變了重讀目錄，books.{id} 變了只重讀那本書
+  - 後台匯入 / 編輯 / 刪除 / 切換 Premium 後呼叫 invalidate(book_id)：清本機 + 版本 +1，其他主機下次檢查時重讀
+  - 沒有透過後台的修改（例如直接在 Firestore console 改）最晚 max_age 秒後重讀
+  - 每本書載入時一併建立 BookMeta（分類、各分類句型、template hash、選項數），選單與進度條直接查，不再建 DataFrame
+  - 句型的進度文件 ID 以匯入時存下的 template_hash 為準（之後修改 Template 也不變，進度不會脫鉤）；
+    舊資料沒有這個欄位時才用目前的 Template 即時算
+取得方式：shared_cache(repo)，同一個 repo 路徑在程序內只有一份
+"""
+import hashlib
+import threading
+import time
+
+DEFAULT_CHECK_INTERVAL = 30
+DEFAULT_MAX_AGE = 3600
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def template_hash(template):
+    """句型進度文件 ID：Template 的 MD5（與 streamlit_app.hash_string 相同）"""
+    return hashlib.md5(template.encode('utf-8')).hexdigest()
+
+
+def sentence_key(sentence):
+    """句型的固定 ID（= 進度文件 ID）：優先用存下的 template_hash，沒有時以目前 Template 計算"""
+    return sentence.get('template_hash') or template_hash(sentence.get('Template', ''))
+
+
+class BookMeta:
+    """一本句型書的衍生資料，載入時算一次，所有 session 共用（唯讀）"""
+
+    def __init__(self, sentences):
+        self.sentences = sentences
+        self.hashes = [sentence_key(s) for s in sentences]
+        self.legacy_count = sum(1 for s in sentences if not s.get('template_hash'))
+        self.option_counts = [len(s.get('Options') or []) for s in sentences]
+        self.by_category = {}
+        self.hashes_by_category = {}
+        for s, h in zip(sentences, self.hashes):
+            if 'Category' in s:
+                self.by_category.setdefault(s['Category'], []).append(s)
+                self.hashes_by_category.setdefault(s['Category'], []).append(h)
+        self.categories = sorted(self.by_category, key=str)
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def select(self, category=None):
+        """回傳 (句型列表, 對應的 template hash 列表)；category=None 為整本書"""
+        if category is None:
+            return self.sentences, self.hashes
+        return self.by_category.get(category, []), self.hashes_by_category.get(category, [])
+
+
+EMPTY_BOOK = BookMeta([])
+
+
+class SentenceBookCache:
+    def __init__(self, repo, check_interval=DEFAULT_CHECK_INTERVAL, max_age=DEFAULT_MAX_AGE):
+        self.repo = repo
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.stats = {"version_checks": 0, "catalog_loads": 0, "book_loads": 0}
+        self._lock = threading.RLock()
+        self._catalogs = None
+        self._books = {}          # dataset_id -> BookMeta
+        self._versions = {}       # 最後一次讀到的版本文件
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    # --- 版本檢查 ---
+    def _check(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        self.stats["version_checks"] += 1
+        try:
+            versions = self.repo.get_sentence_versions()
+        except Exception as e:
+            print(f"[SentenceCache] version check failed: {e}")
+            return  # 讀不到版本就沿用現有快取
+        if now - self._loaded_at >= self.max_age:
+            self._drop()
+        elif versions.get("version") != self._versions.get("version"):
+            self._catalogs = None
+            old_books = self._versions.get("books", {})
+            new_books = versions.get("books", {})
+            for book_id in list(self._books):
+                if old_books.get(book_id) != new_books.get(book_id):
+                    del self._books[book_id]
+        self._versions = versions
+
+    def _drop(self, book_id=None):
+        if book_id is None:
+            self._catalogs = None
+            self._books.clear()
+            self._loaded_at = time.monotonic()
+        else:
+            self._catalogs = None
+            self._books.pop(book_id, None)
+
+    # --- 讀取 ---
+    def catalogs(self, fresh=False):
+        """{dataset_id: 目錄資料}；fresh=True 時不管間隔先檢查版本（後台每次 rerun 用）"""
+        with self._lock:
+            self._check(force=fresh)
+            if self._catalogs is None:
+                self._catalogs = self.repo.list_sentence_catalogs()
+                self.stats["catalog_loads"] += 1
+            return self._catalogs
+
+    def book(self, book_id, fresh=False):
+        """句型書的 BookMeta。回傳的物件為所有 session 共用，呼叫端不可修改"""
+        with self._lock:
+            self._check(force=fresh)
+            if book_id not in self._books:
+                self._books[book_id] = BookMeta(self.repo.list_sentences(book_id))
+                self.stats["book_loads"] += 1
+            return self._books[book_id]
+
+    def sentences(self, book_id, fresh=False):
+        """句型書內容（依 Order 排序，每筆含 doc_id）"""
+        return self.book(book_id, fresh).sentences
+
+    # --- 失效 ---
+    def invalidate(self, book_id=None):
+        """寫入後呼叫：清掉本機快取並把版本 +1，其他主機下次檢查時重讀"""
+        with self._lock:
+            self._drop(book_id)
+            try:
+                self.repo.bump_sentence_version(book_id)
+            except Exception as e:
+                print(f"[SentenceCache] version bump failed: {e}")
+            self._checked_at = 0.0  # 下次讀取時重新對齊版本
+
+    def reload(self):
+        """手動重新整理：只清本機，不影響其他主機"""
+        with self._lock:
+            self._drop()
+            self._checked_at = 0.0
+
+
+def shared_cache(repo, check_interval=DEFAULT_CHECK_INTERVAL):
+    key = (id(repo.client), repo.app_id)
+    with _instances_lock:
+        cache = _instances.get(key)
+        if cache is None:
+            cache = _instances[key] = SentenceBookCache(repo, check_interval)
+        return cache
@@ -0,0 +1,15 @@
+"""
+句型統計（users.sentence_stats.{dataset_id} 與排行榜彙總）的計算規則
+  - 練習時由 JS 元件（drill.js updateSentenceStats）維護：name / total / last_active 直接覆蓋，
+    completion_count 從 0 變 1（第一次完成一輪）時 completed +1；沒有其他計數欄位
+  - 這裡的規則給修復工具（fix_sentence_stats.py）從 sentence_progress 重算時用，必須與 JS 一致
+"""
+
+COMPLETED = "completed"
+
+
+def is_completed(progress, options):
+    """進度文件（dict 或 None）+ 該句選項 -> 是否算入 completed；沒有選項的句型不列入統計"""
+    if not options or not progress:
+        return False
+    return int(progress.get("completion_count", 0) or 0) > 0
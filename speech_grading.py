@@ -0,0 +1,50 @@
+"""
+口說判讀的併行執行：Gemini（主要）與本地 SpeechRecognition（備援）同時開始，不再先等 Gemini 失敗才跑 SR
+  - 主要結果可信（有抓到選項）就立即回傳，不等備援
+  - 備援先有可信結果時，再給主要最多 grace 秒（Gemini 的回饋較完整），逾時就用備援
+  - 整體不超過 budget 秒；逾時仍未完成的一方直接放棄（執行緒在背景自行結束，不阻塞畫面）
+背景執行緒只做辨識與 HTTP，不碰 st.*
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def _result_of(future):
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"[Speech] {getattr(future, 'label', 'task')} failed: {e}")
+        return None
+
+
+def race(primary, fallback=None, budget=20.0, grace=3.0, primary_ok=bool, fallback_ok=bool):
+    """primary / fallback：無參數函式，在背景執行緒執行。
+    回傳 (primary 結果, fallback 結果)，沒完成或失敗的為 None"""
+    pool = ThreadPoolExecutor(max_workers=2)
+    deadline = time.monotonic() + budget
+    fp = pool.submit(primary)
+    fp.label = "primary"
+    pending = {fp}
+    ff = None
+    if fallback:
+        ff = pool.submit(fallback)
+        ff.label = "fallback"
+        pending.add(ff)
+    p_res = f_res = None
+    limit = deadline
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, limit - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break  # 超過時限
+            if fp in done:
+                p_res = _result_of(fp)
+                if primary_ok(p_res):
+                    break
+            if ff is not None and ff in done:
+                f_res = _result_of(ff)
+                if fp in pending and fallback_ok(f_res):
+                    limit = min(deadline, time.monotonic() + grace)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return p_res, f_res
@@ -0,0 +1,278 @@
+"""
+SRS（間隔重複）引擎：單字庫的 SRS 欄位以 NumPy 欄位陣列保存
+到期判斷、抽題排序、批次排程都是整欄向量運算，1 萬字的單字庫也在毫秒內完成
+
+  - schedule()：簡化 SM-2，一次排程任意多筆（全班批次排程可直接呼叫）
+  - SrsTable：id -> 列號對照 + interval / ease / due / streak / correct / total 六欄，
+    由 VocabIndex 隨單字新增 / 修改 / 刪除增量維護
+
+srs_due 以日期序數（date.toordinal()）保存：空白 = 新字（NEW_DUE，視為到期），格式錯誤 = 永不到期
+與改版前逐筆 SM-2 的一致性檢查：python srs_engine.py（self_check）
+"""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+NEW_DUE = -1
+NEVER_DUE = np.iinfo(np.int64).max
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+MAX_EASE = 3.0
+
+
+def due_ordinal(value):
+    """srs_due 字串 -> 日期序數"""
+    if not value:
+        return NEW_DUE
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10]).toordinal()
+        except ValueError:
+            return NEVER_DUE
+    return NEVER_DUE
+
+
+def _int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(value, default):
+    try:
+        f = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if f != f else f  # NaN（pandas 補的空值）視為預設
+
+
+def schedule(interval, ease, streak, is_correct, today_ord):
+    """向量化 SM-2：回傳 (new_interval, new_ease, new_streak, new_due_ord)
+    答對：streak+1，第 1 次 1 天、第 2 次 3 天、之後 interval × ease；ease +0.1（上限 3.0）
+    答錯：streak 歸零、明天重來；ease -0.2（下限 1.3）"""
+    interval = np.asarray(interval, dtype=np.int64)
+    ease = np.asarray(ease, dtype=np.float64)
+    is_correct = np.asarray(is_correct, dtype=bool)
+    new_streak = np.where(is_correct, np.asarray(streak, dtype=np.int64) + 1, 0)
+    grown = np.rint(interval * ease).astype(np.int64)
+    new_interval = np.where(~is_correct | (new_streak == 1), 1,
+                            np.where(new_streak == 2, 3, grown))
+    new_ease = np.where(is_correct, np.minimum(MAX_EASE, ease + 0.1), np.maximum(MIN_EASE, ease - 0.2))
+    return new_interval, np.round(new_ease, 2), new_streak, today_ord + new_interval
+
+
+def compute_srs_update(word, is_correct, today=None):
+    """單筆排程，回傳要寫回單字文件的 SRS 欄位"""
+    today = today or date.today()
+    interval, ease, streak, due = schedule(
+        [_int(word.get('srs_interval', 0))], [_float(word.get('srs_ease'), DEFAULT_EASE)],
+        [_int(word.get('srs_streak', 0))], [bool(is_correct)], today.toordinal())
+    return {
+        'srs_interval': int(interval[0]),
+        'srs_ease': float(ease[0]),
+        'srs_due': str(date.fromordinal(int(due[0]))),
+        'srs_streak': int(streak[0]),
+        'srs_last_review': str(today),
+    }
+
+
+class SrsTable:
+    _COLUMNS = (("interval", np.int64), ("ease", np.float64), ("due", np.int64),
+                ("streak", np.int64), ("correct", np.int64), ("total", np.int64))
+
+    def __init__(self, records=(), capacity=256):
+        self.ids = []
+        self.row_of = {}
+        self._cols = {name: np.zeros(capacity, dtype=dt) for name, dt in self._COLUMNS}
+        for r in records:
+            self.upsert(r)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def col(self, name):
+        return self._cols[name][:len(self.ids)]
+
+    # --- 維護 ---
+    def upsert(self, record):
+        doc_id = record.get("id")
+        if doc_id is None:
+            return
+        row = self.row_of.get(doc_id)
+        if row is None:
+            row = len(self.ids)
+            if row == len(self._cols["due"]):
+                for name in self._cols:
+                    self._cols[name] = np.resize(self._cols[name], row * 2)
+            self.ids.append(doc_id)
+            self.row_of[doc_id] = row
+        c = self._cols
+        c["interval"][row] = _int(record.get("srs_interval", 0))
+        c["ease"][row] = _float(record.get("srs_ease"), DEFAULT_EASE)
+        c["due"][row] = due_ordinal(record.get("srs_due"))
+        c["streak"][row] = _int(record.get("srs_streak", 0))
+        c["correct"][row] = _int(record.get("Correct", 0))
+        c["total"][row] = _int(record.get("Total", 0))
+
+    def remove(self, doc_id):
+        """把最後一列搬到被刪的位置（O(1)）"""
+        row = self.row_of.pop(doc_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.row_of[moved] = row
+            for arr in self._cols.values():
+                arr[row] = arr[last]
+        self.ids.pop()
+
+    # --- 查詢 ---
+    def rows(self, ids=None):
+        """ids 對應的列號（None = 全部；不在表內的 id 略過）"""
+        if ids is None:
+            return np.arange(len(self.ids))
+        row_of = self.row_of
+        return np.fromiter((row_of[i] for i in ids if i in row_of), dtype=np.int64)
+
+    def _due_mask(self, rows, today):
+        due = self._cols["due"][rows]
+        return due <= (today or date.today()).toordinal()  # NEW_DUE (-1) 一定成立
+
+    def due_count(self, ids=None, today=None):
+        return int(self._due_mask(self.rows(ids), today).sum())
+
+    def due_ids(self, ids=None, today=None):
+        """到期（含逾期）單字依到期日排序，新字排在最後"""
+        rows = self.rows(ids)
+        rows = rows[self._due_mask(rows, today)]
+        due = self._cols["due"][rows]
+        order = np.argsort(np.where(due == NEW_DUE, NEVER_DUE, due), kind="stable")
+        return [self.ids[r] for r in rows[order]]
+
+    def accuracy(self, rows):
+        """正確率；從未練習過為 -1（抽題時最優先）"""
+        total = self._cols["total"][rows]
+        correct = self._cols["correct"][rows]
+        return np.divide(correct, total, out=np.full(len(rows), -1.0), where=total > 0)
+
+    def sample_by_accuracy(self, count, ids=None):
+        """正確率由低到高取前 count 個"""
+        rows = self.rows(ids)
+        order = np.argsort(self.accuracy(rows), kind="stable")[:count]
+        return [self.ids[r] for r in rows[order]]
+
+    def sample_for_review(self, count, ids=None, today=None):
+        """SRS 智慧抽題：到期優先（依日期）→ 新字 → 正確率低"""
+        rows = self.rows(ids)
+        due = self._cols["due"][rows]
+        is_due = self._due_mask(rows, today)
+        # 排序鍵（由次要到主要）：正確率、到期日（新字排在到期字之後）、是否到期
+        due_key = np.where(is_due, np.where(due == NEW_DUE, NEVER_DUE, due), 0)
+        acc_key = np.where(is_due, 0.0, self.accuracy(rows))
+        order = np.lexsort((acc_key, due_key, ~is_due))[:count]
+        return [self.ids[r] for r in rows[order]]
+
+    def schedule_batch(self, ids, is_correct, today=None):
+        """批次排程：ids 須都在表內、與 is_correct 等長。回傳 {id: SRS 欄位}（不修改表，寫入後由 upsert 更新）"""
+        today = today or date.today()
+        rows = self.rows(ids)
+        c = self._cols
+        interval, ease, streak, due = schedule(
+            c["interval"][rows], c["ease"][rows], c["streak"][rows], is_correct, today.toordinal())
+        today_str = str(today)
+        return {
+            self.ids[r]: {
+                'srs_interval': int(interval[k]),
+                'srs_ease': float(ease[k]),
+                'srs_due': str(date.fromordinal(int(due[k]))),
+                'srs_streak': int(streak[k]),
+                'srs_last_review': today_str,
+            }
+            for k, r in enumerate(rows)
+        }
+
+
+# --- 與改版前逐筆 SM-2 對照：python srs_engine.py ---
+def _reference_update(word, is_correct, today):
+    """改版前 streamlit_app.compute_srs_update 的逐筆寫法（只給 self_check 對照用）"""
+    interval = int(word.get('srs_interval', 0))
+    ease = float(word.get('srs_ease', 2.5))
+    streak = int(word.get('srs_streak', 0))
+    if is_correct:
+        streak += 1
+        if streak == 1:
+            new_interval = 1
+        elif streak == 2:
+            new_interval = 3
+        else:
+            new_interval = round(interval * ease)
+        ease = min(3.0, ease + 0.1)
+    else:
+        streak = 0
+        new_interval = 1
+        ease = max(1.3, ease - 0.2)
+    return {
+        'srs_interval': new_interval,
+        'srs_ease': round(ease, 2),
+        'srs_due': str(today + timedelta(days=new_interval)),
+        'srs_streak': streak,
+        'srs_last_review': str(today),
+    }
+
+
+def _reference_due_ids(records, today):
+    """改版前 get_due_words + sample_for_review 的到期排序"""
+    today_str = str(today)
+    due = [w for w in records
+           if not w.get('srs_due') or (isinstance(w.get('srs_due'), str) and w['srs_due'] <= today_str)]
+    due.sort(key=lambda w: w.get('srs_due') or '9999-99-99')
+    return [w['id'] for w in due]
+
+
+def self_check(n=2000, seed=0):
+    """隨機單字比對向量化排程 / 到期判斷與舊版逐筆結果，回傳不一致的描述（空 list = 全部相同）"""
+    rng = random.Random(seed)
+    today = date(2026, 3, 1)
+    records = []
+    for i in range(n):
+        due = rng.choice(["", "", "not-a-date", str(today + timedelta(days=rng.randint(-30, 30)))])
+        records.append({
+            "id": f"w{i}",
+            "srs_interval": rng.choice([0, 1, 3, 5, 8, 13, 21, 60]),
+            "srs_ease": rng.choice([1.3, 1.4, 1.5, 1.9, 2.1, 2.3, 2.5, 2.7, 2.9, 3.0]),
+            "srs_streak": rng.randint(0, 6),
+            "srs_due": due,
+            "Correct": rng.randint(0, 5),
+            "Total": rng.randint(5, 10),
+        })
+    answers = [rng.random() < 0.7 for _ in records]
+    problems = []
+
+    table = SrsTable(records)
+    batch = table.schedule_batch([r["id"] for r in records], answers, today=today)
+    for r, ok in zip(records, answers):
+        expected = _reference_update(r, ok, today)
+        for label, got in (("compute_srs_update", compute_srs_update(r, ok, today=today)),
+                           ("schedule_batch", batch[r["id"]])):
+            if got != expected:
+                problems.append(f"{label} {r['id']} ({ok}): {got} != {expected}")
+
+    got_due, expected_due = table.due_ids(today=today), _reference_due_ids(records, today)
+    if got_due != expected_due:
+        problems.append(f"due_ids: {len(got_due)} 筆 vs 舊版 {len(expected_due)} 筆（或順序不同）")
+    count = len(expected_due) // 2
+    if table.sample_for_review(count, today=today) != expected_due[:count]:
+        problems.append("sample_for_review: 到期部分的順序與舊版不同")
+    return problems
+
+
+if __name__ == "__main__":
+    problems = self_check()
+    for p in problems[:20]:
+        print(p)
+    print("✅ 與舊版逐筆 SM-2 結果一致" if not problems else f"❌ {len(problems)} 筆不一致")
+    raise SystemExit(1 if problems else 0)
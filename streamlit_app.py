@@ -2,21 +2,33 @@ import streamlit as st
 import pandas as pd
 import random
 import json
-import requests
 import time
 import hashlib
 import os
 import base64
+import io
 import string
 import re
 from datetime import date, datetime, timedelta, timezone
 from google.cloud import firestore
-from google.oauth2 import service_account
 from streamlit.components.v1 import html
 from streamlit_cookies_controller import CookieController
 from streamlit_sortables import sort_items
-from drill_component import generate_drill_html
-from match_component import generate_match_html
+from drill_component import render_drill
+from match_component import render_match
+from repository import EPOCH, FlashcardRepository, create_client, use_fake_backend
+from vocab_index import VocabIndex
+import srs_engine
+from write_buffer import WriteBehindBuffer
+from vocab_ingest import dedupe_new_words, merge_duplicate_words, normalize_vocab_item
+from image_prep import prepare_image
+from gemini_cache import CachePlan, GeminiCache
+from prompts import OCR_INSTRUCTION, build_registry
+from speech_grading import race
+from audio_preprocess import prepare_for_upload
+from sentence_cache import EMPTY_BOOK, BookMeta, shared_cache
+from gemini_batch import chunked, parse_response, parse_vocab_lines, run_chunks
+import http_client
 
 # --- 新增：嘗試匯入 SpeechRecognition (保留供其他用途，但主功能改用 Gemini Audio) ---
 try:
@@ -61,26 +73,55 @@ INITIAL_SENTENCES = [
 # --- 1. Firestore 初始化 ---
 @st.cache_resource
 def get_db():
+    """建立 Firestore client；設定 USE_FAKE_FIRESTORE 時改用記憶體版（離線壓測用）"""
     try:
-        creds_info = st.secrets["firebase_credentials"]
-        creds = service_account.Credentials.from_service_account_info(creds_info)
-        return firestore.Client(credentials=creds)
+        if use_fake_backend(st.secrets):
+            return create_client(fake=True)
+        return create_client(st.secrets["firebase_credentials"])
     except Exception as e:
         return None
 
 db = get_db()
 cookie_controller = CookieController()
 APP_ID = st.secrets.get("APP_ID", "flashcard-pro-v1")
+repo = FlashcardRepository(db, APP_ID) if db else None
 USER_LIST_PATH = f"artifacts/{APP_ID}/public/data/users"
 SENTENCE_CATALOG_PATH = f"artifacts/{APP_ID}/public/data/sentences"
 SENTENCE_DATA_BASE_PATH = f"artifacts/{APP_ID}/public/data"
 SHARED_VOCAB_CATALOG_PATH = f"artifacts/{APP_ID}/public/data/shared_vocab"
 SHARED_VOCAB_DATA_PATH = f"artifacts/{APP_ID}/public/data/shared_vocab_data"
 
+@st.cache_resource
+def get_prompts():
+    """Prompt 模板登錄（所有 session 共用），檔案或 secrets 改動時自動重新載入"""
+    return build_registry(st.secrets)
+
+@st.cache_resource
+def get_gemini_cache():
+    """單字補全快取（本機 SQLite + Firestore 共享層），所有 session 共用；建立失敗時不使用快取"""
+    try:
+        return GeminiCache(GEMINI_CACHE_PATH, shared=repo)
+    except Exception as e:
+        print(f"[GeminiCache] disabled: {e}")
+        return None
+
 # --- 免費方案限制 ---
 FREE_DAILY_VOCAB_AI_LIMIT = 3   # 單字補全每日上限
 VOCAB_AI_MAX_LINES = 100        # 單字補全每次最多行數
+VOCAB_AI_CHUNK_SIZE = 10        # 單字補全每段行數（各段並行送出）
+VOCAB_AI_WORKERS = 10           # 單字補全同時送出的段數（100 行 = 10 段一次送完）
+OCR_WORKERS = 4                 # 圖片辨識同時送出的頁數
+SPEECH_LATENCY_BUDGET = 20      # 口說判讀最長等待秒數（Gemini 與本地 SR 同時進行）
+SPEECH_FALLBACK_GRACE = 3       # 本地 SR 已比對成功時，最多再等 Gemini 幾秒
+SENTENCE_VERSION_CHECK_INTERVAL = 30  # 句型書版本文件檢查間隔（秒），後台修改最晚這麼久後生效
 FREE_DAILY_DRILL_LIMIT = 30     # 句型口說 AI 判讀每日上限（免費用戶）
+DRILL_PREFETCH = 5              # 句型口說一次預載的題數（同一批內由前端切題，不必 rerun）
+VOCAB_SYNC_INTERVAL = 60        # 單字練習頁增量同步間隔（秒），接收 JS 元件直接寫入的 SRS 變更
+VOCAB_FULL_SYNC_INTERVAL = 600  # 完整重讀間隔（秒）：增量同步看不到刪除，其他裝置刪掉的單字靠這裡對齊
+WRITE_BUFFER_MAX_AGE = 15       # 測驗作答寫入最多延後幾秒送出（超過就在下次 rerun 時 flush）
+# 限制：server 端無法得知分頁被關閉，閒置後 session 結束時不會 flush，
+# 因此最後 WRITE_BUFFER_MAX_AGE 秒內、之後沒有再觸發 rerun 的作答可能遺失（測驗結束 / 切換頁面 / 登出都會立即送出）
+GEMINI_CACHE_PATH = os.path.join(".cache", "gemini_vocab.sqlite3")  # 單字補全本機快取
 
 # --- LINE Bot (Messaging API) ---
 LINE_CHANNEL_ACCESS_TOKEN = st.secrets.get("LINE_CHANNEL_ACCESS_TOKEN", "")
@@ -110,9 +151,13 @@ def confirm_delete_vocab():
         st.session_state.pop("_confirm_delete_ids", None)
         st.rerun()
     if c2.button("確認刪除", type="primary", use_container_width=True):
-        delete_words_from_db(ids)
-        sync_vocab_from_db()
+        bar = st.progress(0.0, text="刪除中...")
+        deleted, errors = delete_words_from_db(
+            ids, progress=lambda done, total: bar.progress(done / total, text=f"刪除中... {done}/{total}"))
         st.session_state.pop("_confirm_delete_ids", None)
+        if errors:
+            st.error(f"已刪除 {deleted} 個單字，{len(ids) - deleted} 個刪除失敗，請稍後再試。")
+            return
         st.rerun()
 
 # --- 2. 工具函式 ---
@@ -122,8 +167,9 @@ def send_line_notify(message):
     if not LINE_CHANNEL_ACCESS_TOKEN or not LINE_TEACHER_USER_ID:
         return False, "LINE Bot 尚未設定。"
     try:
-        resp = requests.post(
+        resp = http_client.post(
             "https://api.line.me/v2/bot/message/push",
+            retries=0,  # push 不是冪等的，重送會收到兩則通知
             headers={
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}",
@@ -296,14 +342,8 @@ def register_new_user(name, password):
     if existing.exists:
         return False, f"名稱「{name}」已被使用，請換一個。"
 
-    # 自動產生學號：S + 3位數字，從現有最大編號遞增
-    existing_users = fetch_users_list()
-    max_num = 0
-    for _, u in existing_users.items():
-        uid = u.get("id", "")
-        if uid.startswith("S") and uid[1:].isdigit() and uid != "S999":
-            max_num = max(max_num, int(uid[1:]))
-    auto_id = f"S{max_num + 1:03d}"
+    # 自動產生學號：S + 3位數字，由計數器文件以交易遞增（不掃描所有使用者）
+    auto_id = repo.next_student_id()
 
     # 隨機顏色
     color = random.choice(RANDOM_COLORS)
@@ -329,9 +369,24 @@ def register_new_user(name, password):
 
 @st.cache_data(ttl=600)
 def fetch_users_list():
-    if not db: return {}
-    docs = db.collection(USER_LIST_PATH).stream()
-    return {d.id: d.to_dict() for d in docs}
+    if not repo: return {}
+    return repo.list_users()
+
+@st.cache_data(ttl=600)
+def fetch_leaderboards():
+    """讀取各題庫的排行榜彙總文件（舊資料的回填由 migrate_leaderboards 在啟動時處理）"""
+    if not repo: return {}
+    return repo.list_leaderboards()
+
+@st.cache_resource
+def migrate_leaderboards():
+    """每個程序啟動時檢查一次：排行榜版本落後就從 sentence_stats 重建（與有沒有人先開排行榜頁無關）"""
+    if not repo: return False
+    try:
+        return repo.ensure_leaderboards()
+    except Exception as e:
+        print(f"[Leaderboard] migration failed: {e}")
+        return False
 
 def init_users_in_db():
     if not db: return
@@ -358,6 +413,20 @@ if "user_info" not in st.session_state:
     st.session_state.user_info = None
 if "u_vocab" not in st.session_state:
     st.session_state.u_vocab = []
+if "vocab_index" not in st.session_state:
+    st.session_state.vocab_index = VocabIndex(st.session_state.u_vocab)
+# 單字增量同步：已完整載入的 uid 與 last_updated 水位
+if "vocab_sync_uid" not in st.session_state:
+    st.session_state.vocab_sync_uid = None
+if "vocab_watermark" not in st.session_state:
+    st.session_state.vocab_watermark = EPOCH
+if "vocab_last_sync" not in st.session_state:
+    st.session_state.vocab_last_sync = 0
+if "vocab_last_full_sync" not in st.session_state:
+    st.session_state.vocab_last_full_sync = 0
+# 測驗作答的 write-behind 緩衝（單字 SRS / Correct / Total 與練習秒數）
+if "write_buffer" not in st.session_state:
+    st.session_state.write_buffer = WriteBehindBuffer(max_age=WRITE_BUFFER_MAX_AGE)
 if "practice_idx" not in st.session_state:
     st.session_state.practice_idx = 0
 if "practice_reveal" not in st.session_state:
@@ -380,16 +449,12 @@ if "nav_selection" not in st.session_state:
 # 句型練習專用 State
 if "sentence_idx" not in st.session_state:
     st.session_state.sentence_idx = 0
-if "completed_options" not in st.session_state:
-    st.session_state.completed_options = set() 
 if "current_sentences" not in st.session_state:
     st.session_state.current_sentences = []
 if "last_sentence_filter_sig" not in st.session_state:
     st.session_state.last_sentence_filter_sig = ""
 if "current_dataset_id" not in st.session_state:
     st.session_state.current_dataset_id = None # 記錄當前正在練習哪個題庫
-if "drill_completion_count" not in st.session_state:
-    st.session_state.drill_completion_count = 0
 # 練習時長追蹤
 if "practice_last_active" not in st.session_state:
     st.session_state.practice_last_active = None
@@ -399,95 +464,166 @@ if "practice_seconds_last_saved" not in st.session_state:
     st.session_state.practice_seconds_last_saved = 0
 
 init_users_in_db()
+migrate_leaderboards()
 
 # --- 4. 資料庫操作函式 (單字 & 句型) ---
 
-def get_vocab_path():
+def get_current_uid():
     if st.session_state.logged_in and st.session_state.user_info:
-        uid = st.session_state.user_info["id"]
-        return f"artifacts/{APP_ID}/users/{uid}/vocabulary"
+        return st.session_state.user_info["id"]
     return None
 
-def get_sentence_progress_path():
-    if st.session_state.logged_in and st.session_state.user_info:
-        uid = st.session_state.user_info["id"]
-        return f"artifacts/{APP_ID}/users/{uid}/sentence_progress"
-    return None
+def get_vocab_path():
+    uid = get_current_uid()
+    return repo.vocab_path(uid) if repo and uid else None
+
+def sync_vocab_from_db(init_if_empty=False, full=False):
+    """同步單字庫到 session。
+    第一次載入（或換使用者、full=True）時完整讀取；之後只讀 last_updated 比水位新的文件，
+    就地合併進 u_vocab（本 session 的新增 / 刪除已由寫入函式直接修補）"""
+    uid = get_current_uid()
+    if not repo or not uid: return
+    st.session_state.vocab_last_sync = time.time()
+
+    if full or st.session_state.vocab_sync_uid != uid:
+        data = repo.list_vocab(uid)
+        if not data and init_if_empty:
+            repo.add_vocab(uid, [normalize_vocab_item(it) for it in INITIAL_VOCAB])
+            time.sleep(1)
+            return sync_vocab_from_db(init_if_empty=False, full=True)
+        st.session_state.vocab_watermark = repo.vocab_watermark(data)
+        _apply_pending_writes(data)
+        st.session_state.u_vocab = data
+        st.session_state.vocab_index = VocabIndex(data)
+        st.session_state.vocab_sync_uid = uid
+        st.session_state.vocab_last_full_sync = time.time()
+        return
 
-def sync_vocab_from_db(init_if_empty=False):
-    path = get_vocab_path()
-    if not db or not path: return
-    docs = db.collection(path).stream()
-    data = []
-    for d in docs:
-        item = d.to_dict()
-        item['id'] = d.id
-        data.append(item)
-    
-    if not data and init_if_empty:
-        for item in INITIAL_VOCAB:
-            db.collection(path).add(item)
-        time.sleep(1)
-        return sync_vocab_from_db(init_if_empty=False)
-        
-    st.session_state.u_vocab = data
-
-def update_word_data(doc_id, update_dict):
-    path = get_vocab_path()
-    if db and path and doc_id:
-        db.collection(path).document(doc_id).update(update_dict)
-        for item in st.session_state.u_vocab:
-            if item.get('id') == doc_id:
-                item.update(update_dict)
-                break
-
-def save_new_words_to_db(items):
-    path = get_vocab_path()
-    if db and path:
-        batch = db.batch()
-        count = 0
-        for it in items:
-            doc_ref = db.collection(path).document()
-            batch.set(doc_ref, it)
-            count += 1
-            if count >= 400:
-                batch.commit()
-                batch = db.batch()
-                count = 0
-        if count > 0:
-            batch.commit()
-
-def delete_words_from_db(doc_ids):
-    path = get_vocab_path()
-    if db and path:
-        for doc_id in doc_ids:
-            db.collection(path).document(doc_id).delete()
+    changed = repo.list_vocab_since(uid, st.session_state.vocab_watermark)
+    if not changed:
+        return
+    st.session_state.vocab_watermark = repo.vocab_watermark(changed, st.session_state.vocab_watermark)
+    _apply_pending_writes(changed)
+    index = st.session_state.vocab_index
+    for item in changed:
+        if index.get(item['id']) is not None:
+            index.update(item['id'], item)
+        else:
+            st.session_state.u_vocab.append(item)
+            index.add(item)
+
+def _apply_pending_writes(records):
+    """從雲端讀回的記錄再疊上緩衝區尚未送出的作答結果，避免同步把本地較新的 SRS 蓋掉"""
+    buffer = st.session_state.write_buffer
+    if not len(buffer): return
+    for item in records:
+        pending = buffer.pending_vocab(item.get('id'))
+        if pending:
+            item.update(pending)
+
+def maybe_sync_vocab():
+    """距離上次同步超過 VOCAB_SYNC_INTERVAL 才做增量同步；超過 VOCAB_FULL_SYNC_INTERVAL 改為完整重讀（對齊刪除）"""
+    now = time.time()
+    if now - st.session_state.get("vocab_last_full_sync", 0) >= VOCAB_FULL_SYNC_INTERVAL:
+        sync_vocab_from_db(full=True)
+    elif now - st.session_state.get("vocab_last_sync", 0) >= VOCAB_SYNC_INTERVAL:
+        sync_vocab_from_db()
+
+def reset_vocab_sync():
+    st.session_state.u_vocab = []
+    st.session_state.vocab_index = VocabIndex()
+    st.session_state.vocab_sync_uid = None
+    st.session_state.vocab_watermark = EPOCH
+    st.session_state.vocab_last_sync = 0
+    st.session_state.vocab_last_full_sync = 0
+
+def update_word_data(doc_id, update_dict, defer=False):
+    """更新單字。defer=True 時只更新本地並排入寫入緩衝（測驗作答用），由 flush_pending_writes 批次送出"""
+    uid = get_current_uid()
+    if repo and uid and doc_id:
+        buffer = st.session_state.write_buffer
+        if defer:
+            buffer.queue_vocab(doc_id, update_dict)
+        else:
+            # 同一個字還有排隊中的更新就合併成一次寫入
+            repo.update_vocab(uid, doc_id, {**(buffer.pop_vocab(doc_id) or {}), **update_dict})
+        st.session_state.vocab_index.update(doc_id, update_dict)
+
+def flush_pending_writes(force=True):
+    """送出寫入緩衝。force=False 時只在排隊超過 WRITE_BUFFER_MAX_AGE 秒才送；失敗保留待下次重試"""
+    buffer = st.session_state.write_buffer
+    if not len(buffer) or not repo: return True
+    if not force and not buffer.is_due(): return True
+    uid = get_current_uid()
+    user_name = st.session_state.get("current_user_name")
+    if not uid or not user_name: return False
+    ok = buffer.flush(repo, uid, user_name)
+    if not ok:
+        log_error(f"flush_pending_writes (attempt {buffer.failures})", buffer.last_error, critical=buffer.failures >= 3)
+    return ok
+
+def save_new_words_to_db(items, course=None, day=None):
+    """單字匯入管線（AI 補全 / OCR / CSV / 公用單字集共用）：
+    欄位正規化 → 排除單字庫已有與本批重複的字 → 並行 WriteBatch 寫入 → 直接補進 session（不重新讀取）
+    回傳 (寫入數, 略過數, 失敗數)"""
+    uid = get_current_uid()
+    if not repo or not uid: return 0, 0, 0
+    index = st.session_state.vocab_index
+    new_items, skipped = dedupe_new_words([normalize_vocab_item(it, course, day) for it in items], index)
+    ids, errors = repo.add_vocab(uid, new_items)
+    for e in errors:
+        log_error("save_new_words_to_db", e)
+    saved = 0
+    for it, doc_id in zip(new_items, ids):
+        if doc_id is None: continue
+        record = {**it, 'id': doc_id}
+        st.session_state.u_vocab.append(record)
+        index.add(record)
+        saved += 1
+    return saved, skipped, len(new_items) - saved
+
+def toast_save_result(saved, skipped, failed):
+    msg = f"✅ 已儲存 {saved} 個單字"
+    if skipped:
+        msg += f"（{skipped} 個已存在或重複，已略過）"
+    st.toast(msg)
+    if failed:
+        st.toast(f"⚠️ {failed} 個單字儲存失敗，請稍後再試")
+
+def delete_words_from_db(doc_ids, progress=None):
+    """批次刪除單字（並行 WriteBatch），只從 session 移除確實刪除成功的單字。回傳 (刪除數, 錯誤列表)"""
+    uid = get_current_uid()
+    if not repo or not uid: return 0, []
+    deleted, errors = repo.delete_vocab(uid, list(doc_ids), progress=progress)
+    for e in errors:
+        log_error("delete_words_from_db", e)
+    if deleted:
+        removed = set(deleted)
+        for doc_id in removed:
+            st.session_state.vocab_index.remove(doc_id)
+            st.session_state.write_buffer.pop_vocab(doc_id)
+        st.session_state.u_vocab = [w for w in st.session_state.u_vocab if w.get('id') not in removed]
+    return len(deleted), errors
 
 # --- 句型資料庫操作 ---
 
-@st.cache_data(ttl=600)
 def fetch_sentence_catalogs():
-    """讀取公用題庫列表，回傳 {id: {name, is_premium}}"""
-    if not db: return {}
-    docs = db.collection(SENTENCE_CATALOG_PATH).stream()
-    result = {}
-    for d in docs:
-        data = d.to_dict()
-        result[d.id] = {
-            "name": data.get("name", d.id),
-            "is_premium": data.get("is_premium", False),
-        }
-    return result
+    """讀取公用題庫列表，回傳 {id: {name, is_premium}}（共用快取，版本文件變更時才重讀）"""
+    if not repo: return {}
+    return {
+        cid: {"name": data.get("name", cid), "is_premium": data.get("is_premium", False)}
+        for cid, data in shared_cache(repo, SENTENCE_VERSION_CHECK_INTERVAL).catalogs().items()
+    }
 
-@st.cache_data(ttl=600)
 def fetch_sentences_by_id(dataset_id):
-    """讀取特定題庫的句型，並依照 Order 排序"""
-    if not db: return []
-    path = f"{SENTENCE_DATA_BASE_PATH}/{dataset_id}"
-    docs = db.collection(path).stream()
-    data = [d.to_dict() for d in docs]
-    sorted_data = sorted(data, key=lambda x: x.get('Order', 9999))
-    return sorted_data
+    """讀取特定題庫的句型（依照 Order 排序）；所有 session 共用同一份，不可修改"""
+    if not repo or not dataset_id: return []
+    return shared_cache(repo, SENTENCE_VERSION_CHECK_INTERVAL).sentences(dataset_id)
+
+def fetch_book_meta(dataset_id):
+    """題庫的 BookMeta（分類、各分類句型、template hash），載入時算好，選單與進度直接查"""
+    if not repo or not dataset_id: return EMPTY_BOOK
+    return shared_cache(repo, SENTENCE_VERSION_CHECK_INTERVAL).book(dataset_id)
 
 @st.cache_data(ttl=600)
 def fetch_shared_vocab_catalogs():
@@ -520,14 +656,39 @@ def get_star_display(count):
     if count >= 1: return "⭐"
     return ""
 
-def load_user_sentence_progress(template_hash):
-    path = get_sentence_progress_path()
-    if not db or not path: return set(), 0
-    doc = db.collection(path).document(template_hash).get()
-    if doc.exists:
-        data = doc.to_dict()
-        return set(data.get("completed_options", [])), int(data.get("completion_count", 0))
-    return set(), 0
+def load_drill_window(sentences, hashes, start, size=DRILL_PREFETCH):
+    """從 start 起預載 size 題（循環）與各題進度（一次批次讀取），給句型口說元件在前端切題"""
+    n = len(sentences)
+    indices = [(start + i) % n for i in range(min(size, n))]
+    uid = get_current_uid()
+    progress = repo.get_sentence_progress_many(uid, [hashes[i] for i in indices]) if repo and uid else {}
+    items = []
+    for i in indices:
+        p = progress.get(hashes[i]) or {}
+        items.append({
+            "index": i,
+            "template": sentences[i]["Template"],
+            "options": sentences[i]["Options"],
+            "template_hash": hashes[i],
+            "category": sentences[i].get("Category", "一般"),
+            "completion_count": int(p.get("completion_count", 0) or 0),
+            "completed_options": list(p.get("completed_options") or []),
+        })
+    return items
+
+def overlay_drill_progress(items, local):
+    """把前端回報的本機進度（{template_hash: {completionCount, completedOptions}}）疊到剛讀到的進度上：
+    寫入佇列還沒送達時 Firestore 讀到的是舊值，輪數取較大者，同一輪的已完成選項取聯集"""
+    for it in items:
+        p = local.get(it["template_hash"])
+        if not p: continue
+        count = int(p.get("completionCount", 0) or 0)
+        done = list(p.get("completedOptions") or [])
+        if count > it["completion_count"]:
+            it["completion_count"], it["completed_options"] = count, done
+        elif count == it["completion_count"]:
+            it["completed_options"] += [o for o in done if o not in it["completed_options"]]
+    return items
 
 def fetch_all_user_sentence_progress():
     """讀取使用者的所有句型進度。同一次 rerun 只從 Firestore 讀一次"""
@@ -535,146 +696,44 @@ def fetch_all_user_sentence_progress():
     cache_key = "_sentence_progress_cache"
     if cache_key in st.session_state:
         return st.session_state[cache_key]
-    path = get_sentence_progress_path()
-    if not db or not path: return {}
-    docs = db.collection(path).stream()
+    uid = get_current_uid()
+    if not repo or not uid: return {}
     result = {}
-    for d in docs:
-        data = d.to_dict()
-        result[d.id] = {
+    for doc_id, data in repo.list_sentence_progress(uid).items():
+        result[doc_id] = {
             "completed_options": data.get("completed_options", []),
             "completion_count": int(data.get("completion_count", 0)),
         }
     st.session_state[cache_key] = result
     return result
 
-# --- 新增：更新使用者統計摘要 ---
-def update_user_stats_summary(dataset_id):
-    """計算並更新使用者的該題庫統計資訊"""
-    if not db or not dataset_id: return
-    user_name = st.session_state.get("current_user_name")
-    if not user_name: return
-
-    # 1. 取得題庫資訊 (利用快取)
-    sentences = fetch_sentences_by_id(dataset_id)
-    catalogs = fetch_sentence_catalogs()
-    cat_info = catalogs.get(dataset_id)
-    dataset_name = cat_info["name"] if cat_info else dataset_id
-
-    total_count = len(sentences)
-    if total_count == 0: return
-
-    # 2. 取得使用者在該題庫的所有進度
-    # 這裡直接查詢 Firestore，因為需要最新數據
-    progress_path = get_sentence_progress_path()
-    docs = db.collection(progress_path).where("dataset_id", "==", dataset_id).stream()
-    
-    progress_map = {}
-    for d in docs:
-        data = d.to_dict()
-        progress_map[d.id] = set(data.get("completed_options", []))
-        
-    completed_count = 0
-    in_progress_count = 0
-    
-    for s in sentences:
-        tid = hash_string(s['Template'])
-        user_done = progress_map.get(tid, set())
-        all_opts = set(s.get('Options', []))
-        
-        if not all_opts: continue
-        
-        if user_done:
-            if all_opts.issubset(user_done):
-                completed_count += 1
-            else:
-                in_progress_count += 1
-    
-    # 3. 更新使用者文件
-    # 結構: sentence_stats: { dataset_id: { ... } }
-    user_ref = db.collection(USER_LIST_PATH).document(user_name)
-    stats_data = {
-        f"sentence_stats.{dataset_id}": {
-            "name": dataset_name,
-            "total": total_count,
-            "completed": completed_count,
-            "in_progress": in_progress_count,
-            "last_active": firestore.SERVER_TIMESTAMP
-        }
-    }
-    user_ref.update(stats_data)
-    # 清除快取，確保排行榜更新
-    fetch_users_list.clear()
-
-def save_user_sentence_progress(template_str, completed_list, dataset_id=None, increment_count=False, round_data=None):
-    """儲存使用者對某句型的練習進度，並標記來源題庫 ID"""
-    path = get_sentence_progress_path()
-    if not db or not path: return
-    template_hash = hash_string(template_str)
-    data = {
-        "template_text": template_str,
-        "completed_options": list(completed_list),
-        "last_updated": firestore.SERVER_TIMESTAMP
-    }
-    if dataset_id:
-        data["dataset_id"] = dataset_id
-    if increment_count:
-        data["completion_count"] = firestore.Increment(1)
-
-    # 追加 round 資料到 rounds 陣列
-    if round_data:
-        data["rounds"] = firestore.ArrayUnion([round_data])
-
-    db.collection(path).document(template_hash).set(data, merge=True)
-
-    if dataset_id:
-        update_user_stats_summary(dataset_id)
-
 def clear_user_sentence_history(target_dataset_id=None):
     """
     清除該使用者所有的句型練習紀錄。
     如果指定了 target_dataset_id，只清除該題庫的紀錄。
     """
-    path = get_sentence_progress_path()
-    if not db or not path: return 0
+    uid = get_current_uid()
+    if not repo or not uid: return 0
 
-    # 批次刪除 sentence_progress
-    docs = db.collection(path).stream()
-    batch = db.batch()
-    count = 0
-    deleted_count = 0
-
-    for d in docs:
-        doc_data = d.to_dict()
-        # 如果指定了題庫ID，且該記錄不屬於此題庫，則跳過
-        if target_dataset_id and doc_data.get("dataset_id") != target_dataset_id:
-            continue
-
-        batch.delete(d.reference)
-        count += 1
-        deleted_count += 1
-        if count >= 400:
-            batch.commit()
-            batch = db.batch()
-            count = 0
-    if count > 0:
-        batch.commit()
+    # 批次刪除 sentence_progress（指定題庫ID 時只刪該題庫）
+    deleted_count = repo.delete_sentence_progress(uid, dataset_id=target_dataset_id)
 
     # 清除 users 文件中的 sentence_stats
     user_name = st.session_state.get("current_user_name")
     if user_name:
-        user_ref = db.collection(USER_LIST_PATH).document(user_name)
         if target_dataset_id:
             # 只刪除特定題庫的統計
-            user_ref.update({
+            repo.update_user(user_name, {
                 f"sentence_stats.{target_dataset_id}": firestore.DELETE_FIELD
             })
         else:
             # 刪除所有 sentence_stats
-            user_ref.update({
+            repo.update_user(user_name, {
                 "sentence_stats": firestore.DELETE_FIELD
             })
+        repo.remove_leaderboard_entry(user_name, target_dataset_id)
         fetch_users_list.clear()  # 清除快取
+        fetch_leaderboards.clear()
 
     return deleted_count
 
@@ -689,41 +748,11 @@ def check_audio_batch(audio_file, template, options_list):
     """
     批次語音檢查：
     1. 優先使用 Gemini (多模態) 處理音訊 + 轉錄 + 判斷。
-    2. 如果 Gemini 沒抓到任何選項 (correct_options 為空) 或失敗，才使用 SpeechRecognition (SR) 做 Fallback。
+    2. SpeechRecognition (SR) 同時在背景執行；Gemini 沒抓到任何選項 (correct_options 為空) 或失敗時改用 SR 的結果。
+    3. 整體最多等 SPEECH_LATENCY_BUDGET 秒。
     """
-    # --- 準備：讀取 Prompt 檔案 ---
-    prompt_file = "pronunciation_feedback_prompt.md"
-    base_prompt = ""
-    if os.path.exists(prompt_file):
-        with open(prompt_file, "r", encoding="utf-8") as f:
-            base_prompt = f.read()
-        print(f"[Gemini Speech] Prompt loaded from file, length={len(base_prompt)}, contains 'intended': {'intended' in base_prompt}")
-    else:
-        print(f"[Gemini Speech] WARNING: prompt file not found at '{prompt_file}', cwd={os.getcwd()}")
-
-        # Fallback prompt if file is missing
-        base_prompt = """
-        Context: English pronunciation practice for non-native speakers.
-        Template Sentence: "{template}"
-        Target Vocabulary to fill in the blank: {options_list}
-        
-        Task:
-        1. Listen to the audio provided.
-        2. Transcribe it exactly as heard.
-        3. Identify which of the 'Target Vocabulary' appear in the speech within the sentence structure.
-        4. Be flexible with minor pronunciation errors, but key words must be recognizable.
-        5. Provide specific, constructive feedback in Traditional Chinese.
-
-        Return JSON: 
-        {{ 
-            "transcript": "Transcription of the audio",
-            "correct_options": ["opt1", "opt2"], 
-            "feedback": "Specific feedback here" 
-        }}
-        """
-
-    # 填入 Prompt 變數
-    prompt = base_prompt.format(
+    # --- 準備：Prompt（registry 只在檔案改動時重新讀取） ---
+    prompt = get_prompts().get("pronunciation").format(
         template=template,
         options_list=options_list
     )
@@ -731,7 +760,6 @@ def check_audio_batch(audio_file, template, options_list):
     # 讀取音訊 Bytes 並自動偵測格式
     audio_file.seek(0)
     audio_bytes = audio_file.read()
-    encoded_audio = base64.b64encode(audio_bytes).decode('utf-8')
 
     # 根據檔頭判斷 MIME type
     if audio_bytes[:4] == b'RIFF':
@@ -741,12 +769,14 @@ def check_audio_batch(audio_file, template, options_list):
     else:
         audio_mime = "audio/webm"  # 瀏覽器 MediaRecorder 預設格式
 
-    # --- 嘗試 1：Gemini 多模態 (音訊直接輸入) ---
-    ai_corrects = []
-    ai_transcript = ""
-    ai_feedback = ""
-    gemini_success = False
+    # 去頭尾靜音、轉 16 kHz 單聲道再上傳（無法解碼的格式原樣送出）
+    prepared = prepare_for_upload(audio_bytes, audio_mime)
+    print(f"[Gemini Speech] {prepared}")
+    audio_mime = prepared.mime
+    encoded_audio = base64.b64encode(prepared.data).decode('utf-8')
+    sr_audio = prepared.wav or audio_bytes
 
+    # --- Gemini 多模態（主要）與本地 SR + 字串比對（備援）同時開始，見 speech_grading.race ---
     gemini_payload = {
         "contents": [{
             "parts": [
@@ -757,107 +787,102 @@ def check_audio_batch(audio_file, template, options_list):
         "generationConfig": {"responseMimeType": "application/json", "thinkingConfig": {"thinkingBudget": 0}}
     }
 
-    token_count = 0
-    try:
+    deadline = time.monotonic() + SPEECH_LATENCY_BUDGET
+
+    def ask_gemini():
+        # 背景執行緒：不碰 st.*，token 回傳後在主執行緒記錄
+        # 不重試、逾時設為剩餘時間：race 放棄後執行緒也跟著結束，不會再花一次 Gemini 請求
+        remaining = deadline - time.monotonic()
+        if remaining <= 0: return None
         print(f"[Gemini Speech] Calling API... model={GEMINI_MODEL}")
-        res = requests.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", json=gemini_payload, headers=GEMINI_HEADERS, timeout=30)
+        res = http_client.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", json=gemini_payload, headers=GEMINI_HEADERS,
+                               timeout=remaining, retries=0)
         print(f"[Gemini Speech] API status={res.status_code}")
         if res.status_code != 200:
             print(f"[Gemini Speech] API error body: {res.text[:500]}")
-        if res.status_code == 200:
-            res_json = res.json()
-            content_text = res_json['candidates'][0]['content']['parts'][0]['text']
-
-            # 提取 token 使用量
-            usage = res_json.get("usageMetadata", {})
-            token_count = usage.get("totalTokenCount", 0)
-
-            # 清理 JSON 字串
-            if "```json" in content_text:
-                content_text = content_text.split("```json")[1].split("```")[0]
-            elif "```" in content_text:
-                content_text = content_text.split("```")[1].split("```")[0]
-
-            ai_result = json.loads(content_text.strip())
-            print(f"[Gemini Speech] raw response: {ai_result}")  # debug log
-
-            ai_transcript = ai_result.get("transcript", "")
-            ai_feedback = ai_result.get("feedback", "加油！")
-
-            # 處理大小寫
-            raw_ai_found = ai_result.get("correct_options", [])
-            options_lower_map = {opt.lower(): opt for opt in options_list}
-            for raw_opt in raw_ai_found:
-                if raw_opt in options_list:
-                    ai_corrects.append(raw_opt)
-                elif raw_opt.lower() in options_lower_map:
-                    ai_corrects.append(options_lower_map[raw_opt.lower()])
-
-            gemini_success = True
+            return None
+        res_json = res.json()
+        content_text = res_json['candidates'][0]['content']['parts'][0]['text']
+        token_count = res_json.get("usageMetadata", {}).get("totalTokenCount", 0)
+
+        # 清理 JSON 字串
+        if "```json" in content_text:
+            content_text = content_text.split("```json")[1].split("```")[0]
+        elif "```" in content_text:
+            content_text = content_text.split("```")[1].split("```")[0]
+
+        ai_result = json.loads(content_text.strip())
+        print(f"[Gemini Speech] raw response: {ai_result}")  # debug log
+
+        # 處理大小寫
+        corrects = []
+        options_lower_map = {opt.lower(): opt for opt in options_list}
+        for raw_opt in ai_result.get("correct_options", []):
+            if raw_opt in options_list:
+                corrects.append(raw_opt)
+            elif raw_opt.lower() in options_lower_map:
+                corrects.append(options_lower_map[raw_opt.lower()])
+        return {"corrects": corrects, "transcript": ai_result.get("transcript", ""),
+                "feedback": ai_result.get("feedback", "加油！"), "tokens": token_count}
+
+    def local_sr():
+        # 背景執行緒：用自己的 BytesIO，不和主執行緒共用檔案指標
+        recognizer = sr.Recognizer()
+        try:
+            with sr.AudioFile(io.BytesIO(sr_audio)) as source:
+                audio_data = recognizer.record(source)
+            transcript = recognizer.recognize_google(audio_data, language="en-US")
+        except Exception:
+            return "", []  # SR 失敗就維持空字串
+        norm_transcript = normalize_text(transcript)
+        found = [opt for opt in options_list
+                 if transcript and normalize_text(template.replace("___", opt)) in norm_transcript]
+        return transcript, found
 
-    except Exception as e:
-        print(f"[Gemini Speech] Error: {e}")
-        import traceback; traceback.print_exc()
+    gemini, local = race(ask_gemini, local_sr if sr else None,
+                         budget=max(0.0, deadline - time.monotonic()), grace=SPEECH_FALLBACK_GRACE,
+                         primary_ok=lambda r: bool(r and r["corrects"]),
+                         fallback_ok=lambda r: bool(r and r[1]))
 
-    # 不管成功與否，只要有 token 就記錄
-    if token_count > 0:
-        record_ai_usage("speech", token_count)
+    # 不管有沒有抓到選項，只要有 token 就記錄
+    if gemini and gemini["tokens"] > 0:
+        record_ai_usage("speech", gemini["tokens"])
 
     # 如果 Gemini 成功且有抓到東西，直接回傳
-    if gemini_success and ai_corrects:
+    if gemini and gemini["corrects"]:
         return {
-            "correct_options": ai_corrects,
-            "heard": ai_transcript,
-            "feedback": ai_feedback
+            "correct_options": gemini["corrects"],
+            "heard": gemini["transcript"],
+            "feedback": gemini["feedback"]
         }
 
-    # --- 嘗試 2：Fallback (本地 SR + 字串比對) ---
-    # 當 Gemini 沒抓到 (ai_corrects 為空) 或 連線失敗 時執行
-    
-    # 確保有安裝 SR
-    if sr:
-        audio_file.seek(0) # 重置指針
-        recognizer = sr.Recognizer()
-        local_transcript = ""
-        try:
-            with sr.AudioFile(audio_file) as source:
-                audio_data = recognizer.record(source)
-            local_transcript = recognizer.recognize_google(audio_data, language="en-US")
-        except:
-            pass # SR 失敗就維持空字串
-
-        if local_transcript:
-            local_found = []
-            norm_transcript = normalize_text(local_transcript)
-            for opt in options_list:
-                target_sent = template.replace("___", opt)
-                norm_target = normalize_text(target_sent)
-                if norm_target in norm_transcript:
-                    local_found.append(opt)
-            
-            # 如果本地比對有抓到，就使用本地結果
-            if local_found:
-                return {
-                    "correct_options": local_found,
-                    "heard": local_transcript,
-                    "feedback": "AI 未偵測到，但本地規則比對成功！(Fallback)"
-                }
-            
-            # 如果本地也沒抓到，但 Gemini 有回傳 transcript，優先顯示 Gemini 的聽寫結果
-            if gemini_success:
-                 return {
-                    "correct_options": [],
-                    "heard": ai_transcript,
-                    "feedback": ai_feedback
-                }
-            
-            # 只有 SR 成功，Gemini 失敗的情況
+    ai_transcript = gemini["transcript"] if gemini else ""
+    ai_feedback = gemini["feedback"] if gemini else ""
+    local_transcript, local_found = local or ("", [])
+    if local_transcript:
+        # 如果本地比對有抓到，就使用本地結果
+        if local_found:
             return {
-                "correct_options": [],
+                "correct_options": local_found,
                 "heard": local_transcript,
-                "feedback": "未能辨識出正確句子，請再試一次。"
+                "feedback": "AI 未偵測到，但本地規則比對成功！(Fallback)"
             }
-    
+
+        # 如果本地也沒抓到，但 Gemini 有回傳 transcript，優先顯示 Gemini 的聽寫結果
+        if gemini:
+            return {
+                "correct_options": [],
+                "heard": ai_transcript,
+                "feedback": ai_feedback
+            }
+
+        # 只有 SR 成功，Gemini 失敗的情況
+        return {
+            "correct_options": [],
+            "heard": local_transcript,
+            "feedback": "未能辨識出正確句子，請再試一次。"
+        }
+
     # 全部失敗
     return {
         "correct_options": [],
@@ -865,260 +890,153 @@ def check_audio_batch(audio_file, template, options_list):
         "feedback": ai_feedback if ai_feedback else "系統忙碌或無法辨識。"
     }
 
-def call_gemini_to_complete(words_text, course_name, course_date):
+def _vocab_rows(words, course_name, course_date):
+    """AI 補全 / OCR 結果補上課程、日期與練習欄位預設值"""
+    return [{**w, "Course": course_name, "Date": str(course_date), "Correct": 0, "Total": 0,
+             "srs_interval": 0, "srs_ease": 2.5, "srs_due": "", "srs_streak": 0, "srs_last_review": ""}
+            for w in words]
+
+def gemini_generate(parts, timeout=30):
+    """送出一次 generateContent，回傳 (文字, token 數)，非 200 丟出例外。
+    429 / 5xx / 逾時由 http_client 重試；不碰 st.*，可在背景執行緒呼叫"""
+    payload = {"contents": [{"parts": parts}], "generationConfig": {"thinkingConfig": {"thinkingBudget": 0}}}
+    res = http_client.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", json=payload, headers=GEMINI_HEADERS, timeout=timeout)
+    if res.status_code != 200:
+        raise RuntimeError(f"HTTP {res.status_code}: {res.text[:200]}")
+    return parse_response(res.json())
+
+def call_gemini_to_complete(words_text, course_name, course_date, on_partial=None):
+    """單字補全：快取沒命中的行每 VOCAB_AI_CHUNK_SIZE 行一段並行送出，依輸入順序合併。
+    on_partial(目前結果) 在每段完成時呼叫（串流預覽）；部分段失敗時保留成功的結果"""
     if not words_text.strip(): return []
     
-    # --- 修改點：讀取外部 MD 檔案 ---
-    prompt_file = "system_prompt.md"
-    if st.secrets.get("system_prompt"):
-        base_prompt = st.secrets["system_prompt"]
-    elif os.path.exists(prompt_file):
-        with open(prompt_file, "r", encoding="utf-8") as f:
-            base_prompt = f.read()
-    else:
-        # 備用 Prompt，防止檔案遺失導致程式崩潰
-        base_prompt = """
-You are a vocabulary organizing assistant.
-Requirements:
-1. Identify the main English word each line.
-2. If a line includes definitions or example sentences, CORRECT them if there are errors.
-3. If definitions (Chinese_1, Chinese_2), POS, or example sentences are MISSING, provide them.
-4. Ensure the Part of Speech (POS) in Traditional Chinese (e.g., 名詞, 動詞, 形容詞).
-5. Ensure the (Chinese_1, Chinese_2) in Traditional Chinese.
-6. Ensure the (Word, Example) in English.
-7. Output format MUST be strictly separated by a pipe symbol (|) for each line.
-8. Format: Word | POS | Chinese_1 | Chinese_2 | Example
-9. Do not output any header or markdown symbols, just the raw data lines.
-        """
-    
-    prompt = f"{base_prompt}\n\nInput words:\n{words_text}"
+    vocab_prompt = get_prompts().get("vocab")
+    base_prompt = vocab_prompt.text
 
-    payload = {"contents": [{"parts": [{"text": prompt}]}], "generationConfig": {"thinkingConfig": {"thinkingBudget": 0}}}
-    try:
-        res = requests.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", json=payload, headers=GEMINI_HEADERS, timeout=30)
-        if res.status_code == 200:
-            res_json = res.json()
-            text = res_json['candidates'][0]['content']['parts'][0]['text']
-
-            # 記錄 token 使用量
-            usage = res_json.get("usageMetadata", {})
-            token_count = usage.get("totalTokenCount", 0)
-            if token_count > 0:
-                record_ai_usage("vocab", token_count)
-
-            raw_items = []
-            for line in text.strip().split('\n'):
-                if '|' in line:
-                    p = [i.strip() for i in line.split('|')]
-                    if len(p) >= 5:
-                        raw_items.append({
-                            "English": p[0], "POS": p[1], "Chinese_1": p[2], "Chinese_2": p[3],
-                            "Example": p[4], "Course": course_name, "Date": str(course_date),
-                            "Correct": 0, "Total": 0,
-                            "srs_interval": 0, "srs_ease": 2.5, "srs_due": "", "srs_streak": 0, "srs_last_review": ""
-                        })
-            return raw_items
-    except Exception as e:
-        log_error("call_gemini_to_complete", e, critical=True)
-    return []
+    lines = [l.strip() for l in words_text.strip().split('\n') if l.strip()]
+    cache = get_gemini_cache()
+    plan = None
+    if cache:
+        try:
+            plan = cache.plan(lines, vocab_prompt.version)
+        except Exception as e:
+            # 快取查詢失敗（SQLite 損毀、磁碟滿等）就當作全部沒命中，照常送 Gemini
+            log_error("gemini_cache.plan", e)
+            cache = None
+    if plan is None:
+        plan = CachePlan.uncached(lines, vocab_prompt.version)
+    chunks = chunked(plan.miss_lines, VOCAB_AI_CHUNK_SIZE)
+
+    def pending_rows(finished):
+        # 沒有結果的段（失敗或尚未完成）所涵蓋的行號，合併時保持空缺
+        return [row for i, chunk in enumerate(chunks) if not finished[i]
+                for row in plan.miss_rows[i * VOCAB_AI_CHUNK_SIZE:i * VOCAB_AI_CHUNK_SIZE + len(chunk)]]
+
+    def complete(chunk):
+        # 在背景執行緒執行：只做 HTTP 與解析
+        text, tokens = gemini_generate([{"text": f"{base_prompt}\n\nInput words:\n" + "\n".join(chunk)}], timeout=30)
+        return parse_vocab_lines(text), tokens
+
+    done = [None] * len(chunks)
+
+    def collect(i, result):
+        # 每段完成時在主執行緒更新預覽（快取命中 + 已完成的段）
+        done[i] = result
+        if on_partial:
+            partial = [w for r in done if r for w in r[0]]
+            on_partial(_vocab_rows(plan.merge(partial, pending_rows(done)), course_name, course_date))
+
+    results, errors = run_chunks(chunks, complete, workers=VOCAB_AI_WORKERS, on_result=collect)
+
+    fetched = [w for r in results if r for w in r[0]]
+    token_count = sum(r[1] for r in results if r)
+    if token_count > 0:
+        record_ai_usage("vocab", token_count)
+    if errors:
+        log_error("call_gemini_to_complete", errors[0][1], critical=True)
+        failed = sum(len(chunks[i]) for i, _ in errors)
+        st.warning(f"⚠️ {failed} 行補全失敗（已保留其餘結果），可將缺少的單字重新送出。")
+    if cache and fetched:
+        try:
+            cache.store(plan, fetched)
+        except Exception as e:
+            log_error("gemini_cache.store", e)
+
+    if plan.hits:
+        st.toast(f"⚡ {len(plan.hits)} 個單字取自快取，未重新呼叫 AI")
+    return _vocab_rows(plan.merge(fetched, pending_rows(results)), course_name, course_date)
 
 def call_gemini_ocr(image_files, course_name, course_date):
     """從課本圖片中辨識英文單字，回傳結構化單字列表"""
     if not image_files: return []
 
-    # 讀取基礎 prompt（與 call_gemini_to_complete 相同）
-    prompt_file = "system_prompt.md"
-    if st.secrets.get("system_prompt"):
-        base_prompt = st.secrets["system_prompt"]
-    elif os.path.exists(prompt_file):
-        with open(prompt_file, "r", encoding="utf-8") as f:
-            base_prompt = f.read()
-    else:
-        base_prompt = """
-You are a vocabulary organizing assistant.
-Requirements:
-1. Identify the main English word each line.
-2. If a line includes definitions or example sentences, CORRECT them if there are errors.
-3. If definitions (Chinese_1, Chinese_2), POS, or example sentences are MISSING, provide them.
-4. Ensure the Part of Speech (POS) in Traditional Chinese (e.g., 名詞, 動詞, 形容詞).
-5. Ensure the (Chinese_1, Chinese_2) in Traditional Chinese.
-6. Ensure the (Word, Example) in English.
-7. Output format MUST be strictly separated by a pipe symbol (|) for each line.
-8. Format: Word | POS | Chinese_1 | Chinese_2 | Example
-9. Do not output any header or markdown symbols, just the raw data lines.
-        """
-
-    ocr_instruction = """Look at the textbook page image(s) provided.
-Extract ALL English vocabulary words visible on the page.
-For each word, provide the information in the format below.
-If the image shows Chinese translations, POS, or example sentences, include them.
-If any information is missing from the image, provide it yourself.
-Ignore page numbers, headers, footers, and non-vocabulary content.
-If no English vocabulary words are found in the image, return an empty response.
-
-"""
-    prompt = ocr_instruction + base_prompt
-
-    # 組裝 multimodal payload
-    parts = [{"text": prompt}]
+    prompt = OCR_INSTRUCTION + get_prompts().get("vocab").text
+
+    # 每張圖先縮小重壓（主執行緒讀檔，背景執行緒只處理 bytes）
+    pages = []
     for img_file in image_files:
         img_file.seek(0)
-        img_bytes = img_file.read()
-        encoded_image = base64.b64encode(img_bytes).decode('utf-8')
-        fname = img_file.name.lower() if hasattr(img_file, 'name') else ""
-        if fname.endswith('.png'):
-            mime = "image/png"
-        elif fname.endswith('.webp'):
-            mime = "image/webp"
-        else:
-            mime = "image/jpeg"
-        parts.append({"inline_data": {"mime_type": mime, "data": encoded_image}})
-
-    payload = {"contents": [{"parts": parts}], "generationConfig": {"thinkingConfig": {"thinkingBudget": 0}}}
-    try:
-        res = requests.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", json=payload, headers=GEMINI_HEADERS, timeout=60)
-        if res.status_code == 200:
-            res_json = res.json()
-            text = res_json['candidates'][0]['content']['parts'][0]['text']
-            usage = res_json.get("usageMetadata", {})
-            token_count = usage.get("totalTokenCount", 0)
-            if token_count > 0:
-                record_ai_usage("vocab", token_count)
-            raw_items = []
-            for line in text.strip().split('\n'):
-                if '|' in line:
-                    p = [i.strip() for i in line.split('|')]
-                    if len(p) >= 5:
-                        raw_items.append({
-                            "English": p[0], "POS": p[1], "Chinese_1": p[2], "Chinese_2": p[3],
-                            "Example": p[4], "Course": course_name, "Date": str(course_date),
-                            "Correct": 0, "Total": 0,
-                            "srs_interval": 0, "srs_ease": 2.5, "srs_due": "", "srs_streak": 0, "srs_last_review": ""
-                        })
-            return raw_items
-    except Exception as e:
-        log_error("call_gemini_ocr", e, critical=True)
-    return []
-
-def get_combined_dashboard_options(vocab, catalogs):
+        pages.append((img_file.read(), getattr(img_file, 'name', "")))
+
+    def recognize(page):
+        data, name = page
+        img_bytes, mime = prepare_image(data, name)
+        parts = [{"text": prompt},
+                 {"inline_data": {"mime_type": mime, "data": base64.b64encode(img_bytes).decode('utf-8')}}]
+        text, tokens = gemini_generate(parts, timeout=60)
+        return parse_vocab_lines(text), tokens
+
+    # 每張圖各自一個請求並行送出，結果依頁序合併、去除跨頁重複
+    results, errors = run_chunks(pages, recognize, workers=OCR_WORKERS)
+    token_count = sum(r[1] for r in results if r)
+    if token_count > 0:
+        record_ai_usage("vocab", token_count)
+    if errors:
+        log_error("call_gemini_ocr", errors[0][1], critical=True)
+        if len(errors) < len(pages):
+            failed_pages = "、".join(str(i + 1) for i, _ in sorted(errors, key=lambda x: x[0]))
+            st.warning(f"⚠️ 圖片 {failed_pages} 辨識失敗，已保留其他圖片的結果。")
+    words = merge_duplicate_words([w for r in results if r for w in r[0]])
+    return _vocab_rows(words, course_name, course_date)
+
+def get_combined_dashboard_options(index, catalogs):
     options = ["單字 (全部)"]
-    if vocab:
-        df = pd.DataFrame(vocab)
-        if 'Course' not in df.columns: df['Course'] = '未分類'
-        if 'Date' not in df.columns: df['Date'] = 'N/A'
-        unique_courses = sorted(df['Course'].unique())
-        for c in unique_courses:
-            dates = df[df['Course'] == c]['Date'].unique()
-            for d in sorted(dates, reverse=True):
-                options.append(f"單字 | {c} | {d}")
+    for c in index.course_names():
+        for d in index.course_dates(c):
+            options.append(f"單字 | {c} | {d}")
     if catalogs:
         for cid, info in catalogs.items():
             name = info["name"]
             options.append(f"句型 | {name} (全部)")
-            book_sentences = fetch_sentences_by_id(cid)
-            if book_sentences:
-                df_b = pd.DataFrame(book_sentences)
-                if 'Category' in df_b.columns:
-                    cats = sorted(df_b['Category'].unique())
-                    for cat in cats:
-                        options.append(f"句型 | {name} | {cat}")
+            for cat in fetch_book_meta(cid).categories:
+                options.append(f"句型 | {name} | {cat}")
     return options
 
-def get_course_options(vocab):
-    if not vocab: return ["全部單字"]
-    df = pd.DataFrame(vocab)
-    if 'Course' not in df.columns: df['Course'] = '未分類'
-    if 'Date' not in df.columns: df['Date'] = 'N/A'
-    
-    unique_courses = sorted(df['Course'].unique())
-    unique_instances = df[['Course', 'Date']].drop_duplicates().sort_values(['Course', 'Date'], ascending=[True, False])
-    
-    options = ["全部單字"]
-    for c in unique_courses:
-        options.append(f"📚 {c} (全部)")
-        dates = unique_instances[unique_instances['Course'] == c]['Date'].tolist()
-        for d in dates:
-            options.append(f"   📅 {c} | {d}")
-    return options
+def get_course_options(index):
+    """課程 / 日期篩選選單（由 VocabIndex 維護，單字未變動時直接重用）"""
+    return index.course_options()
 
-def filter_vocab_data(vocab, selection):
-    if selection == "全部單字" or not vocab: return vocab
-    df = pd.DataFrame(vocab)
-    if 'Course' not in df.columns: df['Course'] = '未分類'
-    if 'Date' not in df.columns: df['Date'] = 'N/A'
-
-    if "(全部)" in selection:
-        course_name = selection.replace("📚 ", "").replace(" (全部)", "").strip()
-        return df[df['Course'] == course_name].to_dict('records')
-    elif "|" in selection:
-        parts = selection.replace("   📅 ", "").split("|")
-        if len(parts) >= 2:
-            course_name = parts[0].strip()
-            course_date = parts[1].strip()
-            return df[(df['Course'] == course_name) & (df['Date'] == course_date)].to_dict('records')
-    return vocab
+def filter_vocab_data(index, selection):
+    return index.filter(selection)
 
-def sample_by_accuracy(vocab_list, count):
-    """按正確率由低到高排序後抽取指定數量的單字（正確率低的優先）"""
-    def get_accuracy(w):
-        total = int(w.get('Total', 0))
-        correct = int(w.get('Correct', 0))
-        if total == 0:
-            return -1  # 未練習過的優先（排最前）
-        return correct / total
+def _vocab_ids(vocab_list):
+    return [w.get('id') for w in vocab_list]
 
-    sorted_list = sorted(vocab_list, key=get_accuracy)
-    return sorted_list[:count]
+def sample_by_accuracy(vocab_list, count):
+    """按正確率由低到高排序後抽取指定數量的單字（正確率低的優先，未練習過的排最前）"""
+    index = st.session_state.vocab_index
+    return index.records(index.srs.sample_by_accuracy(count, ids=_vocab_ids(vocab_list)))
 
 # ── SRS (Spaced Repetition System) 核心函式 ──────────────────────
+# 排程與抽題在 srs_engine（NumPy 欄位陣列），這裡只把單字記錄轉成 id 交給 VocabIndex.srs
 def compute_srs_update(word, is_correct):
     """根據答題結果計算新的 SRS 欄位（簡化 SM-2）"""
-    today_str = str(date.today())
-    interval = int(word.get('srs_interval', 0))
-    ease = float(word.get('srs_ease', 2.5))
-    streak = int(word.get('srs_streak', 0))
-
-    if is_correct:
-        streak += 1
-        if streak == 1:
-            new_interval = 1        # 首次答對：明天複習
-        elif streak == 2:
-            new_interval = 3        # 連續兩次：3 天後
-        else:
-            new_interval = round(interval * ease)
-        ease = min(3.0, ease + 0.1)  # 答對 ease 緩升，上限 3.0
-    else:
-        streak = 0
-        new_interval = 1            # 答錯：明天重來
-        ease = max(1.3, ease - 0.2)  # 答錯 ease 下降，下限 1.3
-
-    due_date = date.today() + timedelta(days=new_interval)
-    return {
-        'srs_interval': new_interval,
-        'srs_ease': round(ease, 2),
-        'srs_due': str(due_date),
-        'srs_streak': streak,
-        'srs_last_review': today_str
-    }
-
-def get_due_words(vocab_list):
-    """取得需要複習的單字：今日到期（含逾期）＋ 從未練過的新字"""
-    today_str = str(date.today())
-    return [w for w in vocab_list if not w.get('srs_due') or (isinstance(w.get('srs_due'), str) and w['srs_due'] <= today_str)]
+    return srs_engine.compute_srs_update(word, is_correct)
 
 def sample_for_review(vocab_list, count):
     """SRS 智慧抽題：到期優先 → 新字 → 正確率低"""
-    due = get_due_words(vocab_list)
-    # 到期的排前面（按日期），新字（空字串）排後面
-    due.sort(key=lambda w: w.get('srs_due') or '9999-99-99')
-    result = due[:count]
-
-    if len(result) < count:
-        used_ids = {w.get('id') for w in result}
-        remaining = [w for w in vocab_list if w.get('id') not in used_ids]
-        result.extend(sample_by_accuracy(remaining, count - len(result)))
-
-    return result[:count]
+    index = st.session_state.vocab_index
+    return index.records(index.srs.sample_for_review(count, ids=_vocab_ids(vocab_list)))
 # ── SRS 核心函式結束 ─────────────────────────────────────────────
 
 # ── 練習時長追蹤 ─────────────────────────────────────────────────
@@ -1132,35 +1050,31 @@ def track_practice_time():
         if delta < 300:  # 5 分鐘內算有效練習
             st.session_state.practice_seconds_today += delta
 
-def save_practice_time():
-    """將新增的練習秒數以 Increment 寫入 Firestore（避免覆蓋）"""
+def queue_practice_time():
+    """把新增的練習秒數排入寫入緩衝（flush 時以 Increment 寫入，避免覆蓋）"""
     total = int(st.session_state.get('practice_seconds_today', 0))
     last_saved = int(st.session_state.get('practice_seconds_last_saved', 0))
     delta = total - last_saved
     if delta <= 0 or not db: return
-    today_str = str(date.today())
-    try:
-        user_ref = db.collection(USER_LIST_PATH).document(st.session_state.current_user_name)
-        user_ref.set({"practice_time": {today_str: firestore.Increment(delta)}}, merge=True)
-        st.session_state.practice_seconds_last_saved = total
-    except Exception as e:
-        log_error("save_practice_time", e)
+    st.session_state.write_buffer.queue_practice(str(date.today()), delta)
+    st.session_state.practice_seconds_last_saved = total
+
+def save_practice_time():
+    """練習秒數排隊後立即送出（連同尚未送出的作答結果）；回傳是否已全部寫入"""
+    queue_practice_time()
+    return flush_pending_writes()
 # ── 練習時長追蹤結束 ─────────────────────────────────────────────
 
-def get_sentence_category_options(sentences, catalog_name):
-    if not sentences: return [f"📚 {catalog_name} (全部)"]
-    df = pd.DataFrame(sentences)
-    if 'Category' not in df.columns: df['Category'] = '未分類'
-    unique_categories = sorted(df['Category'].unique())
+def get_sentence_category_options(meta, catalog_name):
     options = [f"📚 {catalog_name} (全部)"]
-    for cat in unique_categories:
+    for cat in meta.categories:
         options.append(f"   🏷️ {cat}")
     return options
 
-def filter_sentence_data(sentences, selection):
-    if " (全部)" in selection: return sentences
+def filter_sentence_data(meta, selection):
+    if " (全部)" in selection: return meta.sentences
     category = selection.replace("   🏷️ ", "").strip()
-    return [s for s in sentences if s.get('Category') == category]
+    return meta.select(category)[0]
 
 def keyboard_bridge():
     js = """<script>
@@ -1412,11 +1326,11 @@ with st.sidebar:
                     ok, msg = register_new_user(reg_name, reg_pwd)
                     if ok:
                         # 註冊成功，直接自動登入
-                        fresh_users = fetch_users_list()
-                        if reg_name in fresh_users:
+                        new_user = repo.get_user(reg_name)
+                        if new_user:
                             st.session_state.logged_in = True
                             st.session_state.current_user_name = reg_name
-                            st.session_state.user_info = fresh_users[reg_name]
+                            st.session_state.user_info = new_user
                             sync_vocab_from_db(init_if_empty=False)
                             st.session_state.practice_seconds_today = 0
                             st.session_state.practice_last_active = None
@@ -1454,10 +1368,10 @@ with st.sidebar:
             st.caption(f"🆓 免費方案（單字補全剩餘 {remaining}/{FREE_DAILY_VOCAB_AI_LIMIT} 次/天）")
         # SRS 今日複習提示
         if st.session_state.get('u_vocab'):
-            due_today = get_due_words(st.session_state.u_vocab)
+            due_today = st.session_state.vocab_index.srs.due_count()
             _enc = _generate_encouragement(user)
             if due_today:
-                tip = f"📅 今日待複習：{len(due_today)} 個單字"
+                tip = f"📅 今日待複習：{due_today} 個單字"
                 if _enc:
                     tip += f"  \n{_enc}"
                 st.warning(tip)
@@ -1469,8 +1383,17 @@ with st.sidebar:
         if user.get("role") == "admin":
             menu_options.append("⚙️ 後台管理")
         menu =st.radio("功能選單", menu_options, key="nav_selection")
-        if st.button("登出", use_container_width=True):
-            save_practice_time()
+        # 切換頁面時送出作答緩衝；停留在同一頁則排隊超過時限才送
+        flush_pending_writes(force=menu != st.session_state.get("_last_menu"))
+        if menu != st.session_state.get("_last_menu"):
+            st.session_state.pop("drill_window", None)  # 句型口說預載的進度離開頁面後就可能過時
+            st.session_state.pop("drill_local", None)
+        st.session_state._last_menu = menu
+        logout = st.button("登出", use_container_width=True)
+        if logout and not save_practice_time():
+            # 作答緩衝送不出去時不登出，保留緩衝待下次重試，避免清掉尚未寫入的作答
+            st.warning("⚠️ 尚有作答紀錄未能儲存，請稍後再按一次登出")
+        elif logout:
             # 清除 session token（Cookie + Firestore）
             cookie_controller.remove("remembered_user")
             cookie_controller.remove("session_token")
@@ -1480,7 +1403,8 @@ with st.sidebar:
                 print(f"[WARN] logout session cleanup: {e}")
             st.session_state.logged_in = False
             st.session_state.user_info = None
-            st.session_state.u_vocab = []
+            reset_vocab_sync()
+            st.session_state.write_buffer = WriteBehindBuffer(max_age=WRITE_BUFFER_MAX_AGE)
             st.rerun()
         
         # --- 新增：修改密碼 Expander ---
@@ -1578,6 +1502,7 @@ if not st.session_state.logged_in:
 
 else:
     u_vocab = st.session_state.u_vocab
+    vocab_index = st.session_state.vocab_index
 
     if menu == "首頁":
         # 顯示學生版報告
@@ -1613,21 +1538,14 @@ else:
             # 1. 單字概況 (Stacked Bar)
             st.markdown("#### 📚 單字課程進度")
             if u_vocab:
-                df_v = pd.DataFrame(u_vocab)
-                if 'Course' not in df_v.columns: df_v['Course'] = '未分類'
-                if 'Date' not in df_v.columns: df_v['Date'] = 'N/A'
-                
-                courses = sorted(df_v['Course'].unique())
-                for course in courses:
+                for course in vocab_index.course_names():
                     with st.expander(f"📘 {course}", expanded=True):
-                        c_data = df_v[df_v['Course'] == course]
-                        dates = sorted(c_data['Date'].unique(), reverse=True)
-                        for d in dates:
-                            d_data = c_data[c_data['Date'] == d]
+                        for d in vocab_index.course_dates(course):
+                            d_data = vocab_index.filter(f"   📅 {course} | {d}")
                             total = len(d_data)
                             
-                            mastered = len(d_data[d_data['Correct'] > 0])
-                            learning = len(d_data[(d_data['Total'] > 0) & (d_data['Correct'] == 0)])
+                            mastered = sum(1 for w in d_data if int(w.get('Correct', 0)) > 0)
+                            learning = sum(1 for w in d_data if int(w.get('Total', 0)) > 0 and int(w.get('Correct', 0)) == 0)
                             
                             p_mastered = mastered / total if total > 0 else 0
                             p_learning = learning / total if total > 0 else 0
@@ -1657,26 +1575,21 @@ else:
                 for cid, info in catalogs.items():
                     name = info["name"]
                     book_is_premium = info.get("is_premium", False)
-                    b_sentences = fetch_sentences_by_id(cid)
-                    if not b_sentences: continue
+                    b_meta = fetch_book_meta(cid)
+                    if not b_meta.sentences: continue
 
                     label = f"📙 {name}"
                     if book_is_premium and not is_premium(user_info):
                         label += " 🔒"
                     with st.expander(label, expanded=True):
-                        df_s = pd.DataFrame(b_sentences)
-                        if 'Category' not in df_s.columns: df_s['Category'] = '未分類'
-                        cats = sorted(df_s['Category'].unique())
-                        
-                        for cat in cats:
-                            cat_sents = [s for s in b_sentences if s.get('Category') == cat]
+                        for cat in b_meta.categories or ['未分類']:
+                            cat_sents, cat_hashes = b_meta.select(cat)
                             tot = len(cat_sents)
 
                             cnt_mastered = 0  # 3輪以上（⭐⭐）
                             cnt_practiced = 0  # 1~2輪
 
-                            for s in cat_sents:
-                                h = hash_string(s['Template'])
+                            for h in cat_hashes:
                                 p_data = user_progress.get(h, {})
                                 rounds = p_data.get("completion_count", 0) if isinstance(p_data, dict) else 0
                                 if rounds >= 3:
@@ -1730,13 +1643,13 @@ else:
         with tab_v:
             if not u_vocab:
                 st.info("尚無單字資料。")
-                if st.button("🔄 同步雲端"): sync_vocab_from_db(); st.rerun()
+                if st.button("🔄 同步雲端"): sync_vocab_from_db(full=True); st.rerun()
             else:
-                options = get_course_options(u_vocab)
+                options = get_course_options(vocab_index)
                 # 直接使用 key="vocab_dash_filter" 從 session state 取值，不使用 index
                 selection = st.selectbox("單字篩選範圍：", options, key="vocab_dash_filter")
                 
-                filtered_vocab = filter_vocab_data(u_vocab, selection)
+                filtered_vocab = filter_vocab_data(vocab_index, selection)
                 
                 total_vocab_count = len(filtered_vocab)
                 practiced_count = len([v for v in filtered_vocab if v.get('Total', 0) > 0])
@@ -1744,7 +1657,7 @@ else:
                 total_correct = sum(v.get('Correct', 0) for v in filtered_vocab)
                 total_attempts = sum(v.get('Total', 0) for v in filtered_vocab)
                 accuracy_rate = (total_correct / total_attempts * 100) if total_attempts > 0 else 0
-                due_count_dash = len(get_due_words(filtered_vocab))
+                due_count_dash = vocab_index.srs.due_count(ids=_vocab_ids(filtered_vocab))
 
                 mc1, mc2 = st.columns(2)
                 mc1.metric("單字數", total_vocab_count)
@@ -1774,13 +1687,8 @@ else:
                     name = info["name"]
                     book_map[name] = cid
                     combined_s_options.append(f"{name} (全部)")
-                    book_sentences = fetch_sentences_by_id(cid)
-                    if book_sentences:
-                        df_b = pd.DataFrame(book_sentences)
-                        if 'Category' in df_b.columns:
-                            cats = sorted(df_b['Category'].unique())
-                            for c in cats:
-                                combined_s_options.append(f"{name} | {c}")
+                    for c in fetch_book_meta(cid).categories:
+                        combined_s_options.append(f"{name} | {c}")
 
                 # 直接使用 key="sentence_dash_filter" 從 session state 取值，不使用 index
                 s_selection = st.selectbox("句型篩選範圍：", combined_s_options, key="sentence_dash_filter")
@@ -1788,12 +1696,11 @@ else:
                 if " (全部)" in s_selection:
                     book_name = s_selection.replace(" (全部)", "")
                     target_id = book_map.get(book_name)
-                    target_sentences = fetch_sentences_by_id(target_id)
+                    target_sentences, target_hashes = fetch_book_meta(target_id).select()
                 else:
                     book_name, category = s_selection.split(" | ")
                     target_id = book_map.get(book_name)
-                    all_sentences = fetch_sentences_by_id(target_id)
-                    target_sentences = [s for s in all_sentences if s.get('Category') == category]
+                    target_sentences, target_hashes = fetch_book_meta(target_id).select(category)
                 
                 if not target_sentences:
                     st.info("無句型資料。")
@@ -1807,8 +1714,7 @@ else:
 
                     progress_table = []
 
-                    for s in target_sentences:
-                        h = hash_string(s['Template'])
+                    for s, h in zip(target_sentences, target_hashes):
                         p_data = user_progress.get(h, {})
                         rounds = p_data.get("completion_count", 0) if isinstance(p_data, dict) else 0
                         if rounds > 0:
@@ -1841,27 +1747,23 @@ else:
             c_title, c_refresh = st.columns([8, 2])
             c_title.subheader("🏆 全班句型練習排行榜")
             if c_refresh.button("🔄 刷新數據"):
-                fetch_users_list.clear()
+                fetch_leaderboards.clear()
                 st.rerun()
 
-            # 讀取排行榜數據，按句型書分組
-            all_users = fetch_users_list()
+            # 讀取排行榜彙總（每個題庫一份文件），按句型書分組
+            leaderboards = fetch_leaderboards()
 
             # 結構: { book_name: [ {學生, completed, total, rate, last_active}, ... ] }
             books_data = {}
 
-            for uid, u_data in all_users.items():
-                if u_data.get("role") == "admin": continue
-                s_stats = u_data.get("sentence_stats", {})
-                if not s_stats: continue
-
-                for book_id, stat in s_stats.items():
+            for book_id, board in leaderboards.items():
+                book_name = board.get('name', book_id)
+                for entry_user, stat in (board.get("entries") or {}).items():
                     if not isinstance(stat, dict): continue
                     total = stat.get('total', 0)
                     if total == 0: continue
 
                     completed = stat.get('completed', 0)
-                    book_name = stat.get('name', book_id)
 
                     # 將 Timestamp 轉換為台灣時間
                     last_active = stat.get('last_active')
@@ -1882,7 +1784,7 @@ else:
                         books_data[book_name] = []
 
                     books_data[book_name].append({
-                        "student": u_data.get('name', uid),
+                        "student": stat.get('student', entry_user),
                         "completed": completed,
                         "total": total,
                         "rate": completed / total if total > 0 else 0,
@@ -1930,11 +1832,7 @@ else:
 
         with tab1:
             # 共用：課程名稱選擇
-            existing_courses = []
-            if u_vocab:
-                df_courses = pd.DataFrame(u_vocab)
-                if 'Course' in df_courses.columns:
-                    existing_courses = sorted(df_courses['Course'].dropna().unique().tolist())
+            existing_courses = vocab_index.course_names()
             if existing_courses:
                 course_options = existing_courses + ["➕ 新增課程..."]
                 selected_course = st.selectbox("課程名稱:", course_options, key="ai_course_select")
@@ -2005,7 +1903,11 @@ else:
                         spinner_msg = "解析中..." if input_mode == "✏️ 文字輸入" else "AI 辨識中，請稍候..."
                         with st.spinner(spinner_msg):
                             if input_mode == "✏️ 文字輸入":
-                                st.session_state.pending_items = call_gemini_to_complete(text_area, c_name, c_date)
+                                preview = st.empty()
+                                st.session_state.pending_items = call_gemini_to_complete(
+                                    text_area, c_name, c_date,
+                                    on_partial=lambda rows: preview.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True))
+                                preview.empty()
                             else:
                                 st.session_state.pending_ocr_items = call_gemini_ocr(ocr_images, c_name, c_date)
                             consume_vocab_ai_usage()
@@ -2017,25 +1919,23 @@ else:
             if st.session_state.get("pending_items"):
                 edited = st.data_editor(pd.DataFrame(st.session_state.pending_items), use_container_width=True, hide_index=True)
                 if st.button("💾 確認儲存", type="primary", key="ai_save_text"):
-                    path = get_vocab_path()
-                    for it in edited.to_dict('records'): db.collection(path).add(it)
+                    toast_save_result(*save_new_words_to_db(edited.to_dict('records'), c_name, c_date))
                     st.session_state.pending_items = None
-                    sync_vocab_from_db(); st.success("儲存成功！"); st.rerun()
+                    st.rerun()
             # 預覽與儲存（OCR 模式）
             if st.session_state.get("pending_ocr_items"):
                 st.success(f"辨識到 {len(st.session_state.pending_ocr_items)} 個單字，請檢查後儲存：")
                 edited_ocr = st.data_editor(pd.DataFrame(st.session_state.pending_ocr_items), use_container_width=True, hide_index=True)
                 if st.button("💾 確認儲存", type="primary", key="ai_save_ocr"):
-                    path = get_vocab_path()
-                    for it in edited_ocr.to_dict('records'): db.collection(path).add(it)
+                    toast_save_result(*save_new_words_to_db(edited_ocr.to_dict('records'), c_name, c_date))
                     st.session_state.pending_ocr_items = None
-                    sync_vocab_from_db(); st.success("儲存成功！"); st.rerun()
+                    st.rerun()
         
         with tab2:
             if u_vocab:
-                opts = get_course_options(u_vocab)
+                opts = get_course_options(vocab_index)
                 sel = st.selectbox("請選擇修改範圍：", opts, key="edit_filter")
-                filtered = filter_vocab_data(u_vocab, sel)
+                filtered = filter_vocab_data(vocab_index, sel)
                 if filtered:
                     edited_df = st.data_editor(pd.DataFrame(filtered), column_order=["English", "Group", "Chinese_1", "Chinese_2", "Example"], use_container_width=True, hide_index=True)
                     if st.button("💾 儲存修改"):
@@ -2046,9 +1946,9 @@ else:
 
         with tab3:
             if u_vocab:
-                opts = get_course_options(u_vocab)
+                opts = get_course_options(vocab_index)
                 sel = st.selectbox("請選擇刪除範圍：", opts, key="delete_filter")
-                filtered = filter_vocab_data(u_vocab, sel)
+                filtered = filter_vocab_data(vocab_index, sel)
                 if filtered:
                     # 加入全選 Checkbox
                     col_check, _ = st.columns([1, 6])
@@ -2113,8 +2013,7 @@ else:
                                 })
 
                             # 重複檢查
-                            existing_english = {w.get('English', '').lower() for w in u_vocab} if u_vocab else set()
-                            new_items = [it for it in items_to_add if it['English'].lower() not in existing_english]
+                            new_items = [it for it in items_to_add if not vocab_index.has_english(it['English'])]
                             dup_count = len(items_to_add) - len(new_items)
 
                             if dup_count > 0:
@@ -2123,9 +2022,9 @@ else:
                             if new_items:
                                 if st.button(f"🚀 匯入 {len(new_items)} 個新單字", type="primary"):
                                     with st.spinner("正在匯入..."):
-                                        save_new_words_to_db(new_items)
-                                        sync_vocab_from_db()
-                                        st.success(f"成功匯入 {len(new_items)} 筆單字！")
+                                        saved, _, failed = save_new_words_to_db(new_items)
+                                        st.success(f"成功匯入 {saved} 筆單字！")
+                                        if failed: st.warning(f"{failed} 筆匯入失敗，請稍後再試。")
                                         time.sleep(1)
                                         st.rerun()
                             elif items_to_add:
@@ -2191,8 +2090,7 @@ else:
                 else:
                     words_to_import = shared_words
 
-                existing_english = {w.get('English', '').lower() for w in u_vocab} if u_vocab else set()
-                new_words = [w for w in words_to_import if w.get('English', '').lower() not in existing_english]
+                new_words = [w for w in words_to_import if not vocab_index.has_english(w.get('English', ''))]
                 dup_count = len(words_to_import) - len(new_words)
 
                 if dup_count > 0:
@@ -2208,9 +2106,9 @@ else:
                             "Date": today_str, "Correct": 0, "Total": 0,
                             "srs_interval": 0, "srs_ease": 2.5, "srs_due": "", "srs_streak": 0, "srs_last_review": ""
                         } for w in new_words]
-                        save_new_words_to_db(items_to_save)
-                        sync_vocab_from_db()
-                        st.success(f"成功匯入 {len(items_to_save)} 筆單字！")
+                        saved, _, failed = save_new_words_to_db(items_to_save)
+                        st.success(f"成功匯入 {saved} 筆單字！")
+                        if failed: st.warning(f"{failed} 筆匯入失敗，請稍後再試。")
                         time.sleep(1)
                         st.rerun()
                 elif not new_words and words_to_import:
@@ -2218,12 +2116,16 @@ else:
 
     elif menu == "單字練習":
         track_practice_time()
+        # 連連看元件直接從瀏覽器寫回 SRS，定期增量同步把變更拉回 session
+        maybe_sync_vocab()
+        u_vocab = st.session_state.u_vocab
+        vocab_index = st.session_state.vocab_index
         st.title("✏️ 單字練習")
-        options = get_course_options(u_vocab)
+        options = get_course_options(vocab_index)
         # 直接使用 key="practice_filter" 從 session state 取值，不使用 index
         selection = st.selectbox("🎯 選擇練習範圍：", options, key="practice_filter")
         
-        current_set = filter_vocab_data(u_vocab, selection)
+        current_set = filter_vocab_data(vocab_index, selection)
         
         tab_p, tab_t, tab_m = st.tabs(["快閃練習", "實力測驗", "例句連連看"])
         
@@ -2275,8 +2177,7 @@ else:
             if not current_set: st.info("範圍內無單字。")
             else:
                 # SRS 複習提示
-                due_words = get_due_words(current_set)
-                due_count = len(due_words)
+                due_count = vocab_index.srs.due_count(ids=_vocab_ids(current_set))
                 if due_count > 0:
                     st.info(f"📅 此範圍有 **{due_count}** 個單字到期需要複習")
 
@@ -2311,11 +2212,14 @@ else:
                             st.session_state.quiz_history.append({"英文": curr['English'], "你的輸入": ans, "正確答案": curr['Chinese_1'], "is_correct": ok})
                             if ok: st.session_state.t_score += 1
                             srs = compute_srs_update(curr, ok)
-                            update_word_data(curr.get('id'), {"Correct": int(curr.get('Correct', 0)) + (1 if ok else 0), "Total": int(curr.get('Total', 0)) + 1, **srs})
-                            save_practice_time()
+                            # 只更新本地並排隊，測驗結束 / 切換頁面 / 超過時限時一次批次寫入
+                            update_word_data(curr.get('id'), {"Correct": int(curr.get('Correct', 0)) + (1 if ok else 0), "Total": int(curr.get('Total', 0)) + 1, **srs}, defer=True)
+                            queue_practice_time()
                             st.session_state.t_idx += 1; st.rerun()
                     auto_focus_input()
                 else:
+                    # 測驗結束：送出本輪作答
+                    flush_pending_writes()
                     score = st.session_state.t_score
                     total = len(st.session_state.test_pool)
                     if score == total:
@@ -2381,12 +2285,11 @@ else:
                     st.rerun()
 
                 # 拖拉配對 JS 元件
-                match_html = generate_match_html(
+                render_match(
                     questions=st.session_state.match_pool,
                     options=st.session_state.match_options,
                     vocab_path=get_vocab_path() or "",
                 )
-                html(match_html, height=450, scrolling=True)
 
     elif menu == "句型口說":
         track_practice_time()
@@ -2395,7 +2298,8 @@ else:
         if not catalogs:
             st.info("目前雲端沒有句型資料庫。")
             if INITIAL_SENTENCES:
-                st.warning("⚠️ 使用預設題庫模式 (未連結雲端)"); current_sentences = INITIAL_SENTENCES
+                st.warning("⚠️ 使用預設題庫模式 (未連結雲端)")
+                current_sentences, current_hashes = BookMeta(INITIAL_SENTENCES).select()
             else: st.stop()
         else:
             combined_options = []
@@ -2414,13 +2318,8 @@ else:
 
                 display_name = f"{name} 🔒" if (book_is_premium and not user_is_premium) else name
                 combined_options.append(f"{display_name} (全部)")
-                book_sentences = fetch_sentences_by_id(cid)
-                if book_sentences:
-                    df_b = pd.DataFrame(book_sentences)
-                    if 'Category' in df_b.columns:
-                        cats = sorted(df_b['Category'].unique())
-                        for c in cats:
-                            combined_options.append(f"{display_name} | {c}")
+                for c in fetch_book_meta(cid).categories:
+                    combined_options.append(f"{display_name} | {c}")
 
             selection = st.selectbox("選擇練習範圍：", combined_options, key="sentence_filter")
 
@@ -2429,14 +2328,13 @@ else:
             if " (全部)" in clean_selection:
                 book_name = clean_selection.replace(" (全部)", "")
                 target_id = book_map.get(book_name)
-                current_sentences = fetch_sentences_by_id(target_id)
+                current_sentences, current_hashes = fetch_book_meta(target_id).select()
                 st.session_state.current_dataset_id = target_id
             else:
                 book_name, category = clean_selection.split(" | ")
                 target_id = book_map.get(book_name)
                 st.session_state.current_dataset_id = target_id
-                all_book_sentences = fetch_sentences_by_id(target_id)
-                current_sentences = [s for s in all_book_sentences if s.get('Category') == category]
+                current_sentences, current_hashes = fetch_book_meta(target_id).select(category)
 
             # 付費句型書存取控制
             if book_name in premium_books and not user_is_premium:
@@ -2451,78 +2349,75 @@ else:
             if st.session_state.last_sentence_filter_sig != current_filter_sig:
                 user_progress = fetch_all_user_sentence_progress()
                 found_idx = 0
-                for i, s in enumerate(current_sentences):
-                    h = hash_string(s['Template'])
+                for i, h in enumerate(current_hashes):
                     p_data = user_progress.get(h, {})
                     rounds = p_data.get("completion_count", 0) if isinstance(p_data, dict) else 0
                     if rounds == 0:
                         found_idx = i
                         break
                 st.session_state.sentence_idx = found_idx
-                st.session_state.completed_options = set()
                 st.session_state.last_sentence_filter_sig = current_filter_sig
-                if "loaded_hash" in st.session_state: del st.session_state.loaded_hash
 
             if st.session_state.sentence_idx >= len(current_sentences):
                 st.session_state.sentence_idx = 0
 
-            curr_sent = current_sentences[st.session_state.sentence_idx]
-            template = curr_sent['Template']
-            options = curr_sent['Options']
-
-            template_hash = hash_string(template)
-            if "loaded_hash" not in st.session_state or st.session_state.loaded_hash != template_hash:
-                loaded_opts, loaded_count = load_user_sentence_progress(template_hash)
-                st.session_state.completed_options = loaded_opts
-                st.session_state.drill_completion_count = loaded_count
-                st.session_state.loaded_hash = template_hash
-            if "drill_completion_count" not in st.session_state:
-                st.session_state.drill_completion_count = 0
-
-            # 題目資訊
-            st.caption(f"題目 {st.session_state.sentence_idx + 1}/{len(current_sentences)}　({curr_sent.get('Category', '一般')})")
-
-            # 上一題 / 下一題 導覽
-            c1, c2 = st.columns(2)
-            if c1.button("← 上一題", use_container_width=True):
-                st.session_state.sentence_idx = (st.session_state.sentence_idx - 1) % len(current_sentences)
-                st.session_state.completed_options = set()
-                del st.session_state.loaded_hash
-                st.rerun()
-            if c2.button("下一題 →", use_container_width=True):
-                st.session_state.sentence_idx = (st.session_state.sentence_idx + 1) % len(current_sentences)
-                st.session_state.completed_options = set()
-                del st.session_state.loaded_hash
-                st.rerun()
-
-            # === JS 口說練習元件（直接寫 Firestore） ===
+            # 預載一批題目（含進度）：前端在同一批內切題只回報題號，config 不變、元件不重新掛載；
+            # 題號超出這一批（或換範圍）時才從目前題號重新預載
             user_id = st.session_state.user_info["id"]
             user_name = st.session_state.current_user_name
-            fs_doc_path = f"artifacts/{APP_ID}/users/{user_id}/sentence_progress/{template_hash}"
-            user_doc_path = f"{USER_LIST_PATH}/{user_name}"
-            # 讀取一次 user 文件，供 drill_remaining 和 tts_rate 共用
-            _user_doc = db.collection(USER_LIST_PATH).document(user_name).get()
-            _user_data = _user_doc.to_dict() if _user_doc.exists else {}
-            drill_remaining = get_drill_remaining(user_data=_user_data)
-            saved_tts_rate = _user_data.get("tts_rate", 0.85)
-            # 取得題庫全部句數（排行榜統計用）
-            all_sentences_for_stats = fetch_sentences_by_id(st.session_state.current_dataset_id)
-            drill_html = generate_drill_html(
-                template=template,
-                options=options,
-                completion_count=st.session_state.drill_completion_count,
+            window = st.session_state.get("drill_window")
+            window_sig = (current_filter_sig, tuple(current_hashes))
+            if (not window or window["sig"] != window_sig
+                    or st.session_state.sentence_idx not in [it["index"] for it in window["items"]]):
+                # 讀取一次 user 文件，供 drill_remaining 和 tts_rate 共用；同一批內由前端自行扣減
+                _user_doc = db.collection(USER_LIST_PATH).document(user_name).get()
+                _user_data = _user_doc.to_dict() if _user_doc.exists else {}
+                # 前端寫入佇列可能還沒送達：疊上前端回報的本機進度，剩餘次數取較小者
+                local = st.session_state.get("drill_local") or {}
+                remaining = get_drill_remaining(user_data=_user_data)
+                if remaining >= 0 and local.get("remaining") is not None:
+                    remaining = min(remaining, local["remaining"])
+                window = {
+                    "sig": window_sig,
+                    "items": overlay_drill_progress(
+                        load_drill_window(current_sentences, current_hashes, st.session_state.sentence_idx),
+                        local.get("progress", {})),
+                    "drill_remaining": remaining,
+                    "tts_rate": _user_data.get("tts_rate", 0.85),
+                }
+                st.session_state.drill_window = window
+
+            # === JS 口說練習元件（直接寫 Firestore；上一題 / 下一題在元件內切換） ===
+            leaderboard_doc_path = ""
+            if st.session_state.user_info.get("role") != "admin":
+                leaderboard_doc_path = f"{repo.leaderboard_path}/{st.session_state.current_dataset_id}"
+            report = render_drill(
+                items=window["items"],
+                selection_total=len(current_sentences),
                 proxy_url=GEMINI_PROXY_URL,
-                template_hash=template_hash,
                 dataset_id=st.session_state.current_dataset_id,
-                firestore_doc_path=fs_doc_path,
-                completed_options=st.session_state.completed_options,
-                user_doc_path=user_doc_path,
-                drill_remaining=drill_remaining,
+                progress_base_path=f"artifacts/{APP_ID}/users/{user_id}/sentence_progress",
+                user_doc_path=f"{USER_LIST_PATH}/{user_name}",
+                drill_remaining=window["drill_remaining"],
                 dataset_name=book_name,
-                total_sentences=len(all_sentences_for_stats),
-                tts_rate=saved_tts_rate,
+                # 取得題庫全部句數（排行榜統計用）
+                total_sentences=len(fetch_book_meta(st.session_state.current_dataset_id)),
+                tts_rate=window["tts_rate"],
+                user_name=user_name,
+                student_name=st.session_state.user_info.get("name", user_name),
+                leaderboard_doc_path=leaderboard_doc_path,
             )
-            html(drill_html, height=550, scrolling=True)
+
+            # 前端切題後回報的題號（seq 去重，元件值在之後的 rerun 會一直保留）
+            if report and report.get("seq") != st.session_state.get("drill_report_seq"):
+                st.session_state.drill_report_seq = report.get("seq")
+                st.session_state.sentence_idx = int(report.get("index", 0)) % len(current_sentences)
+                if report.get("reload"):  # 超出這一批，重新預載（附上本機進度，供寫入還沒送達時合併）
+                    local = st.session_state.setdefault("drill_local", {"progress": {}, "remaining": None})
+                    local["progress"].update(report.get("progress") or {})
+                    if window["drill_remaining"] >= 0:
+                        local["remaining"] = max(0, window["drill_remaining"] - int(report.get("drillUsed", 0) or 0))
+                    st.rerun()
 
             keyboard_bridge()
 
@@ -5,12 +5,13 @@
 """
 import sys
 import json
-import requests
 from datetime import datetime, timezone, timedelta
 import firebase_admin
 from firebase_admin import credentials, firestore
 import toml
 
+import http_client
+
 TW = timezone(timedelta(hours=8))
 
 def utc_to_tw(iso_str):
@@ -248,7 +249,7 @@ def generate_ai_report(data, secrets):
     }
 
     print('正在用 Gemini 產生分析報告...\n')
-    res = requests.post(url, json=payload, headers=headers, timeout=300)
+    res = http_client.post(url, json=payload, headers=headers, timeout=300)
     if res.status_code != 200:
         print(f'Gemini API 錯誤：{res.status_code} {res.text[:200]}')
         return
@@ -333,7 +334,7 @@ def generate_ai_report_text(data, secrets):
     }
 
     try:
-        res = requests.post(url, json=payload, headers=headers, timeout=300)
+        res = http_client.post(url, json=payload, headers=headers, timeout=300)
         if res.status_code != 200:
             return None
         result = res.json()
@@ -0,0 +1,130 @@
+"""
+單字庫索引：每次同步建立一次，之後隨寫入增量更新
+記錄本身與 session 的 u_vocab 共用同一批 dict（不複製），索引只存 id
+
+  - by_id：id -> 單字記錄
+  - courses：課程 -> 日期 -> {id}（篩選選單、課程 / 日期範圍篩選）
+  - srs：SRS 欄位陣列（srs_engine.SrsTable），到期數、抽題用
+  - english：英文小寫計數（匯入時的重複檢查）
+"""
+from collections import Counter
+
+from srs_engine import SrsTable
+
+DEFAULT_COURSE = "未分類"
+DEFAULT_DATE = "N/A"
+ALL_WORDS = "全部單字"
+
+
+def _course_of(record):
+    return str(record.get("Course") or DEFAULT_COURSE)
+
+
+def _date_of(record):
+    return str(record.get("Date") or DEFAULT_DATE)
+
+
+def _english_of(record):
+    return str(record.get("English", "")).lower()
+
+
+class VocabIndex:
+    def __init__(self, records=()):
+        self.by_id = {}
+        self.courses = {}
+        self.srs = SrsTable()
+        self.english = Counter()
+        self._keys = {}  # id -> 建索引時的 (course, date, english)，更新 / 刪除時用來移除舊位置
+        self._options = None
+        for r in records:
+            self.add(r)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    # --- 維護 ---
+    def add(self, record):
+        doc_id = record.get("id")
+        if doc_id is None:
+            return
+        if doc_id in self.by_id:
+            self.remove(doc_id)
+        keys = (_course_of(record), _date_of(record), _english_of(record))
+        self.by_id[doc_id] = record
+        self._keys[doc_id] = keys
+        course, day, eng = keys
+        self.courses.setdefault(course, {}).setdefault(day, {})[doc_id] = None
+        self.srs.upsert(record)
+        self.english[eng] += 1
+        self._options = None
+
+    def remove(self, doc_id):
+        record = self.by_id.pop(doc_id, None)
+        if record is None:
+            return None
+        course, day, eng = self._keys.pop(doc_id)
+        dates = self.courses[course]
+        dates[day].pop(doc_id, None)
+        if not dates[day]:
+            del dates[day]
+            if not dates:
+                del self.courses[course]
+        self.srs.remove(doc_id)
+        self.english[eng] -= 1
+        if self.english[eng] <= 0:
+            del self.english[eng]
+        self._options = None
+        return record
+
+    def update(self, doc_id, changes):
+        """就地更新記錄；只有影響索引的欄位改變時才重新歸位"""
+        record = self.by_id.get(doc_id)
+        if record is None:
+            return
+        record.update(changes)
+        if self._keys[doc_id] != (_course_of(record), _date_of(record), _english_of(record)):
+            self.remove(doc_id)
+            self.add(record)
+        else:
+            self.srs.upsert(record)
+
+    # --- 查詢 ---
+    def get(self, doc_id):
+        return self.by_id.get(doc_id)
+
+    def has_english(self, english):
+        return str(english).lower() in self.english
+
+    def course_names(self):
+        return sorted(self.courses)
+
+    def course_dates(self, course):
+        """某課程的日期（新到舊）"""
+        return sorted(self.courses.get(course, {}), reverse=True)
+
+    def course_options(self):
+        """篩選下拉選單：全部單字 → 每個課程（全部）→ 各日期"""
+        if self._options is None:
+            options = [ALL_WORDS]
+            for c in self.course_names():
+                options.append(f"📚 {c} (全部)")
+                for d in self.course_dates(c):
+                    options.append(f"   📅 {c} | {d}")
+            self._options = options
+        return self._options
+
+    def records(self, ids):
+        return [self.by_id[i] for i in ids]
+
+    def filter(self, selection):
+        """依下拉選單文字回傳單字記錄（與 course_options 的格式對應）"""
+        if selection == ALL_WORDS or not self.by_id:
+            return list(self.by_id.values())
+        if "(全部)" in selection:
+            course = selection.replace("📚 ", "").replace(" (全部)", "").strip()
+            return [self.by_id[i] for ids in self.courses.get(course, {}).values() for i in ids]
+        if "|" in selection:
+            parts = selection.replace("   📅 ", "").split("|")
+            if len(parts) >= 2:
+                return self.records(self.courses.get(parts[0].strip(), {}).get(parts[1].strip(), {}))
+        return list(self.by_id.values())
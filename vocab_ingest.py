@@ -0,0 +1,70 @@
+"""
+單字匯入前處理：AI 補全、OCR、CSV、公用單字集的儲存都先經過這裡
+  - normalize_vocab_item：欄位補齊、去頭尾空白、pandas 空值（NaN）轉空字串、數字欄位轉 int
+  - dedupe_new_words：排除單字庫已有的字與本批重複的字（英文不分大小寫）
+  - merge_duplicate_words：合併多張圖片辨識出的同一個字（保留第一次出現的位置，空白欄位由後面的補上）
+"""
+TEXT_FIELDS = ("English", "POS", "Chinese_1", "Chinese_2", "Example", "Course", "Date")
+SYSTEM_FIELDS = ("id", "last_updated")  # 由資料庫產生，不從匯入資料帶入
+SRS_DEFAULTS = {"srs_interval": 0, "srs_ease": 2.5, "srs_due": "", "srs_streak": 0, "srs_last_review": ""}
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _text(value):
+    return "" if _is_blank(value) else str(value).strip()
+
+
+def _count(value):
+    try:
+        return max(0, int(float(value)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def normalize_vocab_item(raw, course=None, day=None):
+    """轉成單字文件格式；course / day 只在原資料沒有時補上，其他自訂欄位（如 Group）原樣保留"""
+    item = {k: v for k, v in raw.items() if k not in SYSTEM_FIELDS and not _is_blank(v)}
+    item.update({f: _text(raw.get(f)) for f in TEXT_FIELDS})
+    if not item["Course"] and course:
+        item["Course"] = _text(course)
+    if not item["Date"] and day:
+        item["Date"] = _text(day)
+    item["Correct"] = _count(raw.get("Correct", 0))
+    item["Total"] = _count(raw.get("Total", 0))
+    for k, default in SRS_DEFAULTS.items():
+        value = raw.get(k, default)
+        item[k] = default if _is_blank(value) else value
+    return item
+
+
+def dedupe_new_words(items, index):
+    """回傳 (新單字列表, 略過筆數)；空白英文也略過"""
+    seen = set()
+    new_items = []
+    for it in items:
+        key = it["English"].lower()
+        if not key or key in seen or index.has_english(key):
+            continue
+        seen.add(key)
+        new_items.append(it)
+    return new_items, len(items) - len(new_items)
+
+
+def merge_duplicate_words(items):
+    """依英文（不分大小寫）合併重複的字，回傳新列表；空白英文略過"""
+    merged = {}
+    for it in items:
+        key = _text(it.get("English")).lower()
+        if not key:
+            continue
+        if key not in merged:
+            merged[key] = dict(it)
+            continue
+        kept = merged[key]
+        for f, v in it.items():
+            if not _text(kept.get(f)) and not _is_blank(v):
+                kept[f] = v
+    return list(merged.values())
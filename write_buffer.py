@@ -0,0 +1,69 @@
+"""
+寫入緩衝（write-behind）：測驗作答時只更新本地狀態，Firestore 寫入先排隊，
+在測驗結束、切換頁面、登出或排隊超過 max_age 秒時，一次用 WriteBatch 送出
+
+  - vocab：{doc_id: 欄位更新}，同一個字多次作答只保留合併後的最終值
+  - practice：{日期: 秒數}，以 Increment 累加
+flush 失敗時資料保留在緩衝區（存在 session_state，rerun / 例外都不會遺失），下次觸發時重試
+"""
+import time
+
+
+class WriteBehindBuffer:
+    def __init__(self, max_age=30):
+        self.max_age = max_age
+        self.vocab = {}
+        self.practice = {}
+        self.first_queued_at = None
+        self.failures = 0
+        self.last_error = None
+
+    def __len__(self):
+        return len(self.vocab) + len(self.practice)
+
+    def _touch(self):
+        if self.first_queued_at is None:
+            self.first_queued_at = time.time()
+
+    # --- 排隊 ---
+    def queue_vocab(self, doc_id, data):
+        self.vocab.setdefault(doc_id, {}).update(data)
+        self._touch()
+
+    def queue_practice(self, day, seconds):
+        if seconds <= 0:
+            return
+        self.practice[day] = self.practice.get(day, 0) + seconds
+        self._touch()
+
+    def pending_vocab(self, doc_id):
+        return self.vocab.get(doc_id)
+
+    def pop_vocab(self, doc_id):
+        """取出某字尚未送出的更新（直接寫入時合併送出，或刪除單字時丟棄）"""
+        data = self.vocab.pop(doc_id, None)
+        if not len(self):
+            self.first_queued_at = None
+        return data
+
+    # --- 送出 ---
+    def is_due(self):
+        return self.first_queued_at is not None and time.time() - self.first_queued_at >= self.max_age
+
+    def flush(self, repo, uid, user_name):
+        """把緩衝內容一次寫入，成功回傳 True；失敗保留內容、記錄錯誤並回傳 False"""
+        if not len(self):
+            return True
+        vocab, practice = self.vocab, self.practice
+        try:
+            repo.commit_buffered(uid, user_name, vocab, practice)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = e
+            return False
+        # 寫入期間沒有新排隊（Streamlit 單一 session 循序執行），直接清空
+        self.vocab, self.practice = {}, {}
+        self.first_queued_at = None
+        self.failures = 0
+        self.last_error = None
+        return True